@@ -5,6 +5,7 @@ Created on Jun 18, 2015
 '''
 from pond_shape import PondShape
 from scipy.interpolate import interp1d
+import numpy as np
 from __builtin__ import str
 
 
@@ -16,6 +17,11 @@ class BathymetricPondShape(PondShape):
     
     For depths without a specified area, the class will interpolate using scipy.interpolate.interp1d, 
     documented at http://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.interp1d.html#scipy.interpolate.interp1d
+    The depth/area pairs are kept sorted in numpy arrays, with one interpolation function built from them.
+    Those are rebuilt whenever addBathymetryLayer, update_shape or add_bathymetry changes the data.
+    
+    Volume and sediment area above a depth come from hypsographic tables: running totals down a depth grid,
+    built once per depth interval and looked up afterwards.
     
     It will not work well if not given at least the area at the surface and at the bottom of the lake. 
     '''
@@ -37,10 +43,135 @@ class BathymetricPondShape(PondShape):
         #make sure all the darn keys are FLOATS, NOT STRINGS
 #         fixed_dict = self.convert_dict_keys_to_floats(areas)
         self.water_surface_areas = areas
+        self.update_area_interpolator()
+
 
 
-  
+    #derived from water_surface_areas. Left out of pickles (and jsonpickle) and rebuilt on load.
+    DERIVED_ATTRIBUTE_NAMES = ('_BathymetricPondShape__sorted_depths',
+                               '_BathymetricPondShape__sorted_areas',
+                               '_BathymetricPondShape__area_interpolator',
+                               '_BathymetricPondShape__hypsographic_tables')
+
+    def __getstate__(self):
+        '''
+        Everything but the derived arrays and interpolation function.
+        @rtype: dict
+        '''
+        state = self.__dict__.copy()
+        for attribute_name in self.DERIVED_ATTRIBUTE_NAMES:
+            state.pop(attribute_name, None)
+        return state
+
+    def __setstate__(self, state):
+        '''
+        Restores the state, then rebuilds the derived arrays and interpolation function.
+        @param state: dict from __getstate__
+        '''
+        self.__dict__.update(state)
+        self.update_area_interpolator()
+
+
+    def update_area_interpolator(self):
+        '''
+        Sorts the depth/area pairs into numpy arrays and builds the interpolation function used for areas between them.
+        Also throws away any hypsographic tables built from the old data, and bumps the version.
+        Must be called whenever water_surface_areas changes.
+        '''
+        self.version = self.get_version() + 1
+        self.__hypsographic_tables = {}
+        #make sure they are ordered by depth. interpolation requires it.
+        sorted_keys = sorted(self.water_surface_areas.keys(), key=float)
+        self.__sorted_depths = np.array([float(key) for key in sorted_keys], dtype=float)
+        self.__sorted_areas = np.array([self.water_surface_areas[key] for key in sorted_keys], dtype=float)
+        self.__area_interpolator = None
+        if(len(sorted_keys)>=2):
+            self.__area_interpolator = interp1d(self.__sorted_depths, self.__sorted_areas)
+
+    def get_sorted_depths(self):
+        '''
+        @return: the depths of the depth/area pairs, shallowest first.
+        @rtype: numpy array
+        '''
+        return self.__sorted_depths
+
+    def get_sorted_areas(self):
+        '''
+        @return: the areas of the depth/area pairs, in the same order as get_sorted_depths().
+        @rtype: numpy array
+        '''
+        return self.__sorted_areas
+
+    def get_hypsographic_table(self, depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS):
+        '''
+        Get Hypsographic Table
+        Volume and sediment area of every depth interval from the surface to the bottom, plus running totals of both.
+        Built the first time a depth interval is asked for, then reused until the shape changes.
         
+        The depth grid is added up one step at a time from the surface, exactly like the old summing loops, 
+        so the running totals match them.
+        @param depth_interval: depth interval for calculations, in meters.
+        @return: dict with "depths", "volumes", "sediment_areas", "cumulative_volumes", "cumulative_sediment_areas" 
+        and "fractional_volumes" (volume as a fraction of the whole lake) numpy arrays.
+        @rtype: dict
+        '''
+        validated_depth_interval = self.validate_depth_interval(depth_interval)
+        if(validated_depth_interval in self.__hypsographic_tables):
+            return self.__hypsographic_tables[validated_depth_interval]
+
+        max_depth = self.get_max_depth()
+        depths_list = []
+        current_depth = 0.0
+        while current_depth <= max_depth:
+            depths_list.append(current_depth)
+            current_depth += validated_depth_interval
+        depths = np.array(depths_list, dtype=float)
+
+        volumes = self.get_volumes_at_depths(depths, validated_depth_interval)
+        sediment_areas = self.get_sediment_areas_at_depths(depths, validated_depth_interval)
+        cumulative_volumes = np.cumsum(volumes)
+        table = {"depths": depths,
+                 "volumes": volumes,
+                 "sediment_areas": sediment_areas,
+                 "cumulative_volumes": cumulative_volumes,
+                 "cumulative_sediment_areas": np.cumsum(sediment_areas),
+                 "fractional_volumes": volumes / cumulative_volumes[-1]}
+        self.__hypsographic_tables[validated_depth_interval] = table
+        return table
+
+    def lookup_cumulative_value(self, table, column_name, validated_depth):
+        '''
+        Running total in a hypsographic table column, over every grid depth at or above validated_depth.
+        @param table: dict from get_hypsographic_table
+        @param column_name: "cumulative_volumes" or "cumulative_sediment_areas"
+        @param validated_depth: depth in meters, already within 0 and max_depth.
+        @rtype: float
+        '''
+        number_of_depths = np.searchsorted(table["depths"], validated_depth, side='right')
+        if(number_of_depths == 0):
+            return 0.0
+        return float(table[column_name][number_of_depths-1])
+
+    def lookup_table_values_at_depths(self, table, column_name, depths, calculate_values):
+        '''
+        Values of a hypsographic table column at each depth. Depths that are exactly on the table's grid are copied 
+        straight from the table. Any others are worked out with calculate_values.
+        @param table: dict from get_hypsographic_table
+        @param column_name: e.g. "sediment_areas" or "fractional_volumes"
+        @param depths: sequence of depths in meters
+        @param calculate_values: function taking an array of off-grid depths and returning their values.
+        @rtype: numpy array
+        '''
+        depths = np.asarray(depths, dtype=float)
+        grid_depths = table["depths"]
+        indices = np.minimum(np.searchsorted(grid_depths, depths), len(grid_depths)-1)
+        on_grid = grid_depths[indices] == depths
+        values = np.empty(len(depths), dtype=float)
+        values[on_grid] = table[column_name][indices[on_grid]]
+        if(not on_grid.all()):
+            values[~on_grid] = calculate_values(depths[~on_grid])
+        return values
+
 
     def get_dict(self):
         '''
@@ -69,6 +200,7 @@ class BathymetricPondShape(PondShape):
             raise Exception("invalid depth_value or area_value. Depth value must NOT be less than zero. Depth Value given: ",depth_value, " Area must NOT be less than, or equal to, zero. area_value given:",area_value)
         else:
             self.water_surface_areas[depth_value]=area_value
+            self.update_area_interpolator()
 
 
 
@@ -84,6 +216,7 @@ class BathymetricPondShape(PondShape):
         otherdict = other_pond_shape.water_surface_areas
          
         self.water_surface_areas.update(otherdict)
+        self.update_area_interpolator()
 
     def get_max_depth(self):
         '''
@@ -96,16 +229,16 @@ class BathymetricPondShape(PondShape):
         @rtype: float
         '''
         max_depth =0.0
-        keys = self.water_surface_areas.keys()        
+        sorted_depths = self.get_sorted_depths()
 
         
         
-        has_areas = bool(self.water_surface_areas) #evaluates to false if empty.
+        has_areas = len(sorted_depths)>0 #evaluates to false if empty.
         
         if(False == has_areas):
             raise Exception("No shape data exists. max depth is 0")
         else:
-            max_depth = max(keys)
+            max_depth = sorted_depths[-1]
 
         
             
@@ -116,27 +249,22 @@ class BathymetricPondShape(PondShape):
         '''
         Get Mean Depth
         
-        Calculates the mean depth.
+        Calculates the mean depth, as the sediment-area-weighted average depth.
+        Served from the hypsographic table for depth_interval.
         @param depth_interval: depth interval for calculations, in meters.
         @return: average depth, in meters, for the whole pond.
         @rtype: float
         '''
-        validated_depth_interval = self.validate_depth_interval(depth_interval)
         max_depth = self.get_max_depth()
-        total_area = self.get_sediment_area_above_depth(max_depth)
+        table = self.get_hypsographic_table(depth_interval)
+        total_area = table["cumulative_sediment_areas"][-1]
         if(0==total_area):
             #only possible if the sides are literally vertical.
             return max_depth
 
 
-        current_depth = validated_depth_interval  # no point starting at 0, since that's just gonna be zero anyway.
-        weighted_total = 0.0 #initialize to float
-        while current_depth <= max_depth:
-            area_at_depth = self.get_sediment_area_at_depth(current_depth) # there are this many square meters at this depth
-            weighted_total+=area_at_depth*current_depth
-            current_depth += validated_depth_interval
-
-        mean_depth  = weighted_total/total_area
+        weighted_total = np.dot(table["depths"], table["sediment_areas"]) # there are this many square meters at each depth
+        mean_depth  = float(weighted_total/total_area)
         return mean_depth
 
 
@@ -149,12 +277,16 @@ class BathymetricPondShape(PondShape):
 
         Uses http://docs.scipy.org/doc/scipy/reference/tutorial/interpolate.html
         For area/depth combinations not given.
-        @param depth: depth in meters to calculate at. depth should between 0 and max_depth. It'll be set to one of those if not so.
-        @return: the surface area of the water at  the specified depth, in m^2.
+        @param depth: depth in meters to calculate at, or an array of them. depth should between 0 and max_depth. It'll be set to one of those if not so.
+        @return: the surface area of the water at  the specified depth, in m^2. An array of areas if given an array of depths.
         @rtype: float
         '''
         #TODO: check and see if this still gives errors outside proper range        
 
+        if(np.ndim(depth)>0):
+            validated_depths = np.clip(np.asarray(depth, dtype=float), 0.0, self.get_max_depth())
+            return self.interpolate_water_surface_area(validated_depths)
+
         validated_depth = self.validate_depth(depth)
 
         
@@ -164,39 +296,21 @@ class BathymetricPondShape(PondShape):
         
         
         
-        
-        
-        # get interpolation function
-        x = self.water_surface_areas.keys()                
-        y = self.water_surface_areas.values()
-        if(len(x)<2):
-            error_message = "Cannot interpolate to determine water surface area at depth ", depth,", because there are not enough depth/area pairs."
-            print error_message
-            raise Exception(str(error_message))        
-    
-      
-        #make sure they are ordered by depth. interpolation requires it.
-        xy = zip(x, y)
-        xy.sort()
-          
-        x_sorted = []
-        y_sorted = []
-        for x_value, y_value in xy:
-            x_sorted.append(x_value)
-            y_sorted.append(y_value)
-          
-         
+        return self.interpolate_water_surface_area(validated_depth)
 
-        
-        
-        f = interp1d(x_sorted, y_sorted)
-        
-        #interpolate
-        
-        water_surface_area_at_depth = f(validated_depth)
 
-        return water_surface_area_at_depth
+    def interpolate_water_surface_area(self, validated_depth):
+        '''
+        Interpolates surface area using the cached interpolation function.
+        @param validated_depth: depth, or array of depths, already within 0 and max_depth.
+        @return: the surface area of the water at the specified depth(s), in m^2.
+        '''
+        if(self.__area_interpolator is None):
+            error_message = "Cannot interpolate to determine water surface area at depth ", validated_depth,", because there are not enough depth/area pairs."
+            print error_message
+            raise Exception(str(error_message))        
 
+        return self.__area_interpolator(validated_depth)
 
 
 
@@ -274,6 +388,74 @@ class BathymetricPondShape(PondShape):
         return sediment_area
 
 
+    def get_sediment_areas_at_depths(self, depths, depth_interval=None):
+        '''
+        Array version of get_sediment_area_at_depth.
+        @param depths: sequence of depths in meters to calculate at. Set to 0 or max_depth if outside that range.
+        @param depth_interval: depth interval for calculations, in meters. Either one value, or one per depth.
+        @return: sediment area in the interval above each depth, in m^2
+        @rtype: numpy array
+        '''
+        if(depth_interval is None):
+            depth_interval = 1 #1 meter by default
+
+        upper_edge_depths, lower_edge_depths = self.get_interval_edges_at_depths(depths, depth_interval)
+        upper_water_areas = self.get_water_surface_area_at_depth(upper_edge_depths)
+        lower_water_areas = self.get_water_surface_area_at_depth(lower_edge_depths)
+
+        # same approximation as get_sediment_area_at_depth. Zero-width intervals give zero.
+        sediment_areas = np.abs(upper_water_areas - lower_water_areas)
+        return sediment_areas
+
+
+    def get_tabulated_sediment_areas_at_depths(self, depths, depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS):
+        '''
+        Same as get_sediment_areas_at_depths with one depth interval, but served from the hypsographic table where the 
+        depths are on its grid. Every pond-day of a lake shares the table, so this is worked out once per lake.
+        @param depths: sequence of depths in meters.
+        @param depth_interval: depth interval for calculations, in meters.
+        @return: sediment area in the interval above each depth, in m^2
+        @rtype: numpy array
+        '''
+        validated_depth_interval = self.validate_depth_interval(depth_interval)
+        table = self.get_hypsographic_table(validated_depth_interval)
+        return self.lookup_table_values_at_depths(table, "sediment_areas", depths,
+                                                  lambda off_grid_depths: self.get_sediment_areas_at_depths(off_grid_depths, validated_depth_interval))
+
+
+    def get_fractional_volumes_at_depths(self, depths, depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS):
+        '''
+        Volume of the interval above each depth, as a fraction of the whole lake volume.
+        Served from the hypsographic table where the depths are on its grid.
+        @param depths: sequence of depths in meters.
+        @param depth_interval: depth interval for calculations, in meters.
+        @rtype: numpy array
+        '''
+        validated_depth_interval = self.validate_depth_interval(depth_interval)
+        table = self.get_hypsographic_table(validated_depth_interval)
+        total_volume = table["cumulative_volumes"][-1]
+        return self.lookup_table_values_at_depths(table, "fractional_volumes", depths,
+                                                  lambda off_grid_depths: self.get_volumes_at_depths(off_grid_depths, validated_depth_interval) / total_volume)
+
+
+    def get_interval_edges_at_depths(self, depths, depth_interval):
+        '''
+        Upper and lower edges of the depth interval ending at each depth, validated and ordered the same way 
+        get_sediment_area_at_depth and get_volume_at_depth do it.
+        @param depths: sequence of depths in meters.
+        @param depth_interval: depth interval in meters. Either one value, or one per depth.
+        @return: upper edge depths, lower edge depths
+        @rtype: tuple of numpy arrays
+        '''
+        max_depth = self.get_max_depth()
+        validated_depths = np.clip(np.asarray(depths, dtype=float), 0.0, max_depth)
+        validated_depth_intervals = self.validate_depth_intervals(depth_interval)
+        other_edge_depths = np.clip(validated_depths - validated_depth_intervals, 0.0, max_depth)
+        upper_edge_depths = np.minimum(validated_depths, other_edge_depths)
+        lower_edge_depths = np.maximum(validated_depths, other_edge_depths)
+        return upper_edge_depths, lower_edge_depths
+
+
 
 
     def get_volume_above_depth(self, depth=0.0, depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS):
@@ -282,7 +464,7 @@ class BathymetricPondShape(PondShape):
         
         Calculates water volume above specified depth, in meters cubed.  
         
-        O(number of depth intervals*O(get_volume_at_depth()))
+        Looked up in the hypsographic table for depth_interval, which is built on first use.
         @param depth: depth in meters to calculate at. depth should between 0 and max_depth. It'll be set to one of those if not so.
         @param depth_interval: depth interval for calculations, in meters.
         @return: volume above specified depth, in m^3
@@ -291,15 +473,10 @@ class BathymetricPondShape(PondShape):
         '''
 
         validated_depth = self.validate_depth(depth)
-        validated_depth_interval = self.validate_depth_interval(depth_interval)
 
-        # just find the volume at each interval and add them all up.
-        current_depth = 0.0  # no point starting at 0, since that's just gonna be zero anyway.
-        total_volume = 0.0
-        while current_depth <= validated_depth:
-            current_volume = self.get_volume_at_depth(current_depth, validated_depth_interval)
-            total_volume += current_volume
-            current_depth += validated_depth_interval
+        # the volume at each interval, already added up.
+        table = self.get_hypsographic_table(depth_interval)
+        total_volume = self.lookup_cumulative_value(table, "cumulative_volumes", validated_depth)
         return total_volume
 
 
@@ -358,11 +535,32 @@ class BathymetricPondShape(PondShape):
         volume_at_depth = (upper_calculated_volume+lower_calculated_volume)/2 #equivalent to (correct answer)
         return volume_at_depth
 
+    def get_volumes_at_depths(self, depths, depth_interval = DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS):
+        '''
+        Array version of get_volume_at_depth.
+        @param depths: sequence of depths in meters to calculate at. Set to 0 or max_depth if outside that range.
+        @param depth_interval: depth interval for calculations, in meters.
+        @return: volume, in m^3, of the interval above each depth.
+        @rtype: numpy array
+        '''
+        validated_depth_interval = self.validate_depth_interval(depth_interval)
+        upper_edge_depths, lower_edge_depths = self.get_interval_edges_at_depths(depths, validated_depth_interval)
+        upper_water_areas = self.get_water_surface_area_at_depth(upper_edge_depths)
+        lower_water_areas = self.get_water_surface_area_at_depth(lower_edge_depths)
+
+        upper_calculated_volumes = upper_water_areas*validated_depth_interval #equivalent to correct answer + error
+        lower_calculated_volumes = lower_water_areas*validated_depth_interval #equivalent to correct answer - error
+        volumes_at_depths = (upper_calculated_volumes+lower_calculated_volumes)/2 #equivalent to (correct answer)
+
+        # zero-width intervals (i.e. at the surface) have no volume.
+        return np.where(upper_edge_depths == lower_edge_depths, 0.0, volumes_at_depths)
+
     def get_sediment_area_above_depth(self, depth=0.0, depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS):
         '''
         Get Sediment Area above Depth. 
         
         Similar to get_sediment_area_at_depth, except that it calculates the area of the lake bottom sediment from the specified depth, all the way to the surface.
+        Looked up in the hypsographic table for depth_interval, which is built on first use.
         @param depth: depth in meters to calculate at. depth should between 0 and max_depth. It'll be set to one of those if not so.
         @return: the area of the sediment above a specific depth, in m^2.
         @rtype: float value
@@ -370,17 +568,10 @@ class BathymetricPondShape(PondShape):
 
 
         validated_depth = self.validate_depth(depth)
-        validated_depth_interval = self.validate_depth_interval(depth_interval)
-
-        # add up the sediment area at every interval.
-        total_area = 0.0
-
-        current_depth = 0.0
-        while current_depth <= validated_depth:
-            current_area = self.get_sediment_area_at_depth(current_depth, validated_depth_interval)
-            total_area += current_area
-            current_depth += validated_depth_interval
 
+        # the sediment area at every interval, already added up.
+        table = self.get_hypsographic_table(depth_interval)
+        total_area = self.lookup_cumulative_value(table, "cumulative_sediment_areas", validated_depth)
         
         return total_area
 
@@ -442,6 +633,18 @@ class BathymetricPondShape(PondShape):
             validated_depth_interval = depth_interval
         return validated_depth_interval
 
+    def validate_depth_intervals(self, depth_intervals):
+        '''
+        Array version of validate_depth_interval.
+        @param depth_intervals: a depth interval, or sequence of them, in meters.
+        @return: values between 0 and the maximum depth of the lake.
+        @rtype: numpy array
+        '''
+        max_depth= self.get_max_depth()
+        depth_intervals = np.asarray(depth_intervals, dtype=float)
+        validated_depth_intervals = np.where(depth_intervals<=0, max_depth/100, np.minimum(depth_intervals, max_depth))
+        return validated_depth_intervals
+
     def add_bathymetry(self, otherObject):
         '''
         Given another BathymetricPondShape object, copies all entries in the other's dictionary of depth/area pairs into the dictionary of this one.
@@ -452,6 +655,7 @@ class BathymetricPondShape(PondShape):
             otherdict = otherObject.water_surface_areas
             thisDict.update(otherdict)
             self.water_surface_areas=thisDict
+            self.update_area_interpolator()
 
 def main():
     '''
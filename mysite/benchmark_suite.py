@@ -0,0 +1,367 @@
+'''
+Created on Oct 17, 2026
+
+Benchmarks for the calculations, run against the example workbooks in static/.
+
+Times parsing, daily benthic, daily phytoplankton, hourly layer series, the batch calculator and export building,
+over a sweep of depth and time intervals, and measures how many P-I kernel evaluations per second the scalar
+and array versions manage. Parse time and peak memory are also measured for each DataReader mode, each in a
+fresh process so one mode's memory doesn't hide another's. Optionally, a soak test renders thousands of layer graphs
+and samples memory as it goes, to check that rendering doesn't leak. Results go to a JSON file, so two runs can be diffed.
+
+To run, from this folder:
+    python benchmark_suite.py -o before.json
+    (make changes)
+    python benchmark_suite.py -o after.json
+    python benchmark_suite.py -o soak.json -g 10000 --graph-threads 4    (graph rendering soak test)
+
+@author: cdleong
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from data_reader import DataReader
+from pond_batch_calculator import PondBatchCalculator
+from graph_renderer import GraphRenderer
+
+
+#CONSTANTS
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DEFAULT_WORKBOOKS = ["example_data.xls", "longer_example_data_file.xls"]
+DEFAULT_DEPTH_INTERVALS = [0.1, 0.05, 0.01]
+DEFAULT_TIME_INTERVALS = [0.25, 0.5]  # exact in binary. The hourly filter (times mod interval == 0) drops most of a 0.1 grid to rounding.
+DEFAULT_REPEATS = 3
+DEFAULT_OUTPUT_PATH = os.path.join(tempfile.gettempdir(), "benchmark_results.json")  # not the repo
+DEFAULT_KERNEL_EVALUATIONS = 20000  # the scalar benthic kernel manages only about 10,000 per second.
+PARSE_MODES = ["default", "low_memory", "streaming"]
+SOAK_TEST_GRAPHS = 10000
+SOAK_SAMPLE_SECONDS = 1.0
+
+
+
+def time_call(function, repeats=DEFAULT_REPEATS, setup=None):
+    '''
+    Runs function repeats times and keeps the best time.
+    @param function: takes no arguments.
+    @param setup: called before every run, untimed. For example, to clear memoized results.
+    @return: fastest time, in seconds, and the result of the last run.
+    @rtype: tuple
+    '''
+    best = None
+    result = None
+    for _ in range(repeats):
+        if(setup is not None):
+            setup()
+        start = time.time()
+        result = function()
+        elapsed = time.time() - start
+        if(best is None or elapsed < best):
+            best = elapsed
+    return best, result
+
+
+
+def clear_results(pond_list):
+    '''
+    Throws away memoized results so every timed run actually calculates.
+    '''
+    for pond in pond_list:
+        pond.clear_results_cache()
+
+
+
+def benchmark_workbook(path, depth_intervals, time_intervals, repeats):
+    '''
+    @param path: path to a workbook
+    @return: timings, in seconds, for parsing and for every (depth interval, time interval) pair.
+    @rtype: dict
+    '''
+    #imported here so the rest of the suite works without flask installed.
+    from flask_app import create_export_workbook
+
+    parse_seconds, pond_list = time_call(lambda: DataReader(path).read(), repeats)
+    workbook_result = {"ponds": len(pond_list),
+                       "parse_seconds": parse_seconds,
+                       "sweep": []}
+
+    for time_interval in time_intervals:
+        for pond in pond_list:
+            pond.set_time_interval(time_interval)
+        for depth_interval in depth_intervals:
+            def benthic_daily():
+                return [pond.calculate_daily_whole_lake_benthic_primary_production_m2(depth_interval) for pond in pond_list]
+
+            def phytoplankton_daily():
+                return [pond.calculate_daily_whole_lake_phytoplankton_primary_production_m2(depth_interval) for pond in pond_list]
+
+            def hourly_layers():
+                return [pond.calculate_hourly_phytoplankton_primary_production_rates_list_over_whole_day_in_thermal_layer(layer, depth_interval)
+                        for pond in pond_list for layer in range(len(pond.get_thermal_layer_depths()))]
+
+            def batch():
+                return PondBatchCalculator(depth_interval).calculate(pond_list)
+
+            reset = lambda: clear_results(pond_list)
+            benthic_seconds, benthic_values = time_call(benthic_daily, repeats, reset)
+            phytoplankton_seconds, phytoplankton_values = time_call(phytoplankton_daily, repeats, reset)
+            hourly_seconds, _ = time_call(hourly_layers, repeats, reset)
+            batch_seconds, _ = time_call(batch, repeats)
+            workbook_result["sweep"].append({"depth_interval": depth_interval,
+                                             "time_interval": time_interval,
+                                             "benthic_daily_seconds": benthic_seconds,
+                                             "phytoplankton_daily_seconds": phytoplankton_seconds,
+                                             "hourly_layers_seconds": hourly_seconds,
+                                             "batch_seconds": batch_seconds,
+                                             "benthic_daily": benthic_values,  # so two runs can be checked for matching answers, too.
+                                             "phytoplankton_daily": phytoplankton_values})
+
+    for pond in pond_list:
+        pond.set_time_interval(DataReader.DEFAULT_TIME_INTERVAL)
+    workbook_result["export_seconds"], _ = time_call(lambda: create_export_workbook(pond_list), repeats, lambda: clear_results(pond_list))
+    return workbook_result
+
+
+
+def parse_with_mode(path, mode):
+    '''
+    Reads a workbook with one DataReader mode.
+    @param mode: one of PARSE_MODES
+    @return: number of ponds read
+    @rtype: int
+    '''
+    if(mode == "default"):
+        return len(DataReader(path).read())
+    elif(mode == "low_memory"):
+        return len(DataReader(path, low_memory=True).read())
+    elif(mode == "streaming"):
+        return sum(1 for _ in DataReader(path).iterate_ponds())
+    raise Exception("unknown parse mode: ", mode)
+
+
+
+def get_peak_rss_megabytes():
+    '''
+    @return: the most memory this process has used so far, in megabytes.
+    @rtype: float
+    '''
+    import resource #not on Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if(sys.platform == "darwin"):
+        return peak / (1024.0 * 1024.0) #bytes
+    return peak / 1024.0 #kilobytes
+
+
+
+def measure_parse(path, mode):
+    '''
+    Runs in the child process started by benchmark_parse_modes().
+    @return: ponds, parse seconds, and peak RSS before and after parsing.
+    @rtype: dict
+    '''
+    rss_before_parse = get_peak_rss_megabytes()
+    start = time.time()
+    ponds = parse_with_mode(path, mode)
+    return {"ponds": ponds,
+            "parse_seconds": time.time() - start,
+            "rss_before_parse_mb": rss_before_parse,
+            "peak_rss_mb": get_peak_rss_megabytes()}
+
+
+
+def benchmark_parse_modes(path, modes=PARSE_MODES):
+    '''
+    Parse time and peak memory for each mode. Each is measured in a new python process, since peak RSS never goes back down.
+    @param path: path to a workbook
+    @rtype: dict
+    '''
+    mode_results = {}
+    for mode in modes:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--measure-parse", mode, path])
+        mode_results[mode] = json.loads(output.strip().splitlines()[-1])
+    return mode_results
+
+
+
+def get_current_rss_megabytes():
+    '''
+    @return: memory in use right now, in megabytes. Where that can't be read (not Linux), the peak so far instead.
+    @rtype: float
+    '''
+    try:
+        with open("/proc/self/statm") as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+    except (IOError, OSError, ValueError):
+        return get_peak_rss_megabytes()
+
+
+
+def benchmark_graph_soak(pond, number_of_graphs=SOAK_TEST_GRAPHS, number_of_threads=1):
+    '''
+    Renders the same kind of layer graphs the site serves, over and over, sampling memory as it goes.
+    Memory should level off after the first few graphs and then stay flat.
+    @param pond: a Pond. Its layers' hourly series are graphed in turn.
+    @param number_of_graphs: how many graphs to render in total
+    @param number_of_threads: how many threads render at once
+    @rtype: dict
+    '''
+    results = PondBatchCalculator().calculate([pond])[0]
+    number_of_times = results["number_of_times"]
+    times = results["times"][:number_of_times].tolist()
+    series = [results["layer_hourly"][layer, :number_of_times].tolist() for layer in range(results["number_of_layers"])]
+
+    counter_lock = threading.Lock()
+    progress = {"started": 0, "finished": 0}
+    errors = []
+
+    def render_graphs():
+        renderer = GraphRenderer()
+        while True:
+            with counter_lock:
+                graph_number = progress["started"]
+                if(graph_number >= number_of_graphs):
+                    return
+                progress["started"] += 1
+            layer = graph_number % len(series)
+            try:
+                renderer.render_png(times, series[layer], "hour", "PPPR (mgC*m^-3)", "PPPR, "+str(pond.get_lake_id())+" layer "+str(layer+1), 3)
+            except Exception as e:
+                errors.append(str(e))
+            with counter_lock:
+                progress["finished"] += 1
+
+    samples = [[0, get_current_rss_megabytes()]]
+    workers = [threading.Thread(target=render_graphs) for _ in range(number_of_threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    while any(worker.is_alive() for worker in workers):
+        time.sleep(SOAK_SAMPLE_SECONDS)
+        samples.append([progress["finished"], get_current_rss_megabytes()])
+    seconds = time.time() - start
+    samples.append([progress["finished"], get_current_rss_megabytes()])
+
+    #growth after warm-up: from the first sample past a tenth of the graphs, to the end.
+    warm_samples = [sample for sample in samples if sample[0] >= number_of_graphs // 10] or samples
+    return {"graphs": progress["finished"],
+            "threads": number_of_threads,
+            "errors": len(errors),
+            "seconds": seconds,
+            "graphs_per_second": progress["finished"] / max(seconds, 1e-9),
+            "rss_samples": samples,  # [graphs rendered, RSS in MB]
+            "rss_after_warm_up_mb": warm_samples[0][1],
+            "rss_at_end_mb": samples[-1][1],
+            "rss_growth_after_warm_up_mb": samples[-1][1] - warm_samples[0][1]}
+
+
+
+def benchmark_kernels(pond, evaluations, repeats):
+    '''
+    P-I kernel evaluations per second, scalar (one depth and time per call) versus array (a whole depth x time grid per call).
+    Both include looking up the P-I parameters for each depth.
+    @param pond: a Pond with benthic and phytoplankton measurements
+    @param evaluations: how many light/depth values to evaluate.
+    @rtype: dict
+    '''
+    max_depth = pond.calculate_photic_zone_lower_bound()
+    number_of_times = 50
+    number_of_depths = max(1, evaluations // number_of_times)
+    depths = np.linspace(0.0, max_depth, number_of_depths)
+    times = np.linspace(0.0, pond.get_length_of_day(), number_of_times)
+    light_matrix = pond.calculate_light_at_depths_and_times(depths, times)
+    light_list = light_matrix.tolist()
+    depths_list = depths.tolist()
+    count = light_matrix.size
+
+    def phytoplankton_scalar():
+        for depth, light_row in zip(depths_list, light_list):
+            for light in light_row:
+                pond.calculate_phytoplankton_primary_productivity(light, depth)
+
+    def phytoplankton_array():
+        pond.calculate_phytoplankton_primary_productivity_array(light_matrix, depths)
+
+    def benthic_scalar():
+        for depth, light_row in zip(depths_list, light_list):
+            for light in light_row:
+                pmax = pond.get_benthic_pmax_at_depth(depth)
+                ik = pond.get_benthic_ik_at_depth(depth)
+                pond.calculate_benthic_primary_production_z_t(light, pmax, ik)
+
+    def benthic_array():
+        pmax = pond.get_benthic_pmax_at_depths(depths)[:, np.newaxis]
+        ik = pond.get_benthic_ik_at_depths(depths)[:, np.newaxis]
+        pond.calculate_benthic_primary_production_z_t(light_matrix, pmax, ik)
+
+    kernel_result = {"evaluations": count}
+    for name, function in [("phytoplankton_scalar", phytoplankton_scalar),
+                           ("phytoplankton_array", phytoplankton_array),
+                           ("benthic_scalar", benthic_scalar),
+                           ("benthic_array", benthic_array)]:
+        seconds, _ = time_call(function, repeats)
+        kernel_result[name + "_evaluations_per_second"] = count / max(seconds, 1e-9)
+    return kernel_result
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark primary production calculations on the example workbooks.")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT_PATH, help="where to write the JSON results")
+    parser.add_argument("-w", "--workbooks", nargs="+", default=DEFAULT_WORKBOOKS, help="workbooks in static/, or paths")
+    parser.add_argument("-d", "--depth-intervals", nargs="+", type=float, default=DEFAULT_DEPTH_INTERVALS, help="depth intervals to sweep, in meters")
+    parser.add_argument("-t", "--time-intervals", nargs="+", type=float, default=DEFAULT_TIME_INTERVALS, help="time intervals to sweep, in hours")
+    parser.add_argument("-r", "--repeats", type=int, default=DEFAULT_REPEATS, help="runs per timing. The fastest is kept.")
+    parser.add_argument("-k", "--kernel-evaluations", type=int, default=DEFAULT_KERNEL_EVALUATIONS, help="P-I evaluations per kernel timing")
+    parser.add_argument("-p", "--parse-modes", nargs="+", choices=PARSE_MODES, default=PARSE_MODES, help="DataReader modes to measure parse time and peak memory for")
+    parser.add_argument("-g", "--graph-soak", type=int, default=0, help="render this many graphs and sample memory. "+str(SOAK_TEST_GRAPHS)+" for the soak test. 0 skips it.")
+    parser.add_argument("--graph-threads", type=int, default=1, help="threads rendering graphs at once, for the soak test")
+    parser.add_argument("--measure-parse", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS) #used by benchmark_parse_modes
+    args = parser.parse_args()
+
+    if(args.measure_parse is not None):
+        mode, path = args.measure_parse
+        print json.dumps(measure_parse(path, mode))
+        return
+
+    results = {"python": platform.python_version(),
+               "numpy": np.__version__,
+               "machine": platform.platform(),
+               "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "workbooks": {},
+               "kernels": None,
+               "graph_soak": None}
+
+    for workbook in args.workbooks:
+        path = workbook
+        if(not os.path.exists(path)):
+            path = os.path.join(STATIC_FOLDER, workbook)
+        print "benchmarking", workbook
+        results["workbooks"][workbook] = benchmark_workbook(path, args.depth_intervals, args.time_intervals, args.repeats)
+        results["workbooks"][workbook]["parse_modes"] = benchmark_parse_modes(path, args.parse_modes)
+
+    kernel_pond = DataReader(os.path.join(STATIC_FOLDER, DEFAULT_WORKBOOKS[0])).read()[0]
+    print "benchmarking P-I kernels"
+    results["kernels"] = benchmark_kernels(kernel_pond, args.kernel_evaluations, args.repeats)
+
+    if(args.graph_soak > 0):
+        print "rendering", args.graph_soak, "graphs on", args.graph_threads, "threads"
+        results["graph_soak"] = benchmark_graph_soak(kernel_pond, args.graph_soak, args.graph_threads)
+        print "RSS growth after warm-up:", results["graph_soak"]["rss_growth_after_warm_up_mb"], "MB"
+
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2, sort_keys=True)
+    print "wrote", args.output
+    json.dump(results["kernels"], sys.stdout, indent=2, sort_keys=True)
+    print
+
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 '''
 Created on Mar 5, 2015
 
-This class reads in data from an excel file, packages it up, and sends it to the model for processing.
+This class reads in data from an excel file (or csv files), packages it up, and sends it to the model for processing.
 
 @author: cdleong
 '''
 import xlrd, xlwt #reading and writing, respectively.
+import openpyxl #streaming .xlsx reading
 from pond import Pond
 from numpy.distutils.npy_pkg_config import FormatError
 
@@ -15,6 +16,14 @@ from bathymetric_pond_shape import BathymetricPondShape
 
 from phytoplankton_photosynthesis_measurement import PhytoPlanktonPhotosynthesisMeasurement
 import sys
+import os
+import csv
+import codecs
+import zipfile
+import StringIO
+import itertools
+import tempfile
+import numpy as np
 
 
 
@@ -114,6 +123,58 @@ class DataReader(object):
     shape_area_index = shape_depth_index+1 #"kat_div" in meters squared.
 
 
+    ###############
+    #Column types and valid ranges
+    ###############
+    #columns read as numbers.
+    NUMERIC_COLUMNS = {POND_DATA_SHEET_NAME: [yearIndex, dayOfYearIndex, kd_index, noon_surface_light_index, length_of_day_index],
+                       BENTHIC_PHOTO_DATA_SHEET_NAME: [yearIndex, dayOfYearIndex, benthic_light_penetration_proportion_index, benthic_pmax_index, benthic_ik_index],
+                       PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME: [yearIndex, dayOfYearIndex, phyto_thermal_layer_index, phyto_depth_index, phyto_pmax_index, phyto_alpha_index, phyto_beta_index],
+                       SHAPE_DATA_SHEET_NAME: [shape_depth_index, shape_area_index]}
+
+    #columns read as text.
+    TEXT_COLUMNS = {POND_DATA_SHEET_NAME: [lakeIDIndex],
+                    BENTHIC_PHOTO_DATA_SHEET_NAME: [lakeIDIndex],
+                    PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME: [lakeIDIndex],
+                    SHAPE_DATA_SHEET_NAME: [shape_ID_index]}
+
+    #valid ranges, checked a whole column at a time. column index: (minimum, maximum, clamp)
+    #clamp=True sets values outside the range to the closest valid value, like the Pond setters do.
+    #clamp=False rejects the file, like the PhytoPlanktonPhotosynthesisMeasurement setters do.
+    COLUMN_RANGES = {POND_DATA_SHEET_NAME: {yearIndex: (Pond.MINIMUM_VALID_YEAR, Pond.MAXIMUM_VALID_YEAR, True),
+                                            dayOfYearIndex: (Pond.MINIMUM_VALID_DAY, Pond.MAXIMUM_VALID_DAY, True),
+                                            kd_index: (Pond.MINIMUM_LIGHT_ATTENUATION_COEFFICIENT, Pond.MAXIMUM_LIGHT_ATTENUATION_COEFFICIENT, True),
+                                            noon_surface_light_index: (Pond.MINIMUM_NOON_SURFACE_LIGHT, Pond.MAXIMUM_NOON_SURFACE_LIGHT, True),
+                                            length_of_day_index: (Pond.MINIMUM_LENGTH_OF_DAY, Pond.MAXIMUM_LENGTH_OF_DAY, True)},
+                     BENTHIC_PHOTO_DATA_SHEET_NAME: {},
+                     PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME: {phyto_thermal_layer_index: (PhytoPlanktonPhotosynthesisMeasurement.MIN_VALID_THERMAL_LAYER, PhytoPlanktonPhotosynthesisMeasurement.MAX_VALID_THERMAL_LAYER, False),
+                                                           phyto_depth_index: (PhytoPlanktonPhotosynthesisMeasurement.MIN_VALID_DEPTH, PhytoPlanktonPhotosynthesisMeasurement.MAX_VALID_DEPTH, False),
+                                                           phyto_pmax_index: (PhytoPlanktonPhotosynthesisMeasurement.MIN_VALID_PMAX, PhytoPlanktonPhotosynthesisMeasurement.MAX_VALID_PMAX, False),
+                                                           phyto_alpha_index: (PhytoPlanktonPhotosynthesisMeasurement.MIN_VALID_ALPHA, PhytoPlanktonPhotosynthesisMeasurement.MAX_VALID_ALPHA, False),
+                                                           phyto_beta_index: (PhytoPlanktonPhotosynthesisMeasurement.MIN_VALID_BETA, PhytoPlanktonPhotosynthesisMeasurement.MAX_VALID_BETA, False)},
+                     SHAPE_DATA_SHEET_NAME: {}}
+
+    MAXIMUM_ROWS_IN_ERROR_MESSAGE = 10
+    XLSX_ROWS_PER_VALIDATION = 4096 #xlsx rows are streamed, so they're converted and validated this many at a time.
+
+
+    ###############
+    #CSV
+    ###############
+    #csv files hold the same four tables as the workbook sheets, with the same columns.
+    CSV_TABLE_NAMES = [POND_DATA_SHEET_NAME, BENTHIC_PHOTO_DATA_SHEET_NAME, PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME, SHAPE_DATA_SHEET_NAME]
+    CSV_EXTENSION = "csv" #one long-format csv, all four tables in it
+    CSV_ZIP_EXTENSION = "zip" #one csv per table
+    CSV_TABLE_INDEX = 0 #in the long format, the first column says which table the row is from
+    CSV_TABLE_COLUMN_HEADING = "table"
+
+
+    ###############
+    #XLSX
+    ###############
+    XLSX_EXTENSION = "xlsx" #read row by row with openpyxl, never holding a whole sheet in memory.
+
+
     ###############
     #CONSTANTS
     ###############
@@ -121,11 +182,18 @@ class DataReader(object):
     DEFAULT_TIME_INTERVAL = 0.25
 
 
-    def __init__(self, filename, testFlag=0):
+    def __init__(self, filename, testFlag=0, low_memory=False):
         '''
         Constructor
+        @param filename: file to read with read()
+        @param low_memory: for .xls, load only the four data sheets, one at a time, and unload each once read.
+        Slower on small files, but peak memory stays lower. 
         '''
         self.filename = filename
+        self.low_memory = low_memory
+        self.ponds_by_key = {} #(lake ID, day of year, year) -> Pond. Filled in by read_pond_list_from_workbook
+        self.ponds_by_lake_id = {} #lake ID -> list of Ponds for that lake, in the order they were read.
+        self.shapes_by_lake_id = {} #lake ID -> the one BathymetricPondShape shared by every Pond of that lake.
 
 
 
@@ -136,8 +204,15 @@ class DataReader(object):
 
     #TODO: this should return nothing. Bad style. Or rename it.
     def read(self):
+        extension = self.get_extension(self.filename)
+        if(extension == self.XLSX_EXTENSION):
+            return self.read_pond_list_from_xlsx(self.filename) #openpyxl streams straight from the file
+        if(extension in [self.CSV_EXTENSION, self.CSV_ZIP_EXTENSION]):
+            with open(self.filename, "rb") as input_file:
+                return self.readFile(input_file.read(), extension)
+
         try:
-            book = xlrd.open_workbook(self.filename)
+            book = xlrd.open_workbook(self.filename, on_demand=self.low_memory) #on_demand: sheets load when first asked for
         except:
             raise Exception("error in read method. xlrd.open_workbook gave an Exception with filename: ", self.filename)
 
@@ -146,14 +221,25 @@ class DataReader(object):
     
 
     #TODO: redundant with read()
-    def readFile(self,inputfile):
+    def readFile(self,inputfile, extension=None):
         '''
         READ FILE
         Given an inputFile object, opens the workbook and calls the function to read the pond_list.
+        @param inputfile: the contents of the file
+        @param extension: file extension, e.g. "xls", "xlsx", "csv" or "zip". csv and zip are read as csv. xlsx is streamed with openpyxl. Anything else is read with xlrd.
         '''
+        if(extension is not None):
+            extension = extension.lower()
+        if(extension == self.XLSX_EXTENSION):
+            return self.read_pond_list_from_xlsx(StringIO.StringIO(inputfile))
+        elif(extension == self.CSV_EXTENSION):
+            return self.read_pond_list_from_long_csv(inputfile)
+        elif(extension == self.CSV_ZIP_EXTENSION):
+            return self.read_pond_list_from_csv_zip(inputfile)
+
         #http://stackoverflow.com/questions/10458388/how-do-you-read-excel-files-with-xlrd-on-appengine
         try:
-            book =  xlrd.open_workbook(file_contents=inputfile)
+            book =  xlrd.open_workbook(file_contents=inputfile, on_demand=self.low_memory)
         except IOError:
             raise Exception ("Error in readFile. xlrd.open_workbook(file_contents=inputfile) gave exception with inputfile", inputfile)
 
@@ -161,10 +247,121 @@ class DataReader(object):
         return self.read_pond_list_from_workbook(book)
 
 
+    def iterate_ponds(self):
+        '''
+        Streaming version of read(). See iterate_ponds_from_rows().
+        @return: each Pond, as soon as all of its rows have been read.
+        @rtype: generator of Pond
+        '''
+        extension = self.get_extension(self.filename)
+        if(extension == self.XLSX_EXTENSION):
+            return self.iterate_ponds_from_xlsx(self.filename)
+        with open(self.filename, "rb") as input_file:
+            return self.iterate_ponds_from_file(input_file.read(), extension)
+
+
+    def iterate_ponds_from_file(self, inputfile, extension=None):
+        '''
+        Streaming version of readFile(). See iterate_ponds_from_rows().
+        @param inputfile: the contents of the file
+        @param extension: file extension, e.g. "xls", "xlsx", "csv" or "zip".
+        @return: each Pond, as soon as all of its rows have been read.
+        @rtype: generator of Pond
+        '''
+        if(extension is not None):
+            extension = extension.lower()
+        if(extension == self.XLSX_EXTENSION):
+            return self.iterate_ponds_from_xlsx_contents(inputfile)
+        elif(extension == self.CSV_EXTENSION):
+            return self.iterate_ponds_from_tables(self.read_long_csv_tables(inputfile))
+        elif(extension == self.CSV_ZIP_EXTENSION):
+            return self.iterate_ponds_from_tables(self.read_csv_zip_tables(inputfile))
+
+        try:
+            book =  xlrd.open_workbook(file_contents=inputfile, on_demand=self.low_memory)
+        except IOError:
+            raise Exception ("Error in iterate_ponds_from_file. xlrd.open_workbook(file_contents=inputfile) gave exception with inputfile", inputfile)
+        return self.iterate_ponds_from_rows(*self.get_workbook_rows(book))
+
+
+    def get_extension(self, filename):
+        '''
+        @return: the file extension, lowercase, without the dot. Empty if there isn't one.
+        @rtype: str
+        '''
+        return os.path.splitext(filename)[1].lstrip(".").lower()
+
+
     #reads all the pond data from the excel file.
 
 
 
+    ##################################
+    # Pond index
+    ##################################
+
+    def get_pond_key(self, lake_id, day_of_year, year):
+        '''
+        Normalizes the values that identify a Pond, so that e.g. day 165.0 read from a cell matches day 165.
+        Not rounded, so day 200.5 is still a different Pond from day 200, like it always was.
+        @return: (lake ID, day of year, year)
+        @rtype: tuple
+        '''
+        return (lake_id, float(day_of_year), float(year))
+
+
+    def clear_pond_index(self):
+        '''
+        Empties the pond lookups and the shape registry before reading a new workbook.
+        '''
+        self.ponds_by_key = {}
+        self.ponds_by_lake_id = {}
+        self.shapes_by_lake_id = {}
+
+
+    def index_pond(self, pond, key):
+        '''
+        Adds a Pond to the lookups.
+        @param pond: a Pond
+        @param key: from get_row_pond_key(), for the row the Pond was made from. 
+        Not from the Pond itself, since Pond.get_day_of_year() rounds the day down.
+        '''
+        self.ponds_by_key[key] = pond
+        self.ponds_by_lake_id.setdefault(pond.get_lake_id(), []).append(pond)
+
+
+    def find_pond(self, lake_id, day_of_year, year):
+        '''
+        @return: the Pond with that lake ID, day of year, and year, or None if it hasn't been read.
+        @rtype: Pond
+        '''
+        return self.ponds_by_key.get(self.get_pond_key(lake_id, day_of_year, year))
+
+
+    def get_lake_shape(self, lake_id):
+        '''
+        Every pond-day of a lake shares one shape object, so the bathymetry and everything derived from it 
+        (interpolation, hypsographic tables and weights) is stored and worked out once per lake, not once per day.
+        Changing this object changes the shape of every day of the lake, and throws away all their memoized results.
+        Pond.update_shape() copies it first, so it only changes that one Pond.
+        @return: the shape for lake_id. Starts out empty, and gets filled in from the shape_data sheet.
+        @rtype: BathymetricPondShape
+        '''
+        if(lake_id not in self.shapes_by_lake_id):
+            self.shapes_by_lake_id[lake_id] = BathymetricPondShape({}) #initialize with empty dict
+        return self.shapes_by_lake_id[lake_id]
+
+
+    def find_ponds_in_lake(self, lake_id):
+        '''
+        @return: every Pond read so far with that lake ID. Empty if there are none.
+        @rtype: list
+        '''
+        return self.ponds_by_lake_id.get(lake_id, [])
+
+
+
+
 
 
 
@@ -180,6 +377,18 @@ class DataReader(object):
         @return: list of Pond objects, storing the information in the workbook.
         @rtype: list
         '''
+        return self.read_pond_list_from_rows(*self.get_workbook_rows(book))
+
+    #END OF read_pond_list_from_workbook METHOD
+
+
+    def get_workbook_rows(self, book):
+        '''
+        Finds the four sheets in an xlrd workbook, by name or else by position.
+        @param book: an xlrd Workbook
+        @return: (pond rows, benthic rows, phytoplankton rows, shape rows)
+        @rtype: tuple
+        '''
         ##############
         #Worksheets
         ##############
@@ -188,11 +397,6 @@ class DataReader(object):
 
         sheet_names = book.sheet_names()
 
-        pond_data_workSheet = xlrd.book
-        benthic_photo_data_workSheet= xlrd.book
-        phytoplankton_photo_data_sheet= xlrd.book
-        shape_data_sheet =xlrd.book
-
 
         if(nsheets<self.DEFAULT_NUMBER_OF_SHEETS): #Pond, benthic, planktonic. Guide optional.
             raise IOError("file format incorrect. Number of sheets less than expected")
@@ -201,33 +405,332 @@ class DataReader(object):
            self.BENTHIC_PHOTO_DATA_SHEET_NAME in sheet_names and
            self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME in sheet_names and
            self.SHAPE_DATA_SHEET_NAME in sheet_names):
-            pond_data_workSheet = book.sheet_by_name(self.POND_DATA_SHEET_NAME)
-            benthic_photo_data_workSheet = book.sheet_by_name(self.BENTHIC_PHOTO_DATA_SHEET_NAME)
-            phytoplankton_photo_data_sheet = book.sheet_by_name(self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME)
-            shape_data_sheet = book.sheet_by_name(self.SHAPE_DATA_SHEET_NAME)
+            sheet_indices = [sheet_names.index(self.POND_DATA_SHEET_NAME),
+                             sheet_names.index(self.BENTHIC_PHOTO_DATA_SHEET_NAME),
+                             sheet_names.index(self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME),
+                             sheet_names.index(self.SHAPE_DATA_SHEET_NAME)]
         else:
             #Standard sheet names not detected. Attempting to read using sheet indices.
-            pond_data_workSheet = book.sheet_by_index(self.POND_DATA_SHEET_INDEX)
-            benthic_photo_data_workSheet = book.sheet_by_index(self.BENTHIC_PHOTO_DATA_SHEET_INDEX)
-            phytoplankton_photo_data_sheet = book.sheet_by_name(self.PHYTOPLANKTON_PHOTO_DATA_SHEET_INDEX)
-            shape_data_sheet = book.sheet_by_name(self.SHAPE_DATA_SHEET_INDEX)
+            sheet_indices = [self.POND_DATA_SHEET_INDEX,
+                             self.BENTHIC_PHOTO_DATA_SHEET_INDEX,
+                             self.PHYTOPLANKTON_PHOTO_DATA_SHEET_INDEX,
+                             self.SHAPE_DATA_SHEET_INDEX]
+
+        table_rows = []
+        for table_name, sheet_index in zip(self.CSV_TABLE_NAMES, sheet_indices):
+            table_rows.append(self.get_sheet_rows(book.sheet_by_index(sheet_index), table_name))
+            if(self.low_memory and book.sheet_loaded(sheet_index)):
+                book.unload_sheet(sheet_index) #get_sheet_rows copied out everything we need
+        if(self.low_memory):
+            book.release_resources() #the raw file, kept so more sheets could be loaded
+        return tuple(table_rows)
+
+
+    def read_pond_list_from_xlsx(self, xlsx_file):
+        '''
+        READ POND LIST FROM XLSX
+        
+        Opens an .xlsx workbook in openpyxl's read-only mode, and streams each sheet's rows straight into pond assembly.
+        Only one row at a time is in memory, so there's no limit on the number of rows, unlike .xls.
+        @param xlsx_file: path to the workbook, or a file-like object holding it.
+        @return: list of Pond objects, storing the information in the workbook.
+        @rtype: list
+        '''
+        book = self.open_xlsx_workbook(xlsx_file)
+        try:
+            return self.read_pond_list_from_rows(*self.get_xlsx_rows(book))
+        finally:
+            book.close() #read-only workbooks keep the file open until closed
 
-        ##############
-        #Rows, Columns
-        ##############
 
-        pond_data_workSheet_num_rows = pond_data_workSheet.nrows
-        benthic_data_workSheet_num_rows = benthic_photo_data_workSheet.nrows
-        phytoplankton_photo_data_sheet_num_rows = phytoplankton_photo_data_sheet.nrows
-        shape_data_sheet_num_rows = shape_data_sheet.nrows
+    def iterate_ponds_from_xlsx(self, xlsx_path):
+        '''
+        Streaming version of read_pond_list_from_xlsx(). The sheets are read side by side, one row at a time.
+        @param xlsx_path: path to the workbook. Not a file-like object: reading several sheets of one
+        in-memory zip at once mixes up their data, so use iterate_ponds_from_xlsx_contents() for those.
+        @rtype: generator of Pond
+        '''
+        book = self.open_xlsx_workbook(xlsx_path)
+        try:
+            for pond in self.iterate_ponds_from_rows(*self.get_xlsx_rows(book)):
+                yield pond
+        finally:
+            book.close()
+
+
+    def iterate_ponds_from_xlsx_contents(self, xlsx_contents):
+        '''
+        Writes the workbook to a temporary file, so each sheet gets its own file handle, and streams from that.
+        @param xlsx_contents: the .xlsx file, as a string of bytes
+        @rtype: generator of Pond
+        '''
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix="."+self.XLSX_EXTENSION)
+        try:
+            with os.fdopen(file_descriptor, "wb") as temporary_file:
+                temporary_file.write(xlsx_contents)
+            for pond in self.iterate_ponds_from_xlsx(temporary_path):
+                yield pond
+        finally:
+            os.remove(temporary_path)
+
+
+    def open_xlsx_workbook(self, xlsx_file):
+        '''
+        @param xlsx_file: path to the workbook, or a file-like object holding it.
+        @return: the workbook, in openpyxl's read-only mode. Close it when done.
+        @rtype: openpyxl Workbook
+        '''
+        try:
+            return openpyxl.load_workbook(xlsx_file, read_only=True, data_only=True)
+        except Exception as e:
+            raise IOError("file format incorrect. openpyxl could not open the .xlsx workbook: "+str(e))
+
+
+    def get_xlsx_rows(self, book):
+        '''
+        Finds the four sheets in an openpyxl workbook, by name or else by position.
+        @param book: an openpyxl read-only Workbook
+        @return: (pond rows, benthic rows, phytoplankton rows, shape rows), each a generator.
+        @rtype: tuple
+        '''
+        sheet_names = book.sheetnames
+        if(len(sheet_names)<self.DEFAULT_NUMBER_OF_SHEETS): #Pond, benthic, planktonic. Guide optional.
+            raise IOError("file format incorrect. Number of sheets less than expected")
+
+        if(self.POND_DATA_SHEET_NAME in sheet_names and
+           self.BENTHIC_PHOTO_DATA_SHEET_NAME in sheet_names and
+           self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME in sheet_names and
+           self.SHAPE_DATA_SHEET_NAME in sheet_names):
+            pond_data_workSheet = book[self.POND_DATA_SHEET_NAME]
+            benthic_photo_data_workSheet = book[self.BENTHIC_PHOTO_DATA_SHEET_NAME]
+            phytoplankton_photo_data_sheet = book[self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME]
+            shape_data_sheet = book[self.SHAPE_DATA_SHEET_NAME]
+        else:
+            #Standard sheet names not detected. Attempting to read using sheet indices.
+            pond_data_workSheet = book.worksheets[self.POND_DATA_SHEET_INDEX]
+            benthic_photo_data_workSheet = book.worksheets[self.BENTHIC_PHOTO_DATA_SHEET_INDEX]
+            phytoplankton_photo_data_sheet = book.worksheets[self.PHYTOPLANKTON_PHOTO_DATA_SHEET_INDEX]
+            shape_data_sheet = book.worksheets[self.SHAPE_DATA_SHEET_INDEX]
+
+        return (self.get_xlsx_sheet_rows(pond_data_workSheet, self.POND_DATA_SHEET_NAME),
+                self.get_xlsx_sheet_rows(benthic_photo_data_workSheet, self.BENTHIC_PHOTO_DATA_SHEET_NAME),
+                self.get_xlsx_sheet_rows(phytoplankton_photo_data_sheet, self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME),
+                self.get_xlsx_sheet_rows(shape_data_sheet, self.SHAPE_DATA_SHEET_NAME))
+
+
+    def get_xlsx_sheet_rows(self, sheet, table_name):
+        '''
+        Streams a worksheet, converting and validating XLSX_ROWS_PER_VALIDATION rows at a time with validate_columns(), 
+        the same checks the xls and csv readers make.
+        @param sheet: an openpyxl read-only worksheet
+        @param table_name: which table the sheet holds, e.g. POND_DATA_SHEET_NAME
+        @return: the values in each data row, skipping the column headings and blank rows. 
+        Numbers are floats and text is unicode, the same as xlrd gives.
+        @rtype: generator of lists
+        '''
+        first_row = self.DEFAULT_FIRST_DATA_ROW+1 #openpyxl counts rows from 1
+        number_of_columns = self.get_number_of_columns(table_name)
+        rows = []
+        row_numbers = []
+        for row_number, row in enumerate(sheet.iter_rows(min_row=first_row, values_only=True), first_row):
+            if(all(value is None for value in row)):
+                continue
+            values = []
+            for value in row[:number_of_columns]:
+                if(isinstance(value, (int, long)) and not isinstance(value, bool)):
+                    value = float(value)
+                elif(isinstance(value, str)):
+                    value = value.decode("utf-8")
+                elif(value is None):
+                    value = u"" #xlrd reads empty cells as empty text
+                values.append(value)
+            values.extend([u""] * (number_of_columns - len(values))) #trailing empty cells may not be there at all
+            rows.append(values)
+            row_numbers.append(row_number)
+            if(len(rows) >= self.XLSX_ROWS_PER_VALIDATION):
+                for validated_row in self.validate_rows(table_name, rows, row_numbers):
+                    yield validated_row
+                rows = []
+                row_numbers = []
+        for validated_row in self.validate_rows(table_name, rows, row_numbers):
+            yield validated_row
+
+
+    def validate_rows(self, table_name, rows, row_numbers):
+        '''
+        Row-wise front end to validate_columns(), for readers that get their data a row at a time.
+        @param table_name: e.g. POND_DATA_SHEET_NAME
+        @param rows: lists of cell values, each get_number_of_columns() long. No column headings.
+        @param row_numbers: row number of each row, used in error messages.
+        @return: the validated rows
+        @rtype: list of lists
+        '''
+        if(len(rows) == 0):
+            return []
+        columns = {}
+        for column_index in range(self.get_number_of_columns(table_name)):
+            values = [row[column_index] for row in rows]
+            if(column_index in self.NUMERIC_COLUMNS[table_name]):
+                columns[column_index] = self.convert_column_to_floats(values)
+            else:
+                columns[column_index] = values
+        columns = self.validate_columns(table_name, columns, row_numbers)
+        return self.get_rows_from_columns(columns)
+
+
+    def get_sheet_rows(self, sheet, table_name):
+        '''
+        Reads a worksheet a whole column at a time, converts and validates each column in bulk, then hands back rows.
+        @param sheet: an xlrd worksheet
+        @param table_name: which table the sheet holds, e.g. POND_DATA_SHEET_NAME
+        @return: the values in each data row, skipping the column headings and blank rows.
+        @rtype: list of lists
+        '''
+        first_row = self.DEFAULT_FIRST_DATA_ROW #start at 1. row 0 is column headings
+        if(sheet.nrows <= first_row):
+            return []
+
+        number_of_columns = self.get_number_of_columns(table_name)
+        if(sheet.ncols < number_of_columns):
+            raise IOError("file format incorrect. Expected at least "+str(number_of_columns)+" columns in "+table_name)
+
+        columns = {}
+        for column_index in range(number_of_columns):
+            values = sheet.col_values(column_index, start_rowx=first_row)
+            if(column_index in self.NUMERIC_COLUMNS[table_name]):
+                columns[column_index] = self.convert_column_to_floats(values)
+            else:
+                columns[column_index] = values
+        row_numbers = np.arange(first_row, sheet.nrows) + 1 #as numbered in excel, for error messages
+        columns = self.validate_columns(table_name, columns, row_numbers)
+        return self.get_rows_from_columns(columns)
+
+
+    ##################################
+    # Bulk column conversion and validation
+    ##################################
+
+    def get_number_of_columns(self, table_name):
+        '''
+        @return: how many columns of a table are read. 
+        @rtype: int
+        '''
+        return max(self.NUMERIC_COLUMNS[table_name] + self.TEXT_COLUMNS[table_name]) + 1
+
+
+    def convert_column_to_floats(self, values):
+        '''
+        @param values: a column of cell values. Numbers, or text holding numbers.
+        @return: the values as floats. Blank or non-numeric values become NaN, for validate_columns to catch.
+        @rtype: numpy array
+        '''
+        try:
+            return np.array(values, dtype=float)
+        except (ValueError, TypeError):
+            converted = np.empty(len(values), dtype=float)
+            for index, value in enumerate(values):
+                try:
+                    converted[index] = float(value)
+                except (ValueError, TypeError):
+                    converted[index] = np.nan
+            return converted
+
+
+    def validate_columns(self, table_name, columns, row_numbers):
+        '''
+        Checks every column of a table at once.
+        Rows that are entirely blank are dropped. Missing or non-numeric numbers are rejected. 
+        Numbers outside COLUMN_RANGES are set to the closest valid value, or rejected, depending on the column.
+        @param table_name: e.g. POND_DATA_SHEET_NAME
+        @param columns: dict from column index to values. Numeric columns are numpy arrays from convert_column_to_floats.
+        @param row_numbers: row number of each value, used in error messages.
+        @return: the validated columns
+        @rtype: dict
+        '''
+        numeric_columns = self.NUMERIC_COLUMNS[table_name]
+        text_columns = self.TEXT_COLUMNS[table_name]
+        row_numbers = np.asarray(row_numbers)
+
+        blank = np.ones(len(row_numbers), dtype=bool)
+        for column_index in numeric_columns:
+            blank &= np.isnan(columns[column_index])
+        for column_index in text_columns:
+            blank &= np.array([value == u"" for value in columns[column_index]], dtype=bool)
+        if(blank.any()):
+            keep = ~blank
+            for column_index in columns:
+                if(column_index in numeric_columns):
+                    columns[column_index] = columns[column_index][keep]
+                else:
+                    columns[column_index] = [value for value, kept in zip(columns[column_index], keep) if kept]
+            row_numbers = row_numbers[keep]
+
+        for column_index in numeric_columns:
+            missing = np.isnan(columns[column_index])
+            if(missing.any()):
+                raise IOError("file format incorrect. Missing or non-numeric values in "+table_name+" column "+str(column_index+1)+
+                              ", rows "+self.format_row_numbers(row_numbers[missing]))
+
+        for column_index, (minimum, maximum, clamp) in self.COLUMN_RANGES[table_name].items():
+            values = columns[column_index]
+            out_of_range = (values < minimum) | (values > maximum)
+            if(out_of_range.any()):
+                if(clamp):
+                    print "Warning:", np.count_nonzero(out_of_range), "values in", table_name, "column", column_index+1, "are outside", minimum, "to", maximum, "and were set to the closest valid value"
+                    columns[column_index] = np.clip(values, minimum, maximum)
+                else:
+                    raise IOError("file format incorrect. Values in "+table_name+" column "+str(column_index+1)+" must be within "+str(minimum)+" to "+str(maximum)+
+                                  ", rows "+self.format_row_numbers(row_numbers[out_of_range]))
+        return columns
+
+
+    def format_row_numbers(self, row_numbers):
+        '''
+        @return: the first few row numbers, for an error message.
+        @rtype: str
+        '''
+        shown = [str(row_number) for row_number in row_numbers[:self.MAXIMUM_ROWS_IN_ERROR_MESSAGE]]
+        if(len(row_numbers) > self.MAXIMUM_ROWS_IN_ERROR_MESSAGE):
+            shown.append("...")
+        return ", ".join(shown)
+
+
+    def get_rows_from_columns(self, columns):
+        '''
+        @param columns: dict from column index to values, with every index from 0 up.
+        @return: one list of values per row, numbers as python floats.
+        @rtype: list of lists
+        '''
+        ordered_columns = []
+        for column_index in range(len(columns)):
+            values = columns[column_index]
+            if(isinstance(values, np.ndarray)):
+                values = values.tolist()
+            ordered_columns.append(values)
+        return [list(row) for row in zip(*ordered_columns)]
+
 
 
 
+    def read_pond_list_from_rows(self, pond_rows, benthic_rows, phytoplankton_rows, shape_rows):
+        '''
+        READ POND LIST FROM ROWS
+        
+        Builds the list of Pond objects from the rows of the four tables, however they were read (xls, csv...).
+        Each row is a list of cell values, in the same column order as the workbook sheets. No column headings.
+        @param pond_rows: rows of the pond_data table
+        @param benthic_rows: rows of the benthic_photo_data table
+        @param phytoplankton_rows: rows of the phytoplankton_photo_data table
+        @param shape_rows: rows of the shape_data table
+        @return: list of Pond objects
+        @rtype: list
+        '''
 
         #################################################
         #make all the objects!
         #################################################
         pond_list = [] #list of pond objects. The same water body on a different day counts as a separate "Pond"
+        self.clear_pond_index()
 
 
 
@@ -236,37 +739,15 @@ class DataReader(object):
         ################################################
         #Make Pond objects from pond_data sheet
         ################################################
-        sheet = pond_data_workSheet
-        num_rows  = pond_data_workSheet_num_rows #TODO: read until blank space encountered might be better. 
-        curr_row = self.DEFAULT_FIRST_DATA_ROW #start at 1. row 0 is column headings
-        while curr_row<num_rows:
-            row = sheet.row(curr_row)
-
-            #values
-            try:
-                row_year_value = row[self.yearIndex].value
-                row_doy_value = row[self.dayOfYearIndex].value
-                row_lakeID_value = row[self.lakeIDIndex].value
-                row_kd_value = float(row[self.kd_index].value)
-                row_noonlight_value = float(row[self.noon_surface_light_index].value)
-                row_lod_value = float(row[self.length_of_day_index].value)
-            except Exception as e:
-                print str(e)
-                print "Error: couldn't read values properly."
-            
-
-
+        for row in pond_rows:
 
             #Do we need to make a pond object?
             pond = None
-            pond = next((i for i in pond_list if (i.get_lake_id()== row_lakeID_value and 
-                                                 i.get_day_of_year()==row_doy_value and
-                                                 i.get_year() == row_year_value)),None) #source: http://stackoverflow.com/questions/7125467/find-object-in-list-that-has-attribute-equal-to-some-value-that-meets-any-condi
+            pond = self.find_pond(row[self.lakeIDIndex], row[self.dayOfYearIndex], row[self.yearIndex])
             if pond is None: #not in list. Must create Pond object
-                emptyShape = BathymetricPondShape({}) #initialize with empty dict
-                pond = Pond(row_year_value, row_lakeID_value, row_doy_value, row_lod_value, row_noonlight_value, row_kd_value, emptyShape, [], [], self.DEFAULT_TIME_INTERVAL)
+                pond = self.create_pond_from_row(row)
                 pond_list.append(pond)
-            curr_row+=1
+                self.index_pond(pond, self.get_row_pond_key(row))
 
 
 
@@ -275,131 +756,354 @@ class DataReader(object):
         #######################################################
 
 
-
-
         #################################
         #Shape data from shape_data sheet
         #################################
+        #every Pond of a lake shares its shape, so each lake's shape only needs updating once.
+        for lake_id, shape_dict in self.read_shapes_from_rows(shape_rows).items():
+            if(lake_id in self.shapes_by_lake_id): #skip lakes with no Ponds
+                self.get_lake_shape(lake_id).update_shape(BathymetricPondShape(shape_dict))
 
 
-        sheet = shape_data_sheet
-        num_rows = shape_data_sheet_num_rows
-        curr_row = self.DEFAULT_FIRST_DATA_ROW #start at 1. row 0 is column headings
-        while curr_row<num_rows:
-            row = sheet.row(curr_row)
-            
-
-
-            #values
-            row_lakeID_value = row[self.shape_ID_index].value
-            row_depth_value = float(row[self.shape_depth_index].value)
-            row_area_value = float(row[self.shape_area_index].value)    
+        ###############
+        #Benthic data
+        ###############
+        for row in benthic_rows:
+            #find the correct pond
+            pond = None
+            pond = self.find_pond(row[self.lakeIDIndex], row[self.dayOfYearIndex], row[self.yearIndex])
+            if pond is None: #something is terribly wrong
+                raise FormatError("Something went wrong. Benthic Measurement with DOY "+str(row[self.dayOfYearIndex]) + " and Lake ID " + row[self.lakeIDIndex] + " does not match to any Pond.")
+                #TODO: handle this better.
+            else:
+                self.add_benthic_row_to_pond(pond, row)
 
-            row_dict = {row_depth_value:row_area_value}
-            row_shape = BathymetricPondShape(row_dict)
+        #end of for loop
 
+        
+        ###############
+        #Phyto data
+        ###############
+        for row in phytoplankton_rows:
             #find the correct pond
             pond = None
-#             pond = next((i for i in pond_list if (i.get_lake_id()== row_lakeID_value )),None) #source: http://stackoverflow.com/questions/7125467/find-object-in-list-that-has-attribute-equal-to-some-value-that-meets-any-condi
-            #http://stackoverflow.com/questions/14366511/return-the-first-item-in-a-list-matching-a-condition
-#             matchingPonds = filter(next((i for i in pond_list if (i.get_lake_id()== row_lakeID_value )),None), pond_list)
-            for pond in pond_list:
-                if(pond.get_lake_id()==row_lakeID_value):
-                    pond.update_shape(row_shape)                #add to Pond
-            
-            #increment while loop to next row
-            curr_row+=1
+            pond = self.find_pond(row[self.lakeIDIndex], row[self.dayOfYearIndex], row[self.yearIndex])
+            if pond is None: #something is terribly wrong
+                raise FormatError("Something went wrong. Benthic Measurement with DOY "+str(row[self.dayOfYearIndex]) + " and Lake ID " + row[self.lakeIDIndex] + " does not match to any Pond.")
+            else:
+                self.add_phytoplankton_row_to_pond(pond, row)
 
 
 
+        return pond_list
 
+    #END OF read_pond_list_from_rows METHOD
 
 
-        ###############
-        #Benthic data
-        ###############
+    def iterate_ponds_from_rows(self, pond_rows, benthic_rows, phytoplankton_rows, shape_rows):
+        '''
+        ITERATE PONDS FROM ROWS
+        
+        Streaming version of read_pond_list_from_rows(). Yields each Pond as soon as its benthic and phytoplankton rows 
+        are attached, so calculations can start while the rest of the file is still being read.
+        The shape table is read first, whole: benthic depths need the shape, and it only has rows per lake, not per day.
+        The other three tables have to list ponds in the same order, with each pond's rows next to each other,
+        e.g. all sorted by lake, year and day. Only the keys of finished ponds are kept, not the ponds.
+        @param pond_rows: rows of the pond_data table
+        @param benthic_rows: rows of the benthic_photo_data table
+        @param phytoplankton_rows: rows of the phytoplankton_photo_data table
+        @param shape_rows: rows of the shape_data table
+        @return: each Pond, in pond_data order
+        @rtype: generator of Pond
+        @raise IOError: if a measurement row is out of order, or does not match any Pond.
+        '''
+        self.clear_pond_index()
+        for lake_id, shape_dict in self.read_shapes_from_rows(shape_rows).items():
+            self.get_lake_shape(lake_id).update_shape(BathymetricPondShape(shape_dict))
+
+        #consecutive rows for the same pond, as (key, rows)
+        benthic_groups = itertools.groupby(benthic_rows, self.get_row_pond_key)
+        phytoplankton_groups = itertools.groupby(phytoplankton_rows, self.get_row_pond_key)
+        next_benthic_group = next(benthic_groups, None)
+        next_phytoplankton_group = next(phytoplankton_groups, None)
+        finished_keys = set()
+
+        for row in pond_rows:
+            key = self.get_row_pond_key(row)
+            if(key in finished_keys):
+                continue #same as read_pond_list_from_rows: the first row for a pond wins.
+            pond = self.create_pond_from_row(row)
+
+            if(next_benthic_group is not None and next_benthic_group[0] == key):
+                for benthic_row in next_benthic_group[1]:
+                    self.add_benthic_row_to_pond(pond, benthic_row)
+                next_benthic_group = next(benthic_groups, None)
+            if(next_phytoplankton_group is not None and next_phytoplankton_group[0] == key):
+                for phytoplankton_row in next_phytoplankton_group[1]:
+                    self.add_phytoplankton_row_to_pond(pond, phytoplankton_row)
+                next_phytoplankton_group = next(phytoplankton_groups, None)
+
+            finished_keys.add(key)
+            self.check_stream_order(self.BENTHIC_PHOTO_DATA_SHEET_NAME, next_benthic_group, finished_keys)
+            self.check_stream_order(self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME, next_phytoplankton_group, finished_keys)
+            yield pond
+
+        self.check_stream_order(self.BENTHIC_PHOTO_DATA_SHEET_NAME, next_benthic_group)
+        self.check_stream_order(self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME, next_phytoplankton_group)
+
+
+    def check_stream_order(self, table_name, next_group, finished_keys=None):
+        '''
+        Used by iterate_ponds_from_rows().
+        @param next_group: the next (key, rows) of a measurement table, or None if the table is used up.
+        @param finished_keys: keys of ponds already yielded. None once the pond table is used up, when any leftover rows are an error.
+        @raise IOError: if next_group belongs to a pond that's already finished.
+        '''
+        if(next_group is None):
+            return
+        lake_id, day_of_year, year = next_group[0]
+        if(finished_keys is None):
+            raise IOError("file format incorrect. "+table_name+" rows for lake "+unicode(lake_id)+", day "+str(day_of_year)+", year "+str(year)+
+                          " do not match any Pond, or are not in the same order as "+self.POND_DATA_SHEET_NAME)
+        if(next_group[0] in finished_keys):
+            raise IOError("file format incorrect. "+table_name+" rows for lake "+unicode(lake_id)+", day "+str(day_of_year)+", year "+str(year)+
+                          " are not next to each other, or are not in the same order as "+self.POND_DATA_SHEET_NAME)
+
+
+    def get_row_pond_key(self, row):
+        '''
+        @param row: a row of the pond, benthic or phytoplankton table
+        @return: the key of the Pond the row belongs to. See get_pond_key().
+        @rtype: tuple
+        '''
+        return self.get_pond_key(row[self.lakeIDIndex], row[self.dayOfYearIndex], row[self.yearIndex])
 
-        sheet = benthic_photo_data_workSheet
-        num_rows = benthic_data_workSheet_num_rows
-        curr_row = self.DEFAULT_FIRST_DATA_ROW #start at 1. row 0 is column headings
-        while curr_row<num_rows:
-            row = sheet.row(curr_row)
 
+    def create_pond_from_row(self, row):
+        '''
+        @param row: a row of the pond_data table
+        @return: a new Pond with no measurements yet, sharing its lake's shape.
+        @rtype: Pond
+        '''
+        #values
+        try:
+            row_year_value = row[self.yearIndex]
+            row_doy_value = row[self.dayOfYearIndex]
+            row_lakeID_value = row[self.lakeIDIndex]
+            row_kd_value = float(row[self.kd_index])
+            row_noonlight_value = float(row[self.noon_surface_light_index])
+            row_lod_value = float(row[self.length_of_day_index])
+        except Exception as e:
+            print str(e)
+            print "Error: couldn't read values properly."
+
+        lake_shape = self.get_lake_shape(row_lakeID_value) #shared with the lake's other days
+        return Pond(row_year_value, row_lakeID_value, row_doy_value, row_lod_value, row_noonlight_value, row_kd_value, lake_shape, [], [], self.DEFAULT_TIME_INTERVAL)
 
+
+    def read_shapes_from_rows(self, shape_rows):
+        '''
+        @param shape_rows: rows of the shape_data table
+        @return: lake ID -> {depth: area}. Later rows for the same depth win, same as updating row by row.
+        @rtype: dict
+        '''
+        shape_dicts_by_lake_id = {}
+        for row in shape_rows:
             #values
-            row_year_value = row[self.yearIndex].value
-            row_doy_value = row[self.dayOfYearIndex].value
-            row_lakeID_value = row[self.lakeIDIndex].value
-            row_light_penetration_proportion_value = float(row[self.benthic_light_penetration_proportion_index].value)
-            row_pmax_value = float(row[self.benthic_pmax_index].value)
-            row_ik_value = float(row[self.benthic_ik_index].value)
+            row_lakeID_value = row[self.shape_ID_index]
+            row_depth_value = float(row[self.shape_depth_index])
+            row_area_value = float(row[self.shape_area_index])    
 
-            #find the correct pond
-            pond = None
-            pond = next((i for i in pond_list if (i.get_lake_id()== row_lakeID_value and
-                                                 i.get_day_of_year()==row_doy_value and
-                                                 i.get_year() == row_year_value)),None) #source: http://stackoverflow.com/questions/7125467/find-object-in-list-that-has-attribute-equal-to-some-value-that-meets-any-condi
-            if pond is None: #something is terribly wrong
-                raise FormatError("Something went wrong. Benthic Measurement with DOY "+str(row_doy_value) + " and Lake ID " + row_lakeID_value + " does not match to any Pond.")
-                #TODO: handle this better.
-            else:
-                #create PhotoSynthesisMeasurement object using values specific to that benthic_measurement/row
-                row_depth_value = pond.calculate_depth_of_specific_light_percentage(row_light_penetration_proportion_value) #convert from light proportions to depth in meters.
+            shape_dicts_by_lake_id.setdefault(row_lakeID_value, {})[row_depth_value] = row_area_value
+        return shape_dicts_by_lake_id
 
 
-                benthic_measurement = BenthicPhotosynthesisMeasurement(row_depth_value, row_pmax_value, row_ik_value)
-                pond.add_benthic_measurement_if_photic(benthic_measurement)
-                #add to Pond
+    def add_benthic_row_to_pond(self, pond, row):
+        '''
+        @param pond: the Pond the row belongs to. Its shape has to be filled in already.
+        @param row: a row of the benthic_photo_data table
+        '''
+        #values
+        row_light_penetration_proportion_value = float(row[self.benthic_light_penetration_proportion_index])
+        row_pmax_value = float(row[self.benthic_pmax_index])
+        row_ik_value = float(row[self.benthic_ik_index])
 
-            curr_row+=1
-        #end of while loop
+        #create PhotoSynthesisMeasurement object using values specific to that benthic_measurement/row
+        row_depth_value = pond.calculate_depth_of_specific_light_percentage(row_light_penetration_proportion_value) #convert from light proportions to depth in meters.
+        benthic_measurement = BenthicPhotosynthesisMeasurement(row_depth_value, row_pmax_value, row_ik_value)
+        pond.add_benthic_measurement_if_photic(benthic_measurement)
 
-        
-        ###############
-        #Phyto data
-        ###############
-        sheet = phytoplankton_photo_data_sheet
-        num_rows = phytoplankton_photo_data_sheet_num_rows
-        curr_row = self.DEFAULT_FIRST_DATA_ROW #start at 1. row 0 is column headings
-        while curr_row<num_rows:
-            row = sheet.row(curr_row)
 
+    def add_phytoplankton_row_to_pond(self, pond, row):
+        '''
+        @param pond: the Pond the row belongs to.
+        @param row: a row of the phytoplankton_photo_data table
+        '''
+        #values
+        row_thermal_layer_value = row[self.phyto_thermal_layer_index]
+        row_depth_value = row[self.phyto_depth_index]
+        row_phyto_pmax_value = row[self.phyto_pmax_index]
+        row_alpha_value = row[self.phyto_alpha_index]
+        row_beta_value = row[self.phyto_beta_index]
 
-            #values
-            row_year_value = row[self.yearIndex].value
-            row_doy_value = row[self.dayOfYearIndex].value
-            row_lakeID_value = row[self.lakeIDIndex].value
-            row_thermal_layer_value = row[self.phyto_thermal_layer_index].value
-            row_depth_value = row[self.phyto_depth_index].value
-            row_phyto_pmax_value = row[self.phyto_pmax_index].value
-            row_alpha_value = row[self.phyto_alpha_index].value
-            row_beta_value = row[self.phyto_beta_index].value
+        phyto_measurement = PhytoPlanktonPhotosynthesisMeasurement(row_thermal_layer_value, row_depth_value, row_phyto_pmax_value, row_alpha_value, row_beta_value)
+        pond.add_phytoplankton_measurement(phyto_measurement)
 
 
-            #find the correct pond
-            pond = None
-            pond = next((i for i in pond_list if (i.get_lake_id()== row_lakeID_value and
-                                                 i.get_day_of_year()==row_doy_value and
-                                                 i.get_year() == row_year_value)),None) #source: http://stackoverflow.com/questions/7125467/find-object-in-list-that-has-attribute-equal-to-some-value-that-meets-any-condi
-            if pond is None: #something is terribly wrong
-                raise FormatError("Something went wrong. Benthic Measurement with DOY "+str(row_doy_value) + " and Lake ID " + row_lakeID_value + " does not match to any Pond.")
-            else:
-                #create PhotoSynthesisMeasurement object using values specific to that benthic_measurement/row
 
-                phyto_measurement = PhytoPlanktonPhotosynthesisMeasurement(row_thermal_layer_value, row_depth_value, row_phyto_pmax_value, row_alpha_value, row_beta_value)
-                pond.add_phytoplankton_measurement(phyto_measurement)
-                #add to Pond
 
-            curr_row+=1
+    ##################################
+    # CSV
+    ##################################
+
+    def read_pond_list_from_csv_zip(self, zip_contents):
+        '''
+        READ POND LIST FROM CSV ZIP
+        
+        Reads a zip file holding one csv per table: pond_data.csv, benthic_photo_data.csv, phytoplankton_photo_data.csv and shape_data.csv.
+        Each csv has the same columns as the matching workbook sheet, column headings in the first row.
+        @param zip_contents: the zip file, as a string of bytes
+        @return: list of Pond objects
+        @rtype: list
+        '''
+        return self.read_pond_list_from_tables(self.read_csv_zip_tables(zip_contents))
+
 
+    def read_csv_zip_tables(self, zip_contents):
+        '''
+        @param zip_contents: the zip file, as a string of bytes
+        @return: dict from table name to list of typed rows.
+        @rtype: dict
+        '''
+        try:
+            archive = zipfile.ZipFile(StringIO.StringIO(zip_contents))
+        except zipfile.BadZipfile:
+            raise IOError("file format incorrect. Could not open zip file")
+
+        csv_files_by_table = {}
+        for name in archive.namelist():
+            table_name, extension = os.path.splitext(os.path.basename(name))
+            if(extension.lower() == ".csv" and table_name in self.CSV_TABLE_NAMES):
+                csv_files_by_table[table_name] = name
+
+        tables = {}
+        for table_name in self.CSV_TABLE_NAMES:
+            if(table_name not in csv_files_by_table):
+                raise IOError("file format incorrect. Zip file has no "+table_name+".csv")
+            rows = list(csv.reader(StringIO.StringIO(archive.read(csv_files_by_table[table_name]))))
+            row_numbers = range(self.DEFAULT_FIRST_DATA_ROW+1, len(rows)+1) #line numbers in the csv
+            tables[table_name] = self.convert_csv_table(table_name, rows[self.DEFAULT_FIRST_DATA_ROW:], row_numbers)
+        return tables
+
+
+    def read_pond_list_from_long_csv(self, csv_contents):
+        '''
+        READ POND LIST FROM LONG CSV
+        
+        Reads all four tables from one long-format csv. The first column says which table the row belongs to 
+        (pond_data, benthic_photo_data, phytoplankton_photo_data or shape_data), and the rest of the row has the same 
+        columns as the matching workbook sheet. Rows can be in any order. Column heading rows are skipped.
+        @param csv_contents: the csv file, as a string of bytes
+        @return: list of Pond objects
+        @rtype: list
+        '''
+        return self.read_pond_list_from_tables(self.read_long_csv_tables(csv_contents))
 
 
+    def read_long_csv_tables(self, csv_contents):
+        '''
+        @param csv_contents: the long-format csv file, as a string of bytes
+        @return: dict from table name to list of typed rows.
+        @rtype: dict
+        '''
+        rows_by_table = dict((table_name, []) for table_name in self.CSV_TABLE_NAMES)
+        row_numbers_by_table = dict((table_name, []) for table_name in self.CSV_TABLE_NAMES)
+        reader = csv.reader(StringIO.StringIO(csv_contents))
+        for row in reader:
+            if(len(row) == 0):
+                continue #blank line
+            table_name = row[self.CSV_TABLE_INDEX].strip().lstrip(codecs.BOM_UTF8)
+            if(table_name in rows_by_table):
+                if(not self.is_csv_heading_row(table_name, row[self.CSV_TABLE_INDEX+1:])):
+                    rows_by_table[table_name].append(row[self.CSV_TABLE_INDEX+1:])
+                    row_numbers_by_table[table_name].append(reader.line_num)
+            elif(table_name != self.CSV_TABLE_COLUMN_HEADING):
+                raise IOError("file format incorrect. Unknown table in first column: "+table_name)
+
+        tables = {}
+        for table_name, rows in rows_by_table.items():
+            tables[table_name] = self.convert_csv_table(table_name, rows, row_numbers_by_table[table_name])
+        return tables
+
+
+    def read_pond_list_from_tables(self, tables):
+        '''
+        @param tables: dict from table name to list of typed rows.
+        @return: list of Pond objects
+        @rtype: list
+        '''
+        return self.read_pond_list_from_rows(tables[self.POND_DATA_SHEET_NAME],
+                                             tables[self.BENTHIC_PHOTO_DATA_SHEET_NAME],
+                                             tables[self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME],
+                                             tables[self.SHAPE_DATA_SHEET_NAME])
 
 
+    def iterate_ponds_from_tables(self, tables):
+        '''
+        Streaming version of read_pond_list_from_tables(). See iterate_ponds_from_rows().
+        @param tables: dict from table name to list of typed rows.
+        @rtype: generator of Pond
+        '''
+        return self.iterate_ponds_from_rows(tables[self.POND_DATA_SHEET_NAME],
+                                            tables[self.BENTHIC_PHOTO_DATA_SHEET_NAME],
+                                            tables[self.PHYTOPLANKTON_PHOTO_DATA_SHEET_NAME],
+                                            tables[self.SHAPE_DATA_SHEET_NAME])
 
-        return pond_list
 
-    #END OF read_pond_list_from_workbook METHOD
+    def is_csv_heading_row(self, table_name, row):
+        '''
+        A row is a column heading row if its first numeric column isn't a number.
+        @param table_name: one of CSV_TABLE_NAMES
+        @param row: list of strings
+        @rtype: bool
+        '''
+        first_numeric_index = min(self.NUMERIC_COLUMNS[table_name])
+        try:
+            float(row[first_numeric_index])
+        except (ValueError, IndexError):
+            return True
+        return False
+
+
+    def convert_csv_table(self, table_name, rows, row_numbers):
+        '''
+        Converts the rows of one csv table from strings to the types the xls reader gives: 
+        floats for the numeric columns, unicode for the rest. Converted and validated a whole column at a time.
+        @param table_name: one of CSV_TABLE_NAMES
+        @param rows: lists of strings, no column headings
+        @param row_numbers: line number of each row in the csv, for error messages.
+        @return: typed rows
+        @rtype: list of lists
+        '''
+        not_blank = [any(cell.strip() for cell in row) for row in rows] #skip blank lines
+        row_numbers = [row_number for row_number, keep in zip(row_numbers, not_blank) if keep]
+        rows = [row for row, keep in zip(rows, not_blank) if keep]
+        if(len(rows) == 0):
+            return []
+
+        number_of_columns = self.get_number_of_columns(table_name)
+        columns = {}
+        for column_index in range(number_of_columns):
+            try:
+                column = [row[column_index].strip() for row in rows]
+            except IndexError:
+                raise IOError("file format incorrect. Expected at least "+str(number_of_columns)+" columns in "+table_name)
+            if(column_index in self.NUMERIC_COLUMNS[table_name]):
+                columns[column_index] = self.convert_column_to_floats(column)
+            else:
+                columns[column_index] = [cell.decode("utf-8") for cell in column]
+        columns = self.validate_columns(table_name, columns, row_numbers)
+        return self.get_rows_from_columns(columns)
 
 
 
@@ -0,0 +1,355 @@
+'''
+Created on Oct 17, 2026
+
+Server-side storage for uploaded datasets, so the session only has to hold a dataset ID.
+
+Datasets live in a SQLite database: one row per Pond, in upload order, plus the results table calculated
+at upload. Dataset IDs are a hash of the uploaded file, so a repeat upload of the same file finds its dataset already here,
+and skips parsing and calculating. Ponds are pickled one by one, with their shapes stored separately, once per shape, so the ponds loaded back
+still share one shape per lake. Datasets that haven't been used
+for time_to_live_seconds are deleted, and so are the least recently used ones, once the datasets together take up
+more than maximum_bytes.
+
+@author: cdleong
+'''
+import os
+import time
+import hashlib
+import sqlite3
+import cPickle as pickle
+from cStringIO import StringIO
+from bathymetric_pond_shape import BathymetricPondShape
+
+
+class DatasetStore(object):
+    '''
+    classdocs
+    '''
+
+    #CONSTANTS
+    DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmp", "datasets.sqlite")
+    DEFAULT_TIME_TO_LIVE_SECONDS = 24 * 60 * 60 #a day since last use
+    DEFAULT_MAXIMUM_BYTES = 256 * 1024 * 1024 #256 megabytes of pickled ponds, shapes and results, across every dataset.
+    LAST_USED_UPDATE_SECONDS = 60 #don't write a new last-used time on every read.
+    DATABASE_TIMEOUT_SECONDS = 30 #how long to wait for another process's write to finish
+    DATASET_FORMAT_VERSION = 1 #change this whenever Pond or the result layout changes, so old datasets aren't found by new uploads.
+
+    SCHEMA = ["CREATE TABLE IF NOT EXISTS datasets (dataset_id TEXT PRIMARY KEY, created REAL, last_used REAL, number_of_ponds INTEGER, results BLOB, stored_bytes INTEGER)",
+              "CREATE TABLE IF NOT EXISTS shapes (dataset_id TEXT, shape_index INTEGER, shape BLOB, PRIMARY KEY (dataset_id, shape_index))",
+              "CREATE TABLE IF NOT EXISTS ponds (dataset_id TEXT, position INTEGER, pond BLOB, PRIMARY KEY (dataset_id, position))",
+              "DROP INDEX IF EXISTS ponds_by_key", #single ponds aren't looked up any more. Databases from before may still have it.
+              "CREATE INDEX IF NOT EXISTS datasets_by_last_used ON datasets (last_used)"]
+
+
+    def __init__(self, database_path=DEFAULT_DATABASE_PATH, time_to_live_seconds=DEFAULT_TIME_TO_LIVE_SECONDS, maximum_bytes=DEFAULT_MAXIMUM_BYTES):
+        '''
+        Constructor
+        @param database_path: the SQLite file. Created, with its folder, if it doesn't exist.
+        @param time_to_live_seconds: datasets unused for longer than this are deleted.
+        @param maximum_bytes: total stored size of every dataset before the least recently used are deleted.
+        '''
+        self.database_path = database_path
+        self.time_to_live_seconds = time_to_live_seconds
+        self.maximum_bytes = maximum_bytes
+        self.schema_created = False
+
+
+    def connect(self):
+        '''
+        A new connection for each operation, so the store can be used from any thread or worker process.
+        @rtype: sqlite3.Connection
+        '''
+        if(not self.schema_created):
+            folder = os.path.dirname(self.database_path)
+            if(folder and not os.path.isdir(folder)):
+                try:
+                    os.makedirs(folder)
+                except OSError:
+                    if(not os.path.isdir(folder)): #another process might have just made it.
+                        raise
+        connection = sqlite3.connect(self.database_path, timeout=self.DATABASE_TIMEOUT_SECONDS)
+        if(not self.schema_created):
+            with connection:
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+                self.add_stored_bytes_column(connection)
+            self.schema_created = True
+        return connection
+
+
+    def get_dataset_id(self, file_contents, extension=""):
+        '''
+        @param file_contents: the uploaded bytes
+        @param extension: the file extension. Part of the ID, since it decides how the bytes are parsed.
+        @return: hex digest identifying this upload
+        @rtype: str
+        '''
+        hasher = hashlib.sha256()
+        hasher.update(str(self.DATASET_FORMAT_VERSION))
+        hasher.update("\0")
+        hasher.update(extension.lower())
+        hasher.update("\0")
+        hasher.update(file_contents)
+        return hasher.hexdigest()
+
+
+    def add_stored_bytes_column(self, connection):
+        '''
+        Databases made before datasets had a size don't have the stored_bytes column. Adds it, and works out the size of 
+        the datasets already there, inside the caller's transaction.
+        '''
+        column_names = [row[1] for row in connection.execute("PRAGMA table_info(datasets)")]
+        if("stored_bytes" not in column_names):
+            connection.execute("ALTER TABLE datasets ADD COLUMN stored_bytes INTEGER")
+            connection.execute("UPDATE datasets SET stored_bytes = IFNULL(LENGTH(results), 0)"
+                               " + IFNULL((SELECT SUM(LENGTH(pond)) FROM ponds WHERE ponds.dataset_id = datasets.dataset_id), 0)"
+                               " + IFNULL((SELECT SUM(LENGTH(shape)) FROM shapes WHERE shapes.dataset_id = datasets.dataset_id), 0)")
+
+
+    ##############################
+    # PICKLING
+    ##############################
+    # Shapes are pickled by reference (persistent IDs), so each one is stored once per dataset, not once per Pond.
+
+    def dump_pond(self, pond, shape_indices_by_object_id):
+        '''
+        @param pond: a Pond
+        @param shape_indices_by_object_id: id(shape) -> shape index, for the shapes stored with this dataset.
+        @return: the pickled Pond, with its shape as a reference.
+        @rtype: str
+        '''
+        output = StringIO()
+        pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+        def persistent_id(value):
+            if(isinstance(value, BathymetricPondShape) and id(value) in shape_indices_by_object_id):
+                return str(shape_indices_by_object_id[id(value)])
+            return None
+        pickler.persistent_id = persistent_id
+        pickler.dump(pond)
+        return output.getvalue()
+
+
+    def load_pond(self, pickled_pond, get_shape):
+        '''
+        @param pickled_pond: from dump_pond()
+        @param get_shape: takes a shape index, returns the dataset's shape with that index.
+        @rtype: Pond
+        '''
+        unpickler = pickle.Unpickler(StringIO(str(pickled_pond)))
+        unpickler.persistent_load = lambda shape_index: get_shape(int(shape_index))
+        return unpickler.load()
+
+
+    ##############################
+    # WRITING
+    ##############################
+
+    def store_dataset(self, dataset_id, pond_list, results=None):
+        '''
+        Saves a dataset, replacing any dataset with the same ID. 
+        Also deletes expired datasets, then the least recently used others until the store fits in maximum_bytes.
+        @param dataset_id: any string, e.g. a hash of the uploaded file.
+        @param pond_list: list of Pond objects
+        @param results: the results table for pond_list, e.g. from PondBatchCalculator.calculate(). Optional.
+        '''
+        pond_list = list(pond_list)
+        shape_indices_by_object_id = {}
+        shape_rows = []
+        for pond in pond_list:
+            shape = pond.get_pond_shape()
+            if(isinstance(shape, BathymetricPondShape) and id(shape) not in shape_indices_by_object_id):
+                shape_indices_by_object_id[id(shape)] = len(shape_rows)
+                shape_rows.append((dataset_id, len(shape_rows), sqlite3.Binary(pickle.dumps(shape, pickle.HIGHEST_PROTOCOL))))
+        pond_rows = [(dataset_id, position, sqlite3.Binary(self.dump_pond(pond, shape_indices_by_object_id)))
+                     for position, pond in enumerate(pond_list)]
+        pickled_results = None
+        if(results is not None):
+            pickled_results = sqlite3.Binary(pickle.dumps(results, pickle.HIGHEST_PROTOCOL))
+        stored_bytes = sum(len(row[2]) for row in shape_rows) + sum(len(row[2]) for row in pond_rows)
+        if(pickled_results is not None):
+            stored_bytes += len(pickled_results)
+
+        now = time.time()
+        connection = self.connect()
+        try:
+            with connection:
+                self.delete_rows(connection, dataset_id)
+                connection.execute("INSERT INTO datasets (dataset_id, created, last_used, number_of_ponds, results, stored_bytes) VALUES (?, ?, ?, ?, ?, ?)",
+                                   (dataset_id, now, now, len(pond_list), pickled_results, stored_bytes))
+                connection.executemany("INSERT INTO shapes (dataset_id, shape_index, shape) VALUES (?, ?, ?)", shape_rows)
+                connection.executemany("INSERT INTO ponds (dataset_id, position, pond) VALUES (?, ?, ?)", pond_rows)
+        finally:
+            connection.close()
+        self.evict_expired()
+        self.evict_least_recently_used(dataset_id)
+
+
+    def delete_rows(self, connection, dataset_id):
+        '''
+        Deletes a dataset inside the caller's transaction.
+        '''
+        for table_name in ["datasets", "shapes", "ponds"]:
+            connection.execute("DELETE FROM "+table_name+" WHERE dataset_id = ?", (dataset_id,))
+
+
+    def delete_dataset(self, dataset_id):
+        '''
+        Deletes a dataset, if it's there.
+        '''
+        connection = self.connect()
+        try:
+            with connection:
+                self.delete_rows(connection, dataset_id)
+        finally:
+            connection.close()
+
+
+    def evict_expired(self):
+        '''
+        Deletes every dataset that hasn't been used for time_to_live_seconds.
+        @return: number of datasets deleted
+        @rtype: int
+        '''
+        cutoff = time.time() - self.time_to_live_seconds
+        connection = self.connect()
+        try:
+            with connection:
+                expired_ids = [row[0] for row in connection.execute("SELECT dataset_id FROM datasets WHERE last_used < ?", (cutoff,))]
+                for dataset_id in expired_ids:
+                    self.delete_rows(connection, dataset_id)
+        finally:
+            connection.close()
+        return len(expired_ids)
+
+
+    def evict_least_recently_used(self, keep_dataset_id=None):
+        '''
+        Deletes datasets, least recently used first, until the total stored size is within maximum_bytes.
+        Last-used times are only updated every LAST_USED_UPDATE_SECONDS, so "least recently used" is to within that.
+        @param keep_dataset_id: never deleted, e.g. the dataset just stored, which the session is about to point to. 
+        If it's bigger than maximum_bytes on its own, everything else goes, and it stays.
+        @return: number of datasets deleted
+        @rtype: int
+        '''
+        deleted = 0
+        connection = self.connect()
+        try:
+            with connection:
+                total_bytes = connection.execute("SELECT IFNULL(SUM(stored_bytes), 0) FROM datasets").fetchone()[0]
+                if(total_bytes > self.maximum_bytes):
+                    rows = connection.execute("SELECT dataset_id, IFNULL(stored_bytes, 0) FROM datasets ORDER BY last_used").fetchall()
+                    for dataset_id, stored_bytes in rows:
+                        if(total_bytes <= self.maximum_bytes):
+                            break
+                        if(dataset_id == keep_dataset_id):
+                            continue
+                        self.delete_rows(connection, dataset_id)
+                        total_bytes -= stored_bytes
+                        deleted += 1
+        finally:
+            connection.close()
+        return deleted
+
+
+    def get_stored_bytes(self):
+        '''
+        @return: total stored size of every dataset, in bytes. Pickled ponds, shapes and results, not SQLite's own overhead.
+        @rtype: int
+        '''
+        connection = self.connect()
+        try:
+            return connection.execute("SELECT IFNULL(SUM(stored_bytes), 0) FROM datasets").fetchone()[0]
+        finally:
+            connection.close()
+
+
+    ##############################
+    # READING
+    ##############################
+
+    def has_dataset(self, dataset_id):
+        '''
+        Also counts as a use, for eviction.
+        @return: True if the dataset is stored and hasn't expired.
+        @rtype: bool
+        '''
+        if(dataset_id is None):
+            return False
+        connection = self.connect()
+        try:
+            return self.use_dataset(connection, dataset_id)
+        finally:
+            connection.close()
+
+
+    def use_dataset(self, connection, dataset_id):
+        '''
+        Checks that a dataset exists and hasn't expired, and moves its last-used time up to now.
+        @return: True if the dataset can be used.
+        @rtype: bool
+        '''
+        now = time.time()
+        row = connection.execute("SELECT last_used FROM datasets WHERE dataset_id = ?", (dataset_id,)).fetchone()
+        if(row is None or row[0] < now - self.time_to_live_seconds):
+            return False
+        if(row[0] < now - self.LAST_USED_UPDATE_SECONDS):
+            with connection:
+                connection.execute("UPDATE datasets SET last_used = ? WHERE dataset_id = ?", (now, dataset_id))
+        return True
+
+
+    def load_shapes(self, connection, dataset_id):
+        '''
+        @return: shape index -> shape, for every shape in the dataset.
+        @rtype: dict
+        '''
+        rows = connection.execute("SELECT shape_index, shape FROM shapes WHERE dataset_id = ?", (dataset_id,))
+        return dict((shape_index, pickle.loads(str(pickled_shape))) for shape_index, pickled_shape in rows)
+
+
+    def get_pond_list(self, dataset_id):
+        '''
+        @return: every Pond in the dataset, in upload order.
+        @rtype: list
+        @raise KeyError: if the dataset isn't stored, or has expired.
+        '''
+        connection = self.connect()
+        try:
+            if(not self.use_dataset(connection, dataset_id)):
+                raise KeyError("no such dataset, or it has expired: "+str(dataset_id))
+            shapes_by_index = self.load_shapes(connection, dataset_id)
+            rows = connection.execute("SELECT pond FROM ponds WHERE dataset_id = ? ORDER BY position", (dataset_id,))
+            return [self.load_pond(pickled_pond, shapes_by_index.__getitem__) for (pickled_pond,) in rows]
+        finally:
+            connection.close()
+
+
+    def get_results(self, dataset_id):
+        '''
+        @return: the results table stored with the dataset, or None if there isn't one.
+        @rtype: numpy structured array
+        @raise KeyError: if the dataset isn't stored, or has expired.
+        '''
+        connection = self.connect()
+        try:
+            if(not self.use_dataset(connection, dataset_id)):
+                raise KeyError("no such dataset, or it has expired: "+str(dataset_id))
+            row = connection.execute("SELECT results FROM datasets WHERE dataset_id = ?", (dataset_id,)).fetchone()
+            if(row is None or row[0] is None):
+                return None
+            return pickle.loads(str(row[0]))
+        finally:
+            connection.close()
+
+
+
+def main():
+    '''
+    Used for testing!
+    '''
+    print "hello world"
+
+
+
+if __name__ == "__main__":
+    main()
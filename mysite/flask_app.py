@@ -1,22 +1,17 @@
 import os
 
 import traceback
-from flask import Flask, request, url_for, render_template, redirect, Response, session, make_response
+from flask import Flask, request, url_for, render_template, redirect, Response, session, make_response, g, jsonify
 import StringIO
 from data_reader import DataReader
+from pond_process_pool import PondProcessPool
+from dataset_store import DatasetStore
+from graph_cache import GraphCache
+from graph_renderer import GraphRenderer #draws straight onto an Agg canvas, so no GUI is needed on the OS.
 import xlwt #excel writing. used for the excel output.
 import sys
 import mimetypes
 from werkzeug.datastructures import Headers #used for exporting files
-import jsonpickle #lets us transfer Pond object between views. 
-
-#for graphing
-#we need to import matplotlib and set which renderer to use before we use pyplot. This allows it to work without a GUI installed on the OS.
-import matplotlib as mpl 
-mpl.use('Agg') 
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-import numpy as np
 
 ##############################################################
 #IMPORTANT VARIABLES
@@ -27,7 +22,7 @@ import numpy as np
 # This is the path to the upload directory
 
 
-ALLOWED_EXTENSIONS = set(['xls', 'xlsx', 'csv'])
+ALLOWED_EXTENSIONS = set(['xls', 'xlsx', 'csv', 'zip']) #zip: one csv per table
 TEMPLATE_FILE = 'template.xls'
 TEMPLATE_FILE_ROUTE = '/'+TEMPLATE_FILE
 EXAMPLE_FILE = 'example_data.xls'
@@ -37,9 +32,22 @@ INTERNAL_SERVER_ERROR_TEMPLATE_ROUTE = '/'+INTERNAL_SERVER_ERROR_TEMPLATE_FILE
 
 FIRST_DATA_ROW_FOR_EXPORT = 1
 
+GRAPH_X_LABEL = "hour"
+GRAPH_Y_LABEL = "PPPR (mgC*m^-3)"
+GRAPH_LINE_WIDTH = 3
+GRAPH_DATA_FORMAT = "json" #part of the graph data ETags, so they never match a png's.
+
 
 #SESSION KEYS
-PICKLED_POND_LIST_KEY = 'pickled_pond_list'
+DATASET_ID_KEY = 'dataset_id' #the session only holds this. Ponds and results are in the dataset store.
+
+
+#uploaded datasets and their results, on the server. Lets us transfer Pond objects between views,
+#and a repeat upload of the same file skips parsing and calculating.
+dataset_store = DatasetStore()
+
+#rendered layer graphs, in memory.
+graph_cache = GraphCache()
 
 
 # Initialize the Flask application
@@ -59,7 +67,7 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 #arbitrary 16 megabyte uploa
 
 def getPondList():
     #SALAMANDER
-    pond_list = unpickle_pond_list()
+    pond_list = load_pond_list()
     return pond_list
     
 
@@ -78,8 +86,14 @@ def my_utility_processor():
         print "length of pond list: ", len(pond_list)
         return pond_list
 
+    def pond_results():
+        '''
+        The results table calculated at upload, one row per pond. Reading it doesn't calculate anything.
+        '''
+        return get_results()
+
             
-    return dict(ponds=ponds)
+    return dict(ponds=ponds, pond_results=pond_results)
 
 
 
@@ -115,8 +129,14 @@ def indexView():
             pond_file = request.files['uploaded_file']
 
             try:                   
-                reader = DataReader("") #I don't plan on using this filename, thanks
-                pond_list = reader.readFile(pond_file.read()) #read method is http://werkzeug.pocoo.org/docs/0.10/datastructures/#werkzeug.datastructures.FileStorage,                 
+                extension = pond_file.filename.rsplit('.', 1)[1].lower()
+                file_contents = pond_file.read() #read method is http://werkzeug.pocoo.org/docs/0.10/datastructures/#werkzeug.datastructures.FileStorage,
+                dataset_id = dataset_store.get_dataset_id(file_contents, extension) #same file, same ID, so repeat uploads share one dataset
+                if(not dataset_store.has_dataset(dataset_id)): #otherwise it's a repeat upload, already parsed and calculated
+                    reader = DataReader("", low_memory=True) #I don't plan on using this filename, thanks. low_memory: keep parse memory spikes down on the server
+                    pond_list = reader.readFile(file_contents, extension)
+                    results = PondProcessPool().calculate(pond_list)
+                    store_pond_list(dataset_id, pond_list, results)
             except Exception as e:
                 print "error in getPondList"
                 print str(e)
@@ -131,11 +151,10 @@ def indexView():
 
             
             ##################################################################
-            #let's try something. AARDVARK <--easy to search for this
-            #(this might be more work than making Pond objects serializable)
+            #AARDVARK <--easy to search for this
+            #the ponds stay on the server. The session cookie just gets the dataset ID.
             ##################################################################
-            ##trying http://jsonpickle.github.io/
-            pickle_pond_list(pond_list)         
+            session[DATASET_ID_KEY] = dataset_id
             
 
 
@@ -188,6 +207,8 @@ def primary_production():
     Renders the primary_production template, which shows calculated values and a button to download them.
     '''
     print "primary_production view"
+    if(not dataset_store.has_dataset(session.get(DATASET_ID_KEY))):
+        return redirect(url_for("indexView")) #nothing uploaded yet, or it expired
     try:
         return render_template("primary_production.html")
     except Exception as e:
@@ -209,28 +230,85 @@ def hourly_ppr_in_layer_graph(pond_key="", layer_index = 0):
     print "pond_key is ", pond_key
     print "layer_index is ", layer_index
     
+    dataset_id = session.get(DATASET_ID_KEY)
+    cache_key = graph_cache.get_key(dataset_id, pond_key, layer_index, (GRAPH_X_LABEL, GRAPH_Y_LABEL, GRAPH_LINE_WIDTH))
+    etag = graph_cache.get_etag(cache_key)
+    if(dataset_id is not None and etag in request.if_none_match):
+        return set_graph_cache_headers(Response(status=304), etag) #the browser already has it
+
     try:
-        pond = retrieve_pond(pond_key)
-        times  = pond.get_list_of_times()
-        ppr_values = pond.calculate_hourly_phytoplankton_primary_production_rates_list_over_whole_day_in_thermal_layer(layer_index)
-        x_values = times
-        y_values = ppr_values
-#         print "x values: ", x_values
-#         print "x length: ", len(x_values)
-#         print "y values: ", y_values
-#         print "y length: ", len(y_values)
+        png = graph_cache.get(cache_key)
+        if(png is None):
+            result = retrieve_result(pond_key) #precomputed at upload
+            if(layer_index >= result["number_of_layers"]):
+                raise Exception("No such layer: ", layer_index)
+            times, ppr_values = get_layer_series(result, layer_index)
+            x_values = times
+            y_values = ppr_values
+#             print "x values: ", x_values
+#             print "x length: ", len(x_values)
+#             print "y values: ", y_values
+#             print "y length: ", len(y_values)
         
         
         
-        x_label = "hour"
-        y_label  = "PPPR (mgC*m^-3)"
-        graph_title = "PPPR, ", pond.get_lake_id(), " layer ", layer_index+1
-        return graph(x_values,y_values,x_label, y_label,graph_title)        
+            graph_title = "PPPR, ", result["lake_id"], " layer ", layer_index+1
+            png = render_graph_png(x_values, y_values, GRAPH_X_LABEL, GRAPH_Y_LABEL, graph_title, GRAPH_LINE_WIDTH)
+            graph_cache.put(cache_key, png)
+        response = make_response(png)
+        response.mimetype = 'image/png'
+        return set_graph_cache_headers(response, etag)
     except:
         print "Unexpected error:", sys.exc_info()[0]
         #return error graphic
         #TODO: an error graphic
         return app.send_static_file('graph_error.png')
+
+
+@app.route('/graph_data/<pond_key>/<int:layer_index>')
+def hourly_ppr_in_layer_data(pond_key="", layer_index = 0):
+    '''
+    The numbers behind /graph/<pond_key>/<layer_index>, as JSON, for drawing the graph in the browser instead.
+    times and hourly_ppr are the same points the png graph plots. See get_layer_series() for which times those are.
+    '''
+    dataset_id = session.get(DATASET_ID_KEY)
+    etag = graph_cache.get_etag(graph_cache.get_key(dataset_id, pond_key, layer_index, (GRAPH_DATA_FORMAT,)))
+    if(dataset_id is not None and etag in request.if_none_match):
+        return set_graph_cache_headers(Response(status=304), etag)
+
+    try:
+        result = retrieve_result(pond_key) #precomputed at upload
+    except Exception:
+        return graph_data_error("Could not find pond: "+pond_key)
+    if(layer_index >= result["number_of_layers"]):
+        return graph_data_error("No such layer: "+str(layer_index))
+    times, ppr_values = get_layer_series(result, layer_index)
+    series = get_result_description(result)
+    series["layer_index"] = layer_index
+    series["times"] = times
+    series["hourly_ppr"] = ppr_values
+    return set_graph_cache_headers(jsonify(series), etag)
+
+
+@app.route('/graph_data/<pond_key>')
+def hourly_ppr_in_all_layers_data(pond_key=""):
+    '''
+    Like /graph_data/<pond_key>/<layer_index>, but every layer of the pond at once, sharing one list of times.
+    '''
+    dataset_id = session.get(DATASET_ID_KEY)
+    etag = graph_cache.get_etag(graph_cache.get_key(dataset_id, pond_key, None, (GRAPH_DATA_FORMAT,)))
+    if(dataset_id is not None and etag in request.if_none_match):
+        return set_graph_cache_headers(Response(status=304), etag)
+
+    try:
+        result = retrieve_result(pond_key) #precomputed at upload
+    except Exception:
+        return graph_data_error("Could not find pond: "+pond_key)
+    series = get_result_description(result)
+    series["times"] = get_layer_series(result, 0)[0] if result["number_of_layers"] > 0 else []
+    series["layers"] = [{"layer_index": layer_index, "hourly_ppr": get_layer_series(result, layer_index)[1]}
+                        for layer_index in range(result["number_of_layers"])]
+    return set_graph_cache_headers(jsonify(series), etag)
     
 
     
@@ -261,6 +339,88 @@ def export_view():
     # inserting into Flask response
     ##################################
 
+    #get data from session
+    #PLATYPUS
+    workbook = create_export_workbook(results=get_results()) #precomputed at upload
+
+
+    #This is the magic. The workbook is saved into the StringIO object,
+    #then that is passed to response for Flask to use.
+    output = StringIO.StringIO()
+    workbook.save(output)
+    response.data = output.getvalue()
+
+    ################################
+    # Code for setting correct
+    # headers for jquery.fileDownload
+    #################################
+    filename = "export.xls"
+    mimetype_tuple = mimetypes.guess_type(filename)
+
+    #HTTP headers for forcing file download
+    response_headers = Headers({
+            'Pragma': "public",  # required,
+            'Expires': '0',
+            'Cache-Control': 'must-revalidate, post-check=0, pre-check=0',
+            'Cache-Control': 'private',  # required for certain browsers,
+            'Content-Type': mimetype_tuple[0],
+            'Content-Disposition': 'attachment; filename=\"%s\";' % filename,
+            'Content-Transfer-Encoding': 'binary',
+            'Content-Length': len(response.data)
+        })
+
+    if not mimetype_tuple[1] is None:
+        response.update({
+                'Content-Encoding': mimetype_tuple[1]
+            })
+
+    response.headers = response_headers
+
+    #as per jquery.fileDownload.js requirements
+    response.set_cookie('fileDownload', 'true', path='/')
+
+    ################################
+    # Return the response
+    #################################
+    return response
+
+
+
+
+@app.errorhandler(413)
+def request_entity_too_large(error):
+    '''
+    Error handler view. Should display when files that are too large are uploaded.
+    '''
+    return 'File Too Large'
+
+@app.errorhandler(404)
+def pageNotFound(error):
+    
+    return "Page not found"
+
+@app.errorhandler(500)
+def internalServerError(internal_exception):
+    '''
+    Prints internal program exceptions so they are visible by the user. Stopgap measure for usability.
+    
+    '''
+    
+    #TODO: more and better errors, so that when specific parts of the data are wrong, users can figure it out.
+    traceback.print_exc()
+    print str(internal_exception)
+    return render_template(INTERNAL_SERVER_ERROR_TEMPLATE_ROUTE, error = str(internal_exception))
+
+
+#HELPER METHODS
+def create_export_workbook(pond_list=[], results=None):
+    '''
+    Builds the excel workbook that /export sends: a sheet of daily statistics and a sheet of hourly statistics.
+    @param pond_list: list of Pond objects. Only used if results is None.
+    @param results: PondBatchCalculator results table, if already calculated. Calculated from pond_list if None.
+    @return: the workbook
+    @rtype: xlwt.Workbook
+    '''
     #.... code here for adding worksheets and cells
     #Create a new workbook object
     workbook = xlwt.Workbook()
@@ -275,9 +435,9 @@ def export_view():
     bppr_column = day_of_year_column+1
     pppr_column = bppr_column+1        
          
-    #get data from session, write to daily_worksheet
-    #PLATYPUS
-    pond_list  = unpickle_pond_list()
+    #write to daily_worksheet
+    if(results is None):
+        results = PondProcessPool().calculate(pond_list) #every pond at once, on the worker processes
 
     
     year_list = []
@@ -286,12 +446,12 @@ def export_view():
     bpprList =[]
     ppprList = []
     
-    for pond in pond_list:
-        year = pond.get_year()
-        lake_id = pond.get_lake_id()
-        day_of_year = pond.get_day_of_year()
-        bppr = pond.calculate_daily_whole_lake_benthic_primary_production_m2()
-        pppr = pond.calculate_daily_whole_lake_phytoplankton_primary_production_m2()
+    for result in results:
+        year = int(result["year"])
+        lake_id = result["lake_id"]
+        day_of_year = int(result["day_of_year"])
+        bppr = float(result["daily_benthic"])
+        pppr = float(result["daily_phytoplankton"])
         
         year_list.append(year)
         lake_id_list.append(lake_id)
@@ -329,23 +489,21 @@ def export_view():
     hour_list = []
     hourly_ppr_rates_list = []
     counter = 0
-    for pond in pond_list:
-        year = pond.get_year()
-        lake_id = pond.get_lake_id()
-        day_of_year = pond.get_day_of_year()        
-        for layer in range (0, len(pond.get_thermal_layer_depths())):              
+    for result in results:
+        year = int(result["year"])
+        lake_id = result["lake_id"]
+        day_of_year = int(result["day_of_year"])
+        hours = result["times"][:result["number_of_times"]].tolist()
+        for layer in range (0, result["number_of_layers"]):              
             hourly_ppr_in_this_layer_list = []                      
-            hourly_ppr_in_this_layer_list = pond.calculate_hourly_phytoplankton_primary_production_rates_list_over_whole_day_in_thermal_layer(layer)
-            hour = 0.0
-            time_interval = pond.get_time_interval()
-            for hourly_ppr in hourly_ppr_in_this_layer_list:
+            hourly_ppr_in_this_layer_list = result["layer_hourly"][layer, :result["number_of_times"]].tolist()
+            for hour, hourly_ppr in zip(hours, hourly_ppr_in_this_layer_list):
                 year_list.append(year)
                 lake_id_list.append(lake_id)
                 day_of_year_list.append(day_of_year)
                 layer_list.append(layer)
                 hour_list.append(hour)
                 hourly_ppr_rates_list.append(hourly_ppr)
-                hour+=time_interval
                 counter+=1
                 if(counter>10000):
                     raise Exception("too big! The ouput is too big!!!")
@@ -360,180 +518,161 @@ def export_view():
     write_column_to_worksheet(hourly_worksheet, hour_column, "hour", hour_list)
     write_column_to_worksheet(hourly_worksheet, hourly_ppr_rates_column, "ppr_m3", hourly_ppr_rates_list)
 
+    return workbook
 
-    #This is the magic. The workbook is saved into the StringIO object,
-    #then that is passed to response for Flask to use.
-    output = StringIO.StringIO()
-    workbook.save(output)
-    response.data = output.getvalue()
 
-    ################################
-    # Code for setting correct
-    # headers for jquery.fileDownload
-    #################################
-    filename = "export.xls"
-    mimetype_tuple = mimetypes.guess_type(filename)
+def write_column_to_worksheet(worksheet,column_number=0, column_header = "", values_list=[]):
+    '''
+    Prepends a column header and puts the data in values_list into worksheet at the specified column
+    @param worksheet: An xlrd worksheet to write to.
+    @param column_number: Column number to write to.
+    @param column_header: Header to put at the top of the column.
+    @param values_list: list of values to put in the column.
+    '''
+    print "writing column to worksheet"
+    values_list.insert(0, column_header) #stick the column header at the front.
+    numRows = len(values_list)
 
-    #HTTP headers for forcing file download
-    response_headers = Headers({
-            'Pragma': "public",  # required,
-            'Expires': '0',
-            'Cache-Control': 'must-revalidate, post-check=0, pre-check=0',
-            'Cache-Control': 'private',  # required for certain browsers,
-            'Content-Type': mimetype_tuple[0],
-            'Content-Disposition': 'attachment; filename=\"%s\";' % filename,
-            'Content-Transfer-Encoding': 'binary',
-            'Content-Length': len(response.data)
-        })
 
-    if not mimetype_tuple[1] is None:
-        response.update({
-                'Content-Encoding': mimetype_tuple[1]
-            })
+    for i in range(0, numRows):
+        row = i
+        column = column_number
+        value=values_list[row]
+        worksheet.write(row,column,value)
 
-    response.headers = response_headers
 
-    #as per jquery.fileDownload.js requirements
-    response.set_cookie('fileDownload', 'true', path='/')
 
-    ################################
-    # Return the response
-    #################################
-    return response
+def get_cached_results():
+    '''
+    @return: the results calculated when this session's file was uploaded, or None if they're not stored.
+    @rtype: numpy structured array
+    '''
+    if(not hasattr(g, 'results')):
+        try:
+            g.results = dataset_store.get_results(session.get(DATASET_ID_KEY))
+        except KeyError:
+            g.results = None
+    return g.results
 
 
+def get_results():
+    '''
+    The results table for this session's dataset. Calculated at upload and stored with it, so this normally just loads it.
+    Only datasets stored without one are calculated here.
+    @rtype: numpy structured array
+    '''
+    results = get_cached_results()
+    if(results is None):
+        results = PondProcessPool().calculate(load_pond_list())
+        g.results = results
+    return results
 
 
-@app.errorhandler(413)
-def request_entity_too_large(error):
+def retrieve_result(pond_key = ""):
     '''
-    Error handler view. Should display when files that are too large are uploaded.
+    @param pond_key: from Pond.get_key()
+    @return: the row of the results table for that pond.
+    @rtype: numpy record
     '''
-    return 'File Too Large'
+    results = get_results()
+    result_indices_by_key = getattr(g, 'result_indices_by_key', None)
+    if(result_indices_by_key is None):
+        result_indices_by_key = {}
+        for index, key in enumerate(results["key"]):
+            result_indices_by_key.setdefault(key, index) #the first pond with a key wins
+        g.result_indices_by_key = result_indices_by_key
+    if(pond_key not in result_indices_by_key):
+        raise Exception("Could not find pond")
+    return results[result_indices_by_key[pond_key]]
+
+
+def load_pond_list():
+    '''
+    Loaded from the dataset store once per request, however many times a view or template asks.
+    @return: every Pond in this session's dataset.
+    @rtype: list
+    '''
+    pond_list = getattr(g, 'pond_list', None)
+    if(pond_list is None):
+        try:
+            pond_list = dataset_store.get_pond_list(session.get(DATASET_ID_KEY))
+        except KeyError:
+            raise Exception("No data found. It may have expired. Please upload the file again.")
+        g.pond_list = pond_list
+    return pond_list
 
-@app.errorhandler(404)
-def pageNotFound(error):
     
-    return "Page not found"
-
-@app.errorhandler(500)
-def internalServerError(internal_exception):
+def store_pond_list(dataset_id, pond_list = [], results=None):
     '''
-    Prints internal program exceptions so they are visible by the user. Stopgap measure for usability.
-    
+    Puts the ponds and their results in the dataset store, replacing anything stored under dataset_id, 
+    and the dataset ID in the session.
     '''
-    
-    #TODO: more and better errors, so that when specific parts of the data are wrong, users can figure it out.
-    traceback.print_exc()
-    print str(internal_exception)
-    return render_template(INTERNAL_SERVER_ERROR_TEMPLATE_ROUTE, error = str(internal_exception))
+    dataset_store.store_dataset(dataset_id, pond_list, results)
+    session[DATASET_ID_KEY] = dataset_id
 
 
-#HELPER METHODS
-def write_column_to_worksheet(worksheet,column_number=0, column_header = "", values_list=[]):
+def get_layer_series(result, layer_index):
     '''
-    Prepends a column header and puts the data in values_list into worksheet at the specified column
-    @param worksheet: An xlrd worksheet to write to.
-    @param column_number: Column number to write to.
-    @param column_header: Header to put at the top of the column.
-    @param values_list: list of values to put in the column.
+    The times are the ones stored in the results table at upload: Pond.get_list_of_times(), kept only where the time 
+    is an exact multiple of the pond's time interval, the same filter Pond's hourly layer rates use. 
+    At the site's default interval of 0.25 hours that is every time in the list. At intervals that aren't exact in binary, 
+    e.g. 0.1, the running sum that builds the list drifts, and only a few times are kept.
+    @param result: a row of the results table, from retrieve_result()
+    @param layer_index: thermal layer, from 0
+    @return: times (hours), and the hourly primary production in the layer at each of those times.
+    @rtype: tuple of two lists
     '''
-    print "writing column to worksheet"
-    values_list.insert(0, column_header) #stick the column header at the front.
-    numRows = len(values_list)
+    number_of_times = result["number_of_times"]
+    times = result["times"][:number_of_times].tolist()
+    ppr_values = result["layer_hourly"][layer_index, :number_of_times].tolist()
+    return times, ppr_values
 
 
-    for i in range(0, numRows):
-        row = i
-        column = column_number
-        value=values_list[row]
-        worksheet.write(row,column,value)
+def get_result_description(result):
+    '''
+    @param result: a row of the results table, from retrieve_result()
+    @return: which pond the row is for, as plain JSON-able values.
+    @rtype: dict
+    '''
+    return {"pond_key": str(result["key"]),
+            "lake_id": str(result["lake_id"]),
+            "year": int(result["year"]),
+            "day_of_year": int(result["day_of_year"]),
+            "number_of_layers": int(result["number_of_layers"])}
 
 
+def graph_data_error(error_message, status=404):
+    '''
+    @return: a JSON error response, for the graph data views.
+    '''
+    response = jsonify({"error": error_message})
+    response.status_code = status
+    return response
 
-def retrieve_pond(pond_key = ""):
-    
-    #pickled pond list from session
-    print "retrieve pond", pond_key
-    pond_list = unpickle_pond_list()
-    try:
-        pond = next(pond for pond in pond_list if pond.get_key()==pond_key)
-    except: 
-        raise Exception("Could not find pond")    
-    print "found pond"
-    return pond
-    
-        
-      
 
-def unpickle_pond_list():    
-    
-    pickled_ponds_list = session[PICKLED_POND_LIST_KEY]
-    pond_list = []
-    for pickled_pond in pickled_ponds_list:
-        pond = jsonpickle.decode(pickled_pond, keys=True) #BEWARE! THIS TURNS ALL THE KEYS IN BATHYMETRIC POND SHAPE TO STRINGS
-        pond_list.append(pond)      
-        
-    return pond_list
-    
-def pickle_pond_list(pond_list = []):
-    pickled_ponds_list = []
-    for pond in pond_list:
-        pickled_pond = jsonpickle.encode(pond,keys=True) #make it NOT SET THE KEYS TO STRINGS
-        
-        pickled_ponds_list.append(pickled_pond)
-        
-    session[PICKLED_POND_LIST_KEY] = pickled_ponds_list             
+def set_graph_cache_headers(response, etag):
+    '''
+    Lets the browser keep a graph, but ask each time whether it's still good. The answer is a cheap 304 if it is.
+    @return: response
+    '''
+    response.set_etag(etag)
+    response.cache_control.private = True #graphs belong to one session's upload
+    response.cache_control.no_cache = True #always revalidate, using the ETag
+    return response
 
 
-def graph(x_vals=[],y_vals=[],x_label = "x label", y_label="y label", graph_title = "graph_title", graph_line_width=3):
-    print "graphing"
-    
-#         #get arguments.
-#     graph_type = request.args.get('graph_type')
-    
-    
-    #make the figure
-    fig = plt.figure() 
-#     fig = plt.Figure()
-    
-    
-    #make the graph.
-    f_subplot = fig.add_subplot(1, 1, 1) #http://stackoverflow.com/questions/3584805/in-matplotlib-what-does-111-means-in-fig-add-subplot111
-    
-     #setup y_vals-f_subplot
-    if(len(x_vals)<2):
-        x_vals=np.arange(0.0, 8.0, 0.01)
-     
-     #Setup x_vals-f_subplot
-#     y_vals=[]
-    if(len(y_vals)<2):
-        y_vals = np.sin(2*np.pi*x_vals)
-    
-    
-    #set labels and graph_title
-    #fancy number formatting from http://stackoverflow.com/questions/21226868/superscript-in-python-plots
-    f_subplot.set_xlabel(x_label)
-    f_subplot.set_ylabel(y_label)
-    f_subplot.set_title(graph_title)
-    
-    #plot
-    f_subplot.plot(x_vals, y_vals, linewidth = graph_line_width)
-    
-    
-    #package up the image and send it back. All of this replaces the ".show()" step.
-    #figure to canvas. canvas with StringIO to png. png passed to make_response.
-    canvas = FigureCanvas(fig)
-    output = StringIO.StringIO()
-    canvas.print_png(output)
-    response = make_response(output.getvalue())
-    response.mimetype = 'image/png'
-    return response  
+def render_graph_png(x_vals=[],y_vals=[],x_label = "x label", y_label="y label", graph_title = "graph_title", graph_line_width=3):
+    '''
+    Safe to call from several threads at once, and leaves nothing behind.
+    @return: the graph, as png bytes
+    @rtype: str
+    '''
+    return GraphRenderer().render_png(x_vals, y_vals, x_label, y_label, graph_title, graph_line_width)
     
 # For a given file, return whether it's an allowed type or not
 def allowed_file(filename):
     return '.' in filename and \
-           filename.rsplit('.', 1)[1] in ALLOWED_EXTENSIONS
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
 
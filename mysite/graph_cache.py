@@ -0,0 +1,109 @@
+'''
+Created on Oct 17, 2026
+
+In-memory cache of rendered graph images, so toggling the same layer graph again doesn't recalculate or re-render it.
+
+Images are kept least recently used first, and the oldest are dropped once the total passes maximum_bytes.
+Each key also gets an ETag, worked out from the key alone, so a browser that already has the image can be told
+so (304 Not Modified) without rendering anything, even after the image has been dropped from the cache.
+
+@author: cdleong
+'''
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class GraphCache(object):
+    '''
+    classdocs
+    '''
+
+    #CONSTANTS
+    DEFAULT_MAXIMUM_BYTES = 32 * 1024 * 1024 #32 megabytes. A layer graph is about 30 kilobytes.
+    RENDER_VERSION = "1" #change this whenever graphs are drawn differently, so browsers don't keep old images.
+
+
+    def __init__(self, maximum_bytes=DEFAULT_MAXIMUM_BYTES):
+        '''
+        Constructor
+        @param maximum_bytes: total size of the cached images before the least recently used are dropped.
+        '''
+        self.maximum_bytes = maximum_bytes
+        self.images = OrderedDict() #key -> image bytes, least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock() #shared by every thread of the server
+
+
+    def get_key(self, dataset_id, pond_key, layer_index, render_options=()):
+        '''
+        @param dataset_id: the dataset the graph is from. Datasets never change once stored, so neither does the graph.
+        @param pond_key: from Pond.get_key()
+        @param layer_index: thermal layer, from 0
+        @param render_options: anything else that changes the image, e.g. labels or line width.
+        @rtype: tuple
+        '''
+        return (dataset_id, pond_key, layer_index, tuple(render_options))
+
+
+    def get_etag(self, key):
+        '''
+        @param key: from get_key()
+        @return: an ETag for the image with that key.
+        @rtype: str
+        '''
+        return hashlib.sha1(repr((self.RENDER_VERSION, key))).hexdigest()
+
+
+    def get(self, key):
+        '''
+        @param key: from get_key()
+        @return: the image, or None if it isn't cached.
+        @rtype: str
+        '''
+        with self.lock:
+            image = self.images.pop(key, None)
+            if(image is not None):
+                self.images[key] = image #most recently used now
+            return image
+
+
+    def put(self, key, image):
+        '''
+        Caches an image, dropping the least recently used images if needed.
+        @param key: from get_key()
+        @param image: the rendered image, as bytes
+        '''
+        if(len(image) > self.maximum_bytes):
+            return #would push out everything else
+        with self.lock:
+            old_image = self.images.pop(key, None)
+            if(old_image is not None):
+                self.total_bytes -= len(old_image)
+            self.images[key] = image
+            self.total_bytes += len(image)
+            while(self.total_bytes > self.maximum_bytes):
+                _, evicted_image = self.images.popitem(last=False)
+                self.total_bytes -= len(evicted_image)
+
+
+    def clear(self):
+        '''
+        Drops every cached image.
+        '''
+        with self.lock:
+            self.images.clear()
+            self.total_bytes = 0
+
+
+
+def main():
+    '''
+    Used for testing!
+    '''
+    print "hello world"
+
+
+
+if __name__ == "__main__":
+    main()
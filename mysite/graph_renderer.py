@@ -0,0 +1,97 @@
+'''
+Created on Oct 17, 2026
+
+Draws graphs to png without pyplot.
+
+pyplot keeps every figure it makes in global state until it's closed, so a long-running server that never closes them
+grows with every graph, and two threads using it at once can draw on each other's figures. Here each graph gets its
+own matplotlib Figure and Agg canvas, nothing global holds on to them, and they're taken apart as soon as the png
+is written. Each graph is drawn entirely under one lock, from making the figure to writing the png, since matplotlib's
+font and text caches are shared between threads.
+
+@author: cdleong
+'''
+import threading
+import StringIO
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+
+
+class GraphRenderer(object):
+    '''
+    classdocs
+    '''
+
+    #CONSTANTS
+    DEFAULT_FIGURE_SIZE = None #None uses matplotlib's default, same as pyplot.figure()
+    DEFAULT_DPI = None #None uses matplotlib's default
+
+    #shared by every GraphRenderer, in every thread. Held for the whole of each drawing.
+    draw_lock = threading.Lock()
+
+
+    def __init__(self, figure_size=DEFAULT_FIGURE_SIZE, dpi=DEFAULT_DPI):
+        '''
+        Constructor
+        @param figure_size: (width, height) in inches, or None for matplotlib's default
+        @param dpi: dots per inch, or None for matplotlib's default
+        '''
+        self.figure_size = figure_size
+        self.dpi = dpi
+
+
+    def render_png(self, x_vals=[], y_vals=[], x_label="x label", y_label="y label", graph_title="graph_title", graph_line_width=3):
+        '''
+        Draws a line graph.
+        @param x_vals: x values. Fewer than 2 draws a placeholder sine wave.
+        @param y_vals: y values. Fewer than 2 draws a placeholder sine wave.
+        @return: the graph, as png bytes
+        @rtype: str
+        '''
+        #the whole drawing, from making the figure to writing the png, uses matplotlib's shared font and text caches.
+        with self.draw_lock:
+            #make the figure. Not pyplot, so nothing else keeps a reference to it.
+            fig = Figure(figsize=self.figure_size, dpi=self.dpi)
+            canvas = FigureCanvas(fig)
+            try:
+                #make the graph.
+                f_subplot = fig.add_subplot(1, 1, 1) #http://stackoverflow.com/questions/3584805/in-matplotlib-what-does-111-means-in-fig-add-subplot111
+
+                #placeholder data
+                if(len(x_vals)<2):
+                    x_vals=np.arange(0.0, 8.0, 0.01)
+                if(len(y_vals)<2):
+                    y_vals = np.sin(2*np.pi*x_vals)
+
+                #set labels and graph_title
+                #fancy number formatting from http://stackoverflow.com/questions/21226868/superscript-in-python-plots
+                f_subplot.set_xlabel(x_label)
+                f_subplot.set_ylabel(y_label)
+                f_subplot.set_title(graph_title)
+
+                #plot
+                f_subplot.plot(x_vals, y_vals, linewidth = graph_line_width)
+
+                #canvas with StringIO to png.
+                output = StringIO.StringIO()
+                canvas.print_png(output)
+                return output.getvalue()
+            finally:
+                #take it apart now, rather than waiting for the garbage collector to find the figure/canvas/axes cycles.
+                fig.clf()
+                fig.set_canvas(None)
+                canvas.figure = None
+
+
+
+def main():
+    '''
+    Used for testing!
+    '''
+    print "hello world"
+
+
+
+if __name__ == "__main__":
+    main()
@@ -57,6 +57,18 @@ class Pond(object):
     
     BASE_TIME_UNIT = 1 #hours
 
+    # ways of integrating production over the day, for the daily totals.
+    TIME_INTEGRATION_FIXED_STEP = "fixed_step"  # sum at every time_interval. The original method, and the default.
+    TIME_INTEGRATION_GAUSS_LEGENDRE = "gauss_legendre"  # Gauss-Legendre quadrature, doubling the number of nodes until within tolerance.
+    TIME_INTEGRATION_ADAPTIVE_SIMPSON = "adaptive_simpson"  # adaptive Simpson's rule, splitting only where needed to get within tolerance.
+    VALID_TIME_INTEGRATION_METHODS = [TIME_INTEGRATION_FIXED_STEP, TIME_INTEGRATION_GAUSS_LEGENDRE, TIME_INTEGRATION_ADAPTIVE_SIMPSON]
+    DEFAULT_TIME_INTEGRATION_TOLERANCE = 1e-6  # relative error. Far below the precision of any field measurement.
+    MINIMUM_GAUSS_LEGENDRE_NODES = 8
+    MAXIMUM_GAUSS_LEGENDRE_NODES = 1024
+    MINIMUM_TIME_INTEGRATION_TOLERANCE = 1e-15  # relative. About what float64 can resolve. Anything tighter is never met, and adaptive Simpson would split forever.
+    MAXIMUM_ADAPTIVE_SIMPSON_LEVELS = 30 #each level halves the intervals still out of tolerance.
+    MAXIMUM_ADAPTIVE_SIMPSON_EVALUATIONS = 65536 #total times evaluated. Past this, the best estimate so far is used.
+
 
     ###################################
     # VARIABLES
@@ -86,6 +98,10 @@ class Pond(object):
     # default intervals for calculations is quarter-hours
     time_interval = 0.25
 
+    # how daily totals are integrated over time.
+    time_integration_method = TIME_INTEGRATION_FIXED_STEP
+    time_integration_tolerance = DEFAULT_TIME_INTEGRATION_TOLERANCE
+
 
 
 
@@ -102,7 +118,9 @@ class Pond(object):
                  pond_shape_object=PondShape(),
                  benthic_photosynthesis_measurements=[],
                  phytoplankton_photosynthesis_measurements=[],
-                 time_interval=0.25):
+                 time_interval=0.25,
+                 time_integration_method=TIME_INTEGRATION_FIXED_STEP,
+                 time_integration_tolerance=DEFAULT_TIME_INTEGRATION_TOLERANCE):
         '''
         CONSTRUCTOR
         @param lake_ID: string
@@ -113,6 +131,9 @@ class Pond(object):
         @param pond_shape_object: a PondShape object
         @param benthic_photosynthesis_measurements: a list of BenthicPhotoSynthesisMeasurements
         @param phytoplankton_photosynthesis_measurements:  a list of PhyttoplanktonPhotoSynthesisMeasurements
+        @param time_interval: fractional hours, for fixed-step calculations.
+        @param time_integration_method: one of VALID_TIME_INTEGRATION_METHODS
+        @param time_integration_tolerance: relative error allowed for the gauss_legendre and adaptive_simpson methods.
         '''
         self.set_year(year)
         self.set_lake_id(lake_ID)
@@ -124,9 +145,150 @@ class Pond(object):
         self.set_benthic_photosynthesis_measurements(benthic_photosynthesis_measurements)
         self.set_phytoplankton_photosynthesis_measurements(phytoplankton_photosynthesis_measurements)
         self.set_time_interval(time_interval)
+        self.set_time_integration_method(time_integration_method)
+        self.set_time_integration_tolerance(time_integration_tolerance)
 
 
 
+    ############################
+    # PICKLING
+    ###########################
+    #lookup structures derived from the measurements, and memoized results. Left out of pickles (and jsonpickle) and rebuilt on load.
+    DERIVED_ATTRIBUTE_NAMES = ('_Pond__phyto_layer_measurements',
+                               '_Pond__phyto_layer_depths',
+                               '_Pond__phyto_layer_pmax',
+                               '_Pond__phyto_layer_alpha',
+                               '_Pond__phyto_layer_beta',
+                               '_Pond__results_cache',
+                               '_Pond__results_cache_shape_version')
+
+    def __getstate__(self):
+        '''
+        Everything but the derived lookup structures.
+        @rtype: dict
+        '''
+        state = self.__dict__.copy()
+        for attribute_name in self.DERIVED_ATTRIBUTE_NAMES:
+            state.pop(attribute_name, None)
+        return state
+
+    def __setstate__(self, state):
+        '''
+        Restores the state, then rebuilds the derived lookup structures.
+        @param state: dict from __getstate__
+        '''
+        self.__dict__.update(state)
+        self.update_phytoplankton_layer_index()
+        self.clear_results_cache()
+
+
+    def to_compact(self, shape_indices_by_object_id=None):
+        '''
+        Plain-tuple form of this Pond. Much smaller and faster to send between processes than a pickled or jsonpickled Pond.
+        Bathymetric shapes become sorted (depth, area) pairs, from compact_shape(). Any other shape is passed along as-is.
+        Ponds that share a shape can send it once instead: give shape_indices_by_object_id, and a shape found in it 
+        is sent as its index. from_compact() then needs the same shapes, in a list, to keep them shared.
+        Otherwise from_compact() gives each Pond its own copy of its shape.
+        @param shape_indices_by_object_id: id(shape) -> index into the shapes sent alongside. Optional.
+        @return: (year, lake ID, day of year, length of day, noon surface light, kd, time interval,
+                  time integration method, time integration tolerance, shape,
+                  benthic (depth, pmax, ik) tuples, phyto (thermal layer, depth, pmax, alpha, beta) tuples)
+        @rtype: tuple
+        '''
+        shape = self.get_pond_shape()
+        if(shape_indices_by_object_id is not None and id(shape) in shape_indices_by_object_id):
+            shape = shape_indices_by_object_id[id(shape)]
+        elif(isinstance(shape, BathymetricPondShape)):
+            shape = self.compact_shape(shape)
+        benthic_measurements = tuple((m.get_depth(), m.get_pmax(), m.get_ik()) for m in self.get_benthic_photosynthesis_measurements())
+        phyto_measurements = tuple((m.get_thermal_layer(), m.get_depth(), m.get_pmax(), m.get_phyto_alpha(), m.get_phyto_beta()) for m in self.get_phytoplankton_photosynthesis_measurements())
+        return (self.get_year(),
+                self.get_lake_id(),
+                self.get_day_of_year(),
+                self.get_length_of_day(),
+                self.get_noon_surface_light(),
+                self.get_light_attenuation_coefficient(),
+                self.get_time_interval(),
+                self.get_time_integration_method(),
+                self.get_time_integration_tolerance(),
+                shape,
+                benthic_measurements,
+                phyto_measurements)
+
+
+    @staticmethod
+    def compact_shape(shape):
+        '''
+        @param shape: a BathymetricPondShape
+        @return: its sorted (depth, area) pairs. BathymetricPondShape(dict(pairs)) rebuilds it.
+        @rtype: tuple
+        '''
+        return tuple(zip(shape.get_sorted_depths().tolist(), shape.get_sorted_areas().tolist()))
+
+
+    @staticmethod
+    def from_compact(compact, shapes=None):
+        '''
+        Rebuilds a Pond from to_compact().
+        @param compact: tuple from to_compact()
+        @param shapes: list of shape objects, for a compact Pond whose shape was sent as an index. Ponds given the same list share them.
+        @rtype: Pond
+        '''
+        (year, lake_id, day_of_year, length_of_day, noon_surface_light, light_attenuation_coefficient, time_interval,
+         time_integration_method, time_integration_tolerance, shape, benthic_measurements, phyto_measurements) = compact
+        if(isinstance(shape, (int, long))):
+            shape = shapes[shape]
+        elif(isinstance(shape, tuple)):
+            shape = BathymetricPondShape(dict(shape))
+        return Pond(year,
+                    lake_id,
+                    day_of_year,
+                    length_of_day,
+                    noon_surface_light,
+                    light_attenuation_coefficient,
+                    shape,
+                    [BenthicPhotosynthesisMeasurement(*m) for m in benthic_measurements],
+                    [PhytoPlanktonPhotosynthesisMeasurement(*m) for m in phyto_measurements],
+                    time_interval,
+                    time_integration_method,
+                    time_integration_tolerance)
+
+
+    ############################
+    # MEMOIZED RESULTS
+    ###########################
+    # Daily/hourly results and derived values like the photic zone lower bound are saved the first time they're calculated.
+    # Every setter or mutator that could change a result clears them, and so does any change to the pond shape.
+
+    def clear_results_cache(self):
+        '''
+        Throws away every memoized result.
+        '''
+        self.__results_cache = {}
+        self.__results_cache_shape_version = None
+
+
+    def get_cached_result(self, key):
+        '''
+        @param key: tuple. The name of the calculation, then its arguments.
+        @return: the memoized result, or None if there isn't one.
+        '''
+        shape_version = self.get_pond_shape().get_version()
+        if(shape_version != self.__results_cache_shape_version):
+            self.__results_cache = {}
+            self.__results_cache_shape_version = shape_version
+        return self.__results_cache.get(key)
+
+
+    def cache_result(self, key, result):
+        '''
+        @param key: tuple. The name of the calculation, then its arguments.
+        @param result: the result to save.
+        @return: result, unchanged.
+        '''
+        self.__results_cache[key] = result
+        return result
+
 
 
     ###################
@@ -373,6 +535,22 @@ class Pond(object):
         @rtype: float
         '''
         return self.__time_interval
+
+    def get_time_integration_method(self):
+        '''
+        Get Time Integration Method
+        How daily totals are integrated over the day. One of VALID_TIME_INTEGRATION_METHODS.
+        @rtype: string
+        '''
+        return self.__time_integration_method
+
+    def get_time_integration_tolerance(self):
+        '''
+        Get Time Integration Tolerance
+        Relative error allowed for the gauss_legendre and adaptive_simpson time integration methods.
+        @rtype: float
+        '''
+        return self.__time_integration_tolerance
     
     def get_list_of_times(self):
         '''
@@ -433,6 +611,7 @@ class Pond(object):
         '''
         validated_length_of_day = self.validate_length_of_day(length_of_day)
         self.__length_of_day = validated_length_of_day
+        self.clear_results_cache()
 
 
     def set_noon_surface_light(self, noon_surface_light):
@@ -443,6 +622,7 @@ class Pond(object):
         '''
         validated_light = self.validate_noon_surface_light(noon_surface_light)
         self.__noon_surface_light = validated_light
+        self.clear_results_cache()
 
 
     def set_light_attenuation_coefficient(self, light_attenuation_coefficient):
@@ -453,6 +633,7 @@ class Pond(object):
         '''
         validated_light_attenuation_coefficient = self.validate_light_attenuation_coefficient(light_attenuation_coefficient)
         self.__light_attenuation_coefficient = validated_light_attenuation_coefficient
+        self.clear_results_cache()
 
 
 
@@ -462,15 +643,42 @@ class Pond(object):
         @param time_interval: fractional hours. For example, 0.5 = half hours, 0.25 = 15 minutes. 
         '''
         self.__time_interval = time_interval
+        self.clear_results_cache()
+
+    def set_time_integration_method(self, time_integration_method):
+        '''
+        Set Time Integration Method
+        @param time_integration_method: one of VALID_TIME_INTEGRATION_METHODS. fixed_step keeps results identical to older versions.
+        '''
+        if(time_integration_method in self.VALID_TIME_INTEGRATION_METHODS):
+            self.__time_integration_method = time_integration_method
+            self.clear_results_cache()
+        else:
+            raise Exception("cannot set time integration method. Must be one of ", self.VALID_TIME_INTEGRATION_METHODS)
+
+    def set_time_integration_tolerance(self, time_integration_tolerance):
+        '''
+        Set Time Integration Tolerance
+        @param time_integration_tolerance: relative error, greater than zero. For example, 1e-6. 
+        Values below MINIMUM_TIME_INTEGRATION_TOLERANCE are set to it, since double precision can't get any closer.
+        '''
+        if(time_integration_tolerance > 0):
+            self.__time_integration_tolerance = max(time_integration_tolerance, self.MINIMUM_TIME_INTEGRATION_TOLERANCE)
+            self.clear_results_cache()
+        else:
+            raise Exception("cannot set time integration tolerance. Must be greater than zero")
 
     def set_pond_shape(self, pond_shape_object):
         '''
         Set Time Interval
         Validates the value
+        The shape object is used as-is, not copied, so several Ponds can share one (DataReader gives every day of a lake 
+        the same shape). Changing the shape object itself changes it for all of them. Pond.update_shape() doesn't.
         @param pond_shape_object: a PondShape object of some type. So long as it extends PondShape, it should work. 
         '''
         if(isinstance(pond_shape_object, PondShape)):
             self.pond_shape_object = pond_shape_object
+            self.clear_results_cache()
         else:
             raise Exception("cannot set pond shape. Invalid type")
 
@@ -485,6 +693,7 @@ class Pond(object):
         all_valid = self.validate_types_of_all_items_in_list(values, BenthicPhotosynthesisMeasurement)
         if(all_valid):
             self.__benthic_photosynthesis_measurements = values
+            self.clear_results_cache()
         else:
             raise Exception("ERROR: all values in benthic_photosynthesis_measurements must be of type BenthicPhotosynthesisMeasurement")
 
@@ -506,6 +715,8 @@ class Pond(object):
             raise Exception("ERROR: there must be 0 to 3 thermal layers")
         else:
             self.__phytoplankton_photosynthesis_measurements = values
+            self.update_phytoplankton_layer_index()
+            self.clear_results_cache()
 
 
 
@@ -550,6 +761,14 @@ class Pond(object):
         del self.__time_interval
 
 
+    def del_time_integration_method(self):
+        del self.__time_integration_method
+
+
+    def del_time_integration_tolerance(self):
+        del self.__time_integration_tolerance
+
+
     ########################################
     # Properties
     ########################################    
@@ -563,6 +782,8 @@ class Pond(object):
     benthic_photosynthesis_measurements = property(get_benthic_photosynthesis_measurements, set_benthic_photosynthesis_measurements, del_benthic_photosynthesis_measurements, "benthic_photosynthesis_measurements's docstring")
     phytoplankton_photosynthesis_measurements = property(get_phytoplankton_photosynthesis_measurements, set_phytoplankton_photosynthesis_measurements, del_phytoplankton_photosynthesis_measurements, "phytoplankton_photosynthesis_measurements's docstring")
     time_interval = property(get_time_interval, set_time_interval, del_time_interval, "time_interval's docstring")
+    time_integration_method = property(get_time_integration_method, set_time_integration_method, del_time_integration_method, "time_integration_method's docstring")
+    time_integration_tolerance = property(get_time_integration_tolerance, set_time_integration_tolerance, del_time_integration_tolerance, "time_integration_tolerance's docstring")
 
 
 
@@ -573,6 +794,7 @@ class Pond(object):
     def add_benthic_measurement(self, measurement=BenthicPhotosynthesisMeasurement):
         if(isinstance(measurement, BenthicPhotosynthesisMeasurement)):
             self.benthic_photosynthesis_measurements.append(measurement)
+            self.clear_results_cache()
         else:
             raise Exception("ERROR: cannot add measurement to benthic measurements list - measurement must be of type BenthicPhotosynthesisMeasurement")
 
@@ -599,18 +821,31 @@ class Pond(object):
 
 
             self.phytoplankton_photosynthesis_measurements.append(measurement)
+            self.update_phytoplankton_layer_index()
+            self.clear_results_cache()
         else:
             raise Exception("ERROR: cannot add measurement to benthic measurements list - measurement must be of type PhytoPlanktonPhotosynthesisMeasurement")
 
 
     def remove_benthic_measurement(self, measurement=BenthicPhotosynthesisMeasurement):
         self.benthic_photosynthesis_measurements.remove(measurement)
+        self.clear_results_cache()
 
     def update_shape(self, other_pond_shape):
+        '''
+        Adds all depth/area pairs from other_pond_shape to this Pond's shape.
+        Copy on write: the shape may be shared with the other days of the same lake (see DataReader.get_lake_shape), 
+        so this Pond gets an updated copy, and the others keep the shape, and memoized results, they had.
+        To change the shape of every day of a lake at once, update the shared shape object itself.
+        @param other_pond_shape: a BathymetricPondShape. Anything else is ignored.
+        '''
         our_shape = self.get_pond_shape()
         if(isinstance(other_pond_shape, BathymetricPondShape)):
+            if(isinstance(our_shape, BathymetricPondShape)):
+                our_shape = BathymetricPondShape(dict(our_shape.water_surface_areas))
             our_shape.update_shape(other_pond_shape)
             self.pond_shape_object = our_shape
+            self.clear_results_cache()
 
     ############################################
     ############################################
@@ -641,62 +876,84 @@ class Pond(object):
         time_interval = self.get_time_interval()
         length_of_day = self.get_length_of_day()  # TODO: Fee normalized this around zero. Doesn't seem necessary, but might affect the periodic function.
 
-        
-        benthic_primary_production_answer = 0.0  # mg C per day
-        current_depth_interval = 0.0
-        previous_depth = 0.0
-        current_depth = 0.0 
-        total_littoral_area=0.0
-        total_littoral_area = self.calculate_total_littoral_area()
-        total_surface_area = self.get_pond_shape().get_water_surface_area_at_depth(0.0)
-
-        # for each depth interval #TODO: integration over whole lake?
-        while current_depth < self.calculate_photic_zone_lower_bound():
-            bpprz = 0.0  # mg C* m^-2 *day
-
-            # depth interval calculation
-            previous_depth = current_depth
-            current_depth += depth_interval
-            current_depth_interval = current_depth - previous_depth
+        cache_key = ("daily_benthic", depth_interval, time_interval, None, use_littoral_area)
+        cached_result = self.get_cached_result(cache_key)
+        if(cached_result is not None):
+            return cached_result
 
+        profile = self.get_benthic_depth_profile(depth_interval, use_littoral_area)
+        if(len(profile["depths"]) == 0):
+            return self.cache_result(cache_key, 0.0)
 
+        def benthic_rates_at_times(times):
+            return self.calculate_benthic_primary_production_rates_from_profile(profile, times)
 
+        if(self.get_time_integration_method() != self.TIME_INTEGRATION_FIXED_STEP):
+            benthic_primary_production_answer = self.integrate_over_day(benthic_rates_at_times) / self.BASE_TIME_UNIT  # mg C per day
+            return self.cache_result(cache_key, float(benthic_primary_production_answer))
 
-            area = self.get_pond_shape().get_sediment_area_at_depth(current_depth, current_depth_interval)
-
-            try:
-                ik_z = self.get_benthic_ik_at_depth(current_depth)
-                benthic_pmax_z = self.get_benthic_pmax_at_depth(current_depth)
-            except: 
-                raise 
-            
-            if(True == use_littoral_area):
-                f_area = area / total_littoral_area  # TODO: these add up to 1.0, right?
-            else:
-                f_area = area / total_surface_area
+        # for every time interval
+        times_list = []
+        t = 0.0  # start of day
+        while t < length_of_day:
+            times_list.append(t)
+            t += time_interval
 
+        bppr_t = benthic_rates_at_times(times_list)
+        benthic_primary_production_answer = bppr_t.sum() / (self.BASE_TIME_UNIT / time_interval)  # mg C per day. account for the fractional time interval. e.g. dividing by 1/0.25 is equiv to dividing by 4
+        return self.cache_result(cache_key, float(benthic_primary_production_answer))
 
-            # for every time interval
-            t = 0.0  # start of day
-            while t < length_of_day:
-                bpprzt = 0.0
-                izt = self.calculate_light_at_depth_and_time(current_depth, t)
-                bpprzt = self.calculate_benthic_primary_production_z_t(izt, benthic_pmax_z, ik_z)
 
-                bpprz += bpprzt
+    def get_benthic_depth_profile(self, depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS, use_littoral_area=True):
+        '''
+        Get Benthic Depth Profile
+        Everything benthic production needs that depends only on depth: the littoral depth grid, the fractional sediment area 
+        of each depth step, and the pmax/Ik profile interpolated once over the whole grid.
+        @param depth_interval: the depth interval for calculations
+        @param use_littoral_area: normalize by total littoral area if True, by surface area if False.
+        @return: dict with "depths", "weights", "pmax" and "ik" numpy arrays, one value per depth step.
+        @rtype: dict
+        '''
+        shape_of_pond = self.get_pond_shape()
+        photic_zone_lower_bound = self.calculate_photic_zone_lower_bound()
 
-                t += time_interval
-            bpprz = bpprz / (self.BASE_TIME_UNIT / time_interval)  # account for the fractional time interval. e.g. dividing by 1/0.25 is equiv to dividing by 4
-            weighted_bpprz = bpprz * f_area  # normalizing
+        # for each depth interval #TODO: integration over whole lake?
+        # Depth steps are added up one at a time so the grid matches the old depth loop exactly.
+        depths_list = []
+        current_depth = 0.0
+        while current_depth < photic_zone_lower_bound:
+            current_depth += depth_interval
+            depths_list.append(current_depth)
 
+        depths = np.array(depths_list, dtype=float)
+        if(len(depths_list) == 0):
+            return {"depths": depths, "weights": depths, "pmax": depths, "ik": depths}
 
+        areas = shape_of_pond.get_tabulated_sediment_areas_at_depths(depths, depth_interval)  # same grid as the shape's table, so usually just copied from it.
 
+        if(True == use_littoral_area):
+            total_area = self.calculate_total_littoral_area()
+        else:
+            total_area = shape_of_pond.get_water_surface_area_at_depth(0.0)
+        f_areas = areas / total_area  # normalizing. TODO: these add up to 1.0, right?
 
-            benthic_primary_production_answer += weighted_bpprz
-            
-        return benthic_primary_production_answer
+        # the pmax/Ik profile, interpolated once for the whole littoral depth grid.
+        ik_z = self.get_benthic_ik_at_depths(depths)
+        benthic_pmax_z = self.get_benthic_pmax_at_depths(depths)
+        return {"depths": depths, "weights": f_areas, "pmax": benthic_pmax_z, "ik": ik_z}
 
 
+    def calculate_benthic_primary_production_rates_from_profile(self, profile, times):
+        '''
+        Area-weighted benthic primary production rate at each time, summed over the depth profile.
+        @param profile: dict from get_benthic_depth_profile
+        @param times: sequence of times of day, in hours.
+        @return: mg C* m^-2 *hr^-1 at each time
+        @rtype: numpy array
+        '''
+        izt = self.calculate_light_at_depths_and_times(profile["depths"], times)
+        bpprzt = self.calculate_benthic_primary_production_z_t(izt, profile["pmax"][:, np.newaxis], profile["ik"][:, np.newaxis])  # one row per depth, one column per time
+        return np.dot(profile["weights"], bpprzt)
 
 
 
@@ -751,6 +1008,41 @@ class Pond(object):
             
         return ik_at_depth
 
+    def get_benthic_pmax_at_depths(self, depths):
+        '''
+        Get Benthic Pmax At Depths
+        Array version of get_benthic_pmax_at_depth. The measurement profile is interpolated once for every depth.
+        Depths outside the photic zone get zero.
+        @param depths: sequence of depths, in meters.
+        @return: value of pmax at each depth.
+        @rtype: numpy array
+        '''
+        depths = np.asarray(depths, dtype=float)
+        photic_zone_lower_bound = self.calculate_photic_zone_lower_bound()
+        in_zone = (depths >= 0) & (depths <= photic_zone_lower_bound)
+
+        measurements = self.get_benthic_photosynthesis_measurements()
+        depths_list = [measurement_value.get_depth() for measurement_value in measurements]
+        pmax_values_list = [measurement_value.get_pmax() for measurement_value in measurements]
+
+        bpmax_at_depths = np.zeros(depths.shape)
+        if(np.any(in_zone)):
+            bpmax_at_depths[in_zone] = self.interpolate_values_at_depths(depths[in_zone], depths_list, pmax_values_list)
+        return bpmax_at_depths
+
+    def get_benthic_ik_at_depths(self, depths):
+        '''
+        Get Benthic Ik At Depths
+        Array version of get_benthic_ik_at_depth. The measurement profile is interpolated once for every depth.
+        @param depths: sequence of depths, in meters.
+        @return: value of Ik at each depth.
+        @rtype: numpy array
+        '''
+        measurements = self.get_benthic_photosynthesis_measurements()
+        depths_list = [measurement_value.get_depth() for measurement_value in measurements]
+        values_list = [measurement_value.get_ik() for measurement_value in measurements]
+        return self.interpolate_values_at_depths(depths, depths_list, values_list)
+
     def calculate_benthic_primary_production_z_t(self, light_at_time_and_depth, benthic_pmax_z_t, benthic_ik_z_t):
         '''
         Benthic primary production rate at a specific depth and time
@@ -790,7 +1082,10 @@ class Pond(object):
         !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
         '''
 
-        
+        cache_key = ("daily_phytoplankton", depth_interval, self.get_time_interval(), use_photoinhibition, None)
+        cached_result = self.get_cached_result(cache_key)
+        if(cached_result is not None):
+            return cached_result
 
         layer_depths = self.get_thermal_layer_depths()
         layer_upper_bound = 0.0
@@ -808,7 +1103,7 @@ class Pond(object):
             
          
         pp_lake_daily_total_m2 = sum(layer_pp_list)
-        return pp_lake_daily_total_m2  # mgC/m^2/day
+        return self.cache_result(cache_key, pp_lake_daily_total_m2)  # mgC/m^2/day
 
     def calculate_hourly_phytoplankton_primary_production_rates_list_over_whole_day_in_thermal_layer(self, 
                                                                                                      layer = 0, 
@@ -827,6 +1122,11 @@ class Pond(object):
         MIN_INDEX  = 0
         
         validated_layer=self.validate_numerical_value(layer, MAX_INDEX, MIN_INDEX) #0=epilimnion, 1=metalimnion, 2 = hypolimnion
+        cache_key = ("hourly_phytoplankton_in_layer", depth_interval, self.get_time_interval(), use_photoinhibition, None, validated_layer, convert_to_m2)
+        cached_result = self.get_cached_result(cache_key)
+        if(cached_result is not None):
+            return list(cached_result)  # a copy, so callers can't change the memoized list.
+
         layer_depths = self.get_thermal_layer_depths()
 
         
@@ -840,6 +1140,7 @@ class Pond(object):
             layer_upper_bound=layer_depths[validated_layer-1]
         layer_lower_bound = layer_depths[validated_layer]
         pp_list = self.calculate_hourly_phytoplankton_primary_production_rates_list_over_whole_day_in_interval(layer_upper_bound, layer_lower_bound, depth_interval, use_photoinhibition, convert_to_m2)
+        self.cache_result(cache_key, list(pp_list))
         return pp_list
         
         
@@ -869,61 +1170,124 @@ class Pond(object):
         @param convert_to_m2: whether or not to convert the resulting values to (per meter squared) instead of (per meter cubed) 
         @return: list of hourly rates, over the course of a day. Length should be (length of day)/(time_interval)
         '''
-        if (use_photoinhibition is None):          
-            beta_parameter =self.get_phyto_beta_at_depth(interval_lower_bound)   
+        if (use_photoinhibition is None):
+            beta_parameter =self.get_phyto_beta_at_depth(interval_lower_bound)
             if(0==beta_parameter):
                 use_photoinhibition = False
-            else: 
+            else:
                 use_photoinhibition = True
-      
+
 
         # TODO: validate interval
         time_interval = self.get_time_interval()  # hours
-        length_of_day = self.get_length_of_day()
-          
-        max_depth = self.get_pond_shape().get_max_depth()
-        total_volume = self.get_pond_shape().get_volume_above_depth(max_depth, depth_interval)
-        layer_depth_interval = interval_lower_bound - interval_upper_bound  # "deeper" is bigger magnitude, so instead of upper-lower we do lower - upper 
+        layer_depth_interval = interval_lower_bound - interval_upper_bound  # "deeper" is bigger magnitude, so instead of upper-lower we do lower - upper
 
-        hourly_pp_list = []
-        current_time = 0.0  # start of day
-#         pp_layer_daily_total_hw_m3 = 0.0
-        
-        while current_time <= length_of_day:
-            
-            
-            depth_m = interval_upper_bound #meters from surface.
-            pp_total_in_thermal_layer_at_time_t_hw_m3 = 0.0 #primary production in layer, mg C/ m^3 / hour, or mgC*m^-3*hr-1
-            
-            while depth_m <= interval_lower_bound:
-                
-                light_at_depth_z_time_t = self.calculate_light_at_depth_and_time(depth_m, current_time)  # umol*m^-2*s^-1
-                interval_volume_m3 = self.get_pond_shape().get_volume_at_depth(depth_m, depth_interval)  # m^3
-                fractional_volume = interval_volume_m3 / total_volume
-                pp_rate_at_depth_z_time_t_m3 = self.calculate_phytoplankton_primary_productivity(light_at_depth_z_time_t, depth_m, use_photoinhibition)  # mgC*m^-3*hr^-1, or mgC per meter cubed per hour
-                pp_total_at_depth_z_time_t_m3_in_one_time_unit = pp_rate_at_depth_z_time_t_m3 * self.BASE_TIME_UNIT  # mgC*m^-3*hr^-1 * 1 hour = mgC*m^-3. This line usually multiplies by 1, changing nothing.
-                pp_total_at_depth_z_time_t_hw_m3 = pp_total_at_depth_z_time_t_m3_in_one_time_unit * fractional_volume  # mgC*m^-3, hypsometrically weighted
-                pp_total_in_thermal_layer_at_time_t_hw_m3 += pp_total_at_depth_z_time_t_hw_m3 #mgC*m^-3 #THIS IS WHAT I CHECKED TO TEST AGAINST NTL LTER DATABASE                                
-                depth_m += depth_interval
-                    
-                    
-            
+        #same times the old nested loops visited. Only times landing on the time interval were kept, so we keep doing that.
+        times = np.array(self.get_list_of_times())
+        times = times[np.mod(times, time_interval) == 0]
 
-            if(current_time%time_interval==0):
-                hourly_pp_list.append(pp_total_in_thermal_layer_at_time_t_hw_m3)
-#             pp_layer_daily_total_hw_m3 += pp_total_in_thermal_layer_at_time_t_hw_m3   #Units are still mgC*m^-3               
-            
+        hourly_pp_array = self.calculate_phytoplankton_primary_production_rates_at_times_in_interval(interval_upper_bound,
+                                                                                                     interval_lower_bound,
+                                                                                                     times,
+                                                                                                     depth_interval,
+                                                                                                     use_photoinhibition)  # mgC*m^-3, hypsometrically weighted
+        hourly_pp_list = hourly_pp_array.tolist()
 
-
-            current_time += time_interval
-        
-        
-        
-#       
         if(convert_to_m2):
             hourly_pp_list = [value*layer_depth_interval for value in hourly_pp_list] #multiply by the depth interval of the layer to convert to m2
-                
+
         return hourly_pp_list  # mgC/m^2/day
+
+
+    def calculate_phytoplankton_primary_production_rates_at_times_in_interval(self,
+                                                                              interval_upper_bound,
+                                                                              interval_lower_bound,
+                                                                              times,
+                                                                              depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS,
+                                                                              use_photoinhibition=True):
+        '''
+        Array version of the depth loop in calculate_hourly_phytoplankton_primary_production_rates_list_over_whole_day_in_interval.
+        Builds the whole depth x time light matrix at once, evaluates the P-I curve over it,
+        and sums each column using the fractional volume of every depth step.
+        @param interval_upper_bound: depth in meters
+        @param interval_lower_bound: depth in meters
+        @param times: sequence of times of day, in hours.
+        @param depth_interval: the depth interval for calculations
+        @param use_photoinhibition: whether or not to use the photoinhibition equation.
+        @return: hypsometrically weighted primary production rate at each time, mgC*m^-3*hr^-1
+        @rtype: numpy array
+        '''
+        profile = self.get_phytoplankton_depth_profile_in_interval(interval_upper_bound, interval_lower_bound, depth_interval)
+        return self.calculate_phytoplankton_primary_production_rates_from_profile(profile, times, use_photoinhibition)
+
+
+    def get_phytoplankton_depth_profile_in_interval(self,
+                                                    interval_upper_bound,
+                                                    interval_lower_bound,
+                                                    depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS):
+        '''
+        Everything phytoplankton production in an interval needs that depends only on depth: the depth grid, the weight 
+        (fractional volume) of each depth step and the P-I parameters of its thermal layer.
+        Depths with no thermal layer below them get a pmax of zero, so they produce nothing.
+        @param interval_upper_bound: depth in meters
+        @param interval_lower_bound: depth in meters
+        @param depth_interval: the depth interval for calculations
+        @return: dict with "depths", "weights", "pmax", "alpha" and "beta" numpy arrays, one value per depth step.
+        @rtype: dict
+        '''
+        depths = self.get_array_of_depths_in_interval(interval_upper_bound, interval_lower_bound, depth_interval)
+        fractional_volumes = self.calculate_fractional_volumes_at_depths(depths, depth_interval)
+        phyto_pmax, phyto_alpha, phyto_beta = self.get_phyto_layer_parameters_at_depths(depths)
+
+        # mgC*m^-3*hr^-1 * 1 hour = mgC*m^-3. Usually multiplies by 1, changing nothing.
+        weights = fractional_volumes * self.BASE_TIME_UNIT
+        return {"depths": depths, "weights": weights, "pmax": phyto_pmax, "alpha": phyto_alpha, "beta": phyto_beta}
+
+
+    def calculate_phytoplankton_primary_production_rates_from_profile(self, profile, times, use_photoinhibition=True):
+        '''
+        Hypsometrically weighted phytoplankton primary production at each time, summed over a depth profile.
+        @param profile: dict from get_phytoplankton_depth_profile_in_interval
+        @param times: sequence of times of day, in hours.
+        @param use_photoinhibition: whether or not to use the photoinhibition equation.
+        @return: mgC*m^-3*hr^-1 at each time
+        @rtype: numpy array
+        '''
+        light_matrix = self.calculate_light_at_depths_and_times(profile["depths"], times)  # umol*m^-2*s^-1
+        ppr_matrix = self.calculate_phytoplankton_primary_productivity_with_parameters(light_matrix,
+                                                                                      profile["pmax"],
+                                                                                      profile["alpha"],
+                                                                                      profile["beta"],
+                                                                                      use_photoinhibition)  # mgC*m^-3*hr^-1
+        return np.dot(profile["weights"], ppr_matrix)
+
+
+    def get_array_of_depths_in_interval(self, interval_upper_bound, interval_lower_bound, depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS):
+        '''
+        Depths used for calculations in an interval, from interval_upper_bound down to interval_lower_bound inclusive.
+        Steps are added up one at a time, the same way the calculation loops always did, so the values match exactly.
+        @param interval_upper_bound: depth in meters
+        @param interval_lower_bound: depth in meters
+        @param depth_interval: the depth interval for calculations
+        @rtype: numpy array
+        '''
+        depths = []
+        depth_m = interval_upper_bound
+        while depth_m <= interval_lower_bound:
+            depths.append(depth_m)
+            depth_m += depth_interval
+        return np.array(depths, dtype=float)
+
+
+    def calculate_fractional_volumes_at_depths(self, depths, depth_interval=DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS):
+        '''
+        Volume of each depth interval, as a fraction of the whole lake volume.
+        @param depths: sequence of depths in meters
+        @param depth_interval: the depth interval for calculations
+        @rtype: numpy array
+        '''
+        shape_of_pond = self.get_pond_shape()
+        return shape_of_pond.get_fractional_volumes_at_depths(depths, depth_interval)  # precomputed per lake, on the standard grid.
         
 
 
@@ -956,6 +1320,13 @@ class Pond(object):
 
         
         
+        if(self.get_time_integration_method() != self.TIME_INTEGRATION_FIXED_STEP):
+            profile = self.get_phytoplankton_depth_profile_in_interval(interval_upper_bound, interval_lower_bound, depth_interval)
+            def phytoplankton_rates_at_times(times):
+                return self.calculate_phytoplankton_primary_production_rates_from_profile(profile, times, use_photoinhibition)
+            pp_layer_daily_total_hw_m3 = self.integrate_over_day(phytoplankton_rates_at_times) / self.BASE_TIME_UNIT
+            return pp_layer_daily_total_hw_m3 * layer_depth_interval  # mgC/m^2/day
+
         #We have "per hour" calculated multiple times per hour. We must correct for this in our summation.
         time_interval = self.get_time_interval()  # hours        
         time_interval_correction_factor = (self.BASE_TIME_UNIT / time_interval)  # (hr/hr) Account for the fractional time interval. e.g. dividing by 1/0.25 is equiv to dividing by 4
@@ -985,9 +1356,9 @@ class Pond(object):
         '''
         validated_depth = self.validate_depth(depth)
         pmax = 0.0
-        measurement = self.get_phytoplankton_photosynthesis_measurement_at_depth(validated_depth)
-        if(measurement is not None):
-            pmax = measurement.get_pmax()
+        layer_index = self.get_phytoplankton_layer_index_at_depth(validated_depth)
+        if(layer_index is not None):
+            pmax = self.__phyto_layer_pmax[layer_index]
         return pmax
 
     def get_phyto_alpha_at_depth(self, depth):
@@ -998,9 +1369,9 @@ class Pond(object):
         '''
         validated_depth = self.validate_depth(depth)
         phyto_alpha = 0.0  # TODO: safer value?
-        measurement = self.get_phytoplankton_photosynthesis_measurement_at_depth(validated_depth)
-        if(measurement is not None):
-            phyto_alpha = measurement.get_phyto_alpha()
+        layer_index = self.get_phytoplankton_layer_index_at_depth(validated_depth)
+        if(layer_index is not None):
+            phyto_alpha = self.__phyto_layer_alpha[layer_index]
         return phyto_alpha
 
     def get_phyto_beta_at_depth(self, depth):
@@ -1010,17 +1381,35 @@ class Pond(object):
         @rtype:
         '''
         validated_depth = self.validate_depth(depth)
-   
+
         phyto_beta = 0.0  # TODO: safer value?
-        measurement = self.get_phytoplankton_photosynthesis_measurement_at_depth(validated_depth)
-        if(measurement is not None):
-            phyto_beta = measurement.get_phyto_beta()
-            
-        
-            
+        layer_index = self.get_phytoplankton_layer_index_at_depth(validated_depth)
+        if(layer_index is not None):
+            phyto_beta = self.__phyto_layer_beta[layer_index]
+
         return phyto_beta
 
 
+    def get_phyto_layer_parameters_at_depths(self, depths):
+        '''
+        Batch form of get_phyto_pmax_at_depth, get_phyto_alpha_at_depth and get_phyto_beta_at_depth.
+        Maps a whole depth vector to the parameters of its thermal layer with one searchsorted.
+        Depths are validated the same way. Depths with no layer below them get zeros.
+        @param depths: sequence of depths, meters from surface
+        @return: pmax, alpha and beta arrays, one value per depth.
+        @rtype: tuple of numpy arrays
+        '''
+        validated_depths = np.clip(np.asarray(depths, dtype=float), 0.0, self.get_max_depth())
+        layer_indices = self.get_phytoplankton_layer_indices_at_depths(validated_depths)
+        has_layer = layer_indices < len(self.__phyto_layer_depths)
+
+        #pad with a zero "layer" so depths below the deepest layer pick up zeros.
+        phyto_pmax = np.append(self.__phyto_layer_pmax, 0.0)[layer_indices]
+        phyto_alpha = np.append(self.__phyto_layer_alpha, 0.0)[layer_indices]
+        phyto_beta = np.append(self.__phyto_layer_beta, 0.0)[layer_indices]
+        return phyto_pmax * has_layer, phyto_alpha * has_layer, phyto_beta * has_layer
+
+
 
     def calculate_phytoplankton_primary_productivity(self, izt, depth, use_photoinhibition=True):
         '''
@@ -1030,14 +1419,13 @@ class Pond(object):
         @return ppr_z (mg*m^-3*hr^-1)
         '''
         ppr_z = 0.0
-        
-        phyto_photo_measurement_z = self.get_phytoplankton_photosynthesis_measurement_at_depth(depth)
-        if(phyto_photo_measurement_z is not None):
 
+        layer_index = self.get_phytoplankton_layer_index_at_depth(self.validate_depth(depth))
+        if(layer_index is not None):
 
-            phyto_pmax = self.get_phyto_pmax_at_depth(depth)  # mg C per m^3 per hour (mg*m^-3*hr^-1)
-            phyto_alpha = self.get_phyto_alpha_at_depth(depth)  # (mg*m^-3*hr^-1)/(umol*m^-2*s^-1)
-            phyto_beta = self.get_phyto_beta_at_depth(depth)  # (mg*m^-3*hr^-1)/(umol*m^-2*s^-1)
+            phyto_pmax = self.__phyto_layer_pmax[layer_index]  # mg C per m^3 per hour (mg*m^-3*hr^-1)
+            phyto_alpha = self.__phyto_layer_alpha[layer_index]  # (mg*m^-3*hr^-1)/(umol*m^-2*s^-1)
+            phyto_beta = self.__phyto_layer_beta[layer_index]  # (mg*m^-3*hr^-1)/(umol*m^-2*s^-1)
 
             if(use_photoinhibition):
                 # P-I CURVE EQUATION WITH PHOTOINHIBITION  P = Pmax*(1-exp(-alpha*I/Pmax))*exp(-beta*I/Pmax)
@@ -1056,6 +1444,48 @@ class Pond(object):
         return ppr_z  # (mg*m^-3*hr^-1)
 
 
+    def calculate_phytoplankton_primary_productivity_array(self, light_matrix, depths, use_photoinhibition=True):
+        '''
+        Calculate Phytoplankton Primary Productivity, for a whole depth x time grid at once.
+        Same P-I curve equations as calculate_phytoplankton_primary_productivity.
+        @param light_matrix: light (umol*m^-2*s^-1), one row per depth, one column per time.
+        @param depths: depths (m) of the rows of light_matrix
+        @return ppr matrix, same shape as light_matrix (mg*m^-3*hr^-1)
+        @rtype: numpy array
+        '''
+        phyto_pmax, phyto_alpha, phyto_beta = self.get_phyto_layer_parameters_at_depths(depths)
+        return self.calculate_phytoplankton_primary_productivity_with_parameters(light_matrix, phyto_pmax, phyto_alpha, phyto_beta, use_photoinhibition)
+
+
+    def calculate_phytoplankton_primary_productivity_with_parameters(self, light_matrix, phyto_pmax, phyto_alpha, phyto_beta, use_photoinhibition=True):
+        '''
+        The P-I curve equations of calculate_phytoplankton_primary_productivity, for a depth x time grid of light 
+        and one set of parameters per depth.
+        @param light_matrix: light (umol*m^-2*s^-1), one row per depth, one column per time.
+        @param phyto_pmax: pmax for each row. Rows with zero pmax produce nothing.
+        @param phyto_alpha: alpha for each row
+        @param phyto_beta: beta for each row
+        @return ppr matrix, same shape as light_matrix (mg*m^-3*hr^-1)
+        @rtype: numpy array
+        '''
+        light_matrix = np.asarray(light_matrix, dtype=float)
+        phyto_pmax = np.asarray(phyto_pmax, dtype=float)[:, np.newaxis]  # mg C per m^3 per hour (mg*m^-3*hr^-1)
+        phyto_alpha = np.asarray(phyto_alpha, dtype=float)[:, np.newaxis]  # (mg*m^-3*hr^-1)/(umol*m^-2*s^-1)
+        phyto_beta = np.asarray(phyto_beta, dtype=float)[:, np.newaxis]  # (mg*m^-3*hr^-1)/(umol*m^-2*s^-1)
+
+        #depths with no layer below them, or no pmax, make nothing. Silence the divide-by-zero there and zero them afterwards.
+        productive = (phyto_pmax > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if(use_photoinhibition):
+                # P = Pmax*(1-exp(-alpha*I/Pmax))*exp(-beta*I/Pmax), see calculate_phytoplankton_primary_productivity
+                ppr_matrix = phyto_pmax * (1 - np.exp(-phyto_alpha * light_matrix / phyto_pmax)) * np.exp(-phyto_beta * light_matrix / phyto_pmax)
+            else:
+                # P = Pmax* tanh(alpha*I/Pmax)
+                ppr_matrix = phyto_pmax * np.tanh(phyto_alpha * light_matrix / phyto_pmax)
+
+        return np.where(productive, ppr_matrix, 0.0)  # (mg*m^-3*hr^-1)
+
+
 
     def get_phytoplankton_photosynthesis_measurement_at_depth(self, depth):
         '''
@@ -1066,24 +1496,55 @@ class Pond(object):
         # find the shallowest layer_measurement that's deeper than this depth.
         # example: layers are at 5, 10, 15. Depth given is 5.5, then use measurement for second layer.
         measurement = None
-        reverse_sorted_measurements = self.get_phyto_measurements_sorted_by_depth(True)  # sort reversed by depth.
-        for layer_measurement in reverse_sorted_measurements:
-            if (layer_measurement.get_depth() >= depth):                 
-                measurement = layer_measurement
+        layer_index = self.get_phytoplankton_layer_index_at_depth(depth)
+        if(layer_index is not None):
+            measurement = self.__phyto_layer_measurements[layer_index]
         return measurement
 
 
+    def get_phytoplankton_layer_index_at_depth(self, depth):
+        '''
+        Position, in the thermal layer index, of the shallowest layer deeper than (or at) the specified depth.
+        @param depth: meters from surface
+        @return: index into the layer arrays, or None if no layer is that deep.
+        @rtype: int
+        '''
+        layer_index = int(np.searchsorted(self.__phyto_layer_depths, depth, side='left'))
+        if(layer_index >= len(self.__phyto_layer_depths)):
+            return None
+        return layer_index
+
+
+    def get_phytoplankton_layer_indices_at_depths(self, depths):
+        '''
+        Batch form of get_phytoplankton_layer_index_at_depth.
+        @param depths: sequence of depths, meters from surface
+        @return: index into the layer arrays for each depth. Depths deeper than every layer get the number of layers.
+        @rtype: numpy array
+        '''
+        return np.searchsorted(self.__phyto_layer_depths, np.asarray(depths, dtype=float), side='left')
+
+
+    def update_phytoplankton_layer_index(self):
+        '''
+        Rebuilds the thermal layer index: layer lower bounds sorted shallowest to deepest, plus pmax/alpha/beta arrays in the same order.
+        Called whenever the phytoplankton measurements change, so lookups never have to sort.
+        '''
+        sorted_measurements = self.get_phyto_measurements_sorted_by_depth(False)
+        self.__phyto_layer_measurements = sorted_measurements
+        self.__phyto_layer_depths = np.array([measurement.get_depth() for measurement in sorted_measurements], dtype=float)
+        self.__phyto_layer_pmax = np.array([measurement.get_pmax() for measurement in sorted_measurements], dtype=float)
+        self.__phyto_layer_alpha = np.array([measurement.get_phyto_alpha() for measurement in sorted_measurements], dtype=float)
+        self.__phyto_layer_beta = np.array([measurement.get_phyto_beta() for measurement in sorted_measurements], dtype=float)
+
+
     def get_thermal_layer_depths(self):
         '''
-        Sorts and returns the depths of the thermal layers. 
+        Returns the depths of the thermal layers, from the thermal layer index.
         @return: sorted list of thermal layer depths, from shallowest to deepest.
         @rtype: [] list 
         '''
-        layer_depth_list = []
-        reverse_sorted_measurements = self.get_phyto_measurements_sorted_by_depth(False)  # sort reversed by depth.
-        for layer_measurement in reverse_sorted_measurements:
-            layer_depth_list.append(layer_measurement.get_depth())
-        return layer_depth_list
+        return self.__phyto_layer_depths.tolist()
             
 
     def get_phyto_measurements_sorted_by_depth(self, reverse=False):
@@ -1127,11 +1588,16 @@ class Pond(object):
         @return: lower bound of the photic zone, in meters.
         @rtype: float
         '''
+        cache_key = ("photic_zone_lower_bound",)
+        cached_result = self.get_cached_result(cache_key)
+        if(cached_result is not None):
+            return cached_result
+
         lower_bound = self.calculate_depth_of_specific_light_percentage(self.PHOTIC_ZONE_LIGHT_PENETRATION_LEVEL_LOWER_BOUND)
         max_depth = self.get_max_depth()
         if(lower_bound > max_depth):
             lower_bound = max_depth
-        return lower_bound
+        return self.cache_result(cache_key, lower_bound)
 
 
 
@@ -1210,12 +1676,146 @@ class Pond(object):
         validated_time = self.validate_time(time)
         noonlight = self.get_noon_surface_light()
         length_of_day = self.get_length_of_day()
+        if(length_of_day <= 0):
+            return 0.0 #the sun never comes up, so no light at all.
         surface_light_at_t = noonlight * np.sin(np.pi * validated_time / length_of_day)
         light_attenuation_coefficient = self.get_light_attenuation_coefficient()
         light_at_z_and_t = surface_light_at_t * np.exp(-light_attenuation_coefficient * validated_depth)
         return light_at_z_and_t
 
 
+    def calculate_light_at_depths_and_times(self, depths, times):
+        '''
+        Calculate Light At Depths And Times
+        Array version of calculate_light_at_depth_and_time. Depths and times are validated the same way, 
+        and a length of day of zero gives zero light, as it does there.
+        @param depths: sequence of depths, in meters
+        @param times: sequence of times of day, in hours
+        @return: the light at every depth and time, in micromoles/m^2/sec. One row per depth, one column per time.
+        @rtype: numpy array
+        '''
+        validated_depths = np.clip(np.asarray(depths, dtype=float), 0.0, self.get_max_depth())
+        length_of_day = self.get_length_of_day()
+        if(length_of_day <= 0):
+            return np.zeros((len(validated_depths), len(times))) #the sun never comes up, so no light at all.
+        validated_times = np.clip(np.asarray(times, dtype=float), Pond.MINIMUM_LENGTH_OF_DAY, length_of_day)
+        noonlight = self.get_noon_surface_light()
+        surface_light_at_t = noonlight * np.sin(np.pi * validated_times / length_of_day)
+        light_attenuation_coefficient = self.get_light_attenuation_coefficient()
+        proportion_at_z = np.exp(-light_attenuation_coefficient * validated_depths)
+        light_at_z_and_t = np.outer(proportion_at_z, surface_light_at_t)
+        return light_at_z_and_t
+
+
+
+    def integrate_over_day(self, rate_function):
+        '''
+        Integrate Over Day
+        Integrates a rate over the whole day, from time 0 to the length of day, using the time integration method of this pond.
+        Only used for gauss_legendre and adaptive_simpson. fixed_step sums are done by the callers, as they always were.
+        @param rate_function: takes an array of times of day (hours), returns an array of rates, one per time.
+        @return: integral of rate_function over the day, in (rate units)*hours
+        @rtype: float
+        '''
+        length_of_day = self.get_length_of_day()
+        if(length_of_day <= 0):
+            return 0.0
+
+        method = self.get_time_integration_method()
+        tolerance = self.get_time_integration_tolerance()
+        if(method == self.TIME_INTEGRATION_GAUSS_LEGENDRE):
+            return self.integrate_gauss_legendre(rate_function, 0.0, length_of_day, tolerance)
+        elif(method == self.TIME_INTEGRATION_ADAPTIVE_SIMPSON):
+            return self.integrate_adaptive_simpson(rate_function, 0.0, length_of_day, tolerance)
+        else:
+            raise Exception("integrate_over_day does not handle time integration method ", method)
+
+
+    def integrate_gauss_legendre(self, rate_function, start, end, tolerance=DEFAULT_TIME_INTEGRATION_TOLERANCE):
+        '''
+        Gauss-Legendre quadrature. Doubles the number of nodes, starting from MINIMUM_GAUSS_LEGENDRE_NODES, 
+        until two estimates agree to within tolerance (relative), or MAXIMUM_GAUSS_LEGENDRE_NODES is reached.
+        The light curve is smooth over the day, so this usually stops at 8 or 16 nodes.
+        @param rate_function: takes an array of times, returns an array of rates.
+        @param start: start of the integration interval
+        @param end: end of the integration interval
+        @param tolerance: relative error allowed
+        @rtype: float
+        '''
+        half_width = (end - start) / 2.0
+        midpoint = (end + start) / 2.0
+
+        number_of_nodes = self.MINIMUM_GAUSS_LEGENDRE_NODES
+        nodes, weights = np.polynomial.legendre.leggauss(number_of_nodes)
+        estimate = half_width * np.dot(weights, rate_function(half_width * nodes + midpoint))
+        while number_of_nodes < self.MAXIMUM_GAUSS_LEGENDRE_NODES:
+            number_of_nodes *= 2
+            nodes, weights = np.polynomial.legendre.leggauss(number_of_nodes)
+            new_estimate = half_width * np.dot(weights, rate_function(half_width * nodes + midpoint))
+            converged = abs(new_estimate - estimate) <= tolerance * abs(new_estimate)
+            estimate = new_estimate
+            if(converged):
+                break
+        return float(estimate)
+
+
+    def integrate_adaptive_simpson(self, rate_function, start, end, tolerance=DEFAULT_TIME_INTEGRATION_TOLERANCE):
+        '''
+        Adaptive Simpson's rule. Every interval not yet within its share of the tolerance is split in two,
+        and all the new points of one level are evaluated with a single call to rate_function.
+        Tolerance is relative to the first (three-point) estimate of the whole integral.
+        Stops refining after MAXIMUM_ADAPTIVE_SIMPSON_LEVELS levels, or once the next level would take the total number 
+        of evaluations past MAXIMUM_ADAPTIVE_SIMPSON_EVALUATIONS, and uses the best estimate so far for what's left.
+        @param rate_function: takes an array of times, returns an array of rates.
+        @param start: start of the integration interval
+        @param end: end of the integration interval
+        @param tolerance: relative error allowed
+        @rtype: float
+        '''
+        first_values = rate_function(np.array([start, (start + end) / 2.0, end]))
+        whole = (end - start) / 6.0 * (first_values[0] + 4 * first_values[1] + first_values[2])
+        absolute_tolerance = tolerance * abs(whole)
+
+        # one entry per interval still being refined.
+        lefts = np.array([start])
+        rights = np.array([end])
+        left_values = first_values[0:1]
+        middle_values = first_values[1:2]
+        right_values = first_values[2:3]
+        wholes = np.array([whole])
+        tolerances = np.array([absolute_tolerance])
+
+        total = 0.0
+        level = 0
+        evaluations = len(first_values)
+        while len(lefts) > 0:
+            middles = (lefts + rights) / 2.0
+            new_values = rate_function(np.concatenate(((lefts + middles) / 2.0, (middles + rights) / 2.0)))
+            left_middle_values = new_values[:len(lefts)]
+            right_middle_values = new_values[len(lefts):]
+
+            left_halves = (middles - lefts) / 6.0 * (left_values + 4 * left_middle_values + middle_values)
+            right_halves = (rights - middles) / 6.0 * (middle_values + 4 * right_middle_values + right_values)
+            differences = left_halves + right_halves - wholes
+
+            level += 1
+            evaluations += len(new_values)
+            done = np.abs(differences) <= 15 * tolerances
+            next_evaluations = 4 * np.count_nonzero(~done) #each interval refined becomes two, and each of those needs two new points.
+            if(level >= self.MAXIMUM_ADAPTIVE_SIMPSON_LEVELS or evaluations + next_evaluations > self.MAXIMUM_ADAPTIVE_SIMPSON_EVALUATIONS):
+                done[:] = True
+            # Richardson extrapolation, as usual for adaptive Simpson.
+            total += np.sum(left_halves[done] + right_halves[done] + differences[done] / 15.0)
+
+            refine = ~done
+            lefts, rights = np.concatenate((lefts[refine], middles[refine])), np.concatenate((middles[refine], rights[refine]))
+            left_values, right_values = np.concatenate((left_values[refine], middle_values[refine])), np.concatenate((middle_values[refine], right_values[refine]))
+            middle_values = np.concatenate((left_middle_values[refine], right_middle_values[refine]))
+            wholes = np.concatenate((left_halves[refine], right_halves[refine]))
+            tolerances = np.concatenate((tolerances[refine], tolerances[refine])) / 2.0
+        return float(total)
+
+
 
     def calculate_total_littoral_area(self):
         '''
@@ -1224,18 +1824,28 @@ class Pond(object):
         @return:
         @rtype:
         '''
+        cache_key = ("total_littoral_area",)
+        cached_result = self.get_cached_result(cache_key)
+        if(cached_result is not None):
+            return cached_result
+
         z1percent = self.calculate_photic_zone_lower_bound()
         shape_of_pond = self.get_pond_shape()
 
         littoral_area = shape_of_pond.get_sediment_area_above_depth(z1percent, Pond.DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS)
-        return littoral_area
+        return self.cache_result(cache_key, littoral_area)
 
     def calculate_total_photic_volume(self):
+        cache_key = ("total_photic_volume",)
+        cached_result = self.get_cached_result(cache_key)
+        if(cached_result is not None):
+            return cached_result
+
         z1percent = self.calculate_photic_zone_lower_bound()
         shape_of_pond = self.get_pond_shape()
 
         photic_volume = shape_of_pond.get_volume_above_depth(z1percent, Pond.DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS)
-        return photic_volume
+        return self.cache_result(cache_key, photic_volume)
 
 
     def interpolate_values_at_depth(self, depth, depths_list=[], values_list=[]):
@@ -1294,6 +1904,30 @@ class Pond(object):
         return value_at_depth
 
 
+    def interpolate_values_at_depths(self, depths, depths_list=[], values_list=[]):
+        '''
+        INTERPOLATE VALUES AT DEPTHS
+        Array version of interpolate_values_at_depth. Builds one interpolation function and evaluates it at every depth.
+        Depths are clipped the same way, so values outside the data raise the same errors.
+        @param depths: sequence of depths to interpolate at.
+        @param depths_list: list of depths where we have data.
+        @param values_list: corresponding data that goes with the depths.
+        @return: the values calculated for the specified depths.
+        @rtype: numpy array
+        '''
+        if(len(depths_list)<2):
+            error_message = 'Cannot interpolate at depths ', depths,', because there are not enough data points!'
+            error_message = str(error_message)
+            print error_message
+            raise Exception(error_message)
+
+        validated_depths = np.clip(np.asarray(depths, dtype=float), 0.0, self.get_max_depth())
+        validated_depths = np.minimum(validated_depths, max(depths_list))
+
+        f = interp1d(depths_list, values_list)
+        return f(validated_depths)
+
+
 
 
 
@@ -0,0 +1,383 @@
+'''
+Created on Oct 17, 2026
+
+Calculates primary production for a whole list of Ponds at once.
+
+Everything that depends only on depth (depth grids, hypsometric weights, P-I parameters) is still worked out
+by each Pond. Everything else (kd, noon light, length of day, and those depth profiles) is stacked into arrays,
+and light and production are evaluated over a (pond x depth x time) grid in one broadcasted pass.
+Ponds are processed in chunks so the grid never grows past max_chunk_elements.
+
+@author: cdleong
+'''
+import numpy as np
+from pond import Pond
+
+
+class PondBatchCalculator(object):
+    '''
+    Batch version of the daily/hourly production methods in Pond.
+
+    Results match calculate_daily_whole_lake_benthic_primary_production_m2,
+    calculate_daily_whole_lake_phytoplankton_primary_production_m2, calculate_phytoplankton_primary_production_rate_in_interval
+    and calculate_hourly_phytoplankton_primary_production_rates_list_over_whole_day_in_thermal_layer for every pond.
+    The grid always uses fixed time steps. Daily totals for ponds set to another time integration method come from the Pond itself.
+    '''
+
+    #CONSTANTS
+    DEFAULT_MAX_CHUNK_ELEMENTS = 2000000  # pond x depth x time values per chunk. About 16 MB per float array.
+    DEFAULT_PONDS_PER_BATCH = 256  # for iterate_results()
+
+
+    def __init__(self,
+                 depth_interval=Pond.DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS,
+                 use_photoinhibition=None,
+                 use_littoral_area=True,
+                 max_chunk_elements=DEFAULT_MAX_CHUNK_ELEMENTS):
+        '''
+        Constructor
+        @param depth_interval: the depth interval for calculations, in meters.
+        @param use_photoinhibition: whether or not to use the photoinhibition equation. None decides per layer, like Pond does.
+        @param use_littoral_area: normalize benthic production by littoral area (True) or surface area (False).
+        @param max_chunk_elements: upper limit on the size of the (pond x depth x time) grid evaluated at once.
+        '''
+        self.depth_interval = depth_interval
+        self.use_photoinhibition = use_photoinhibition
+        self.use_littoral_area = use_littoral_area
+        self.max_chunk_elements = max_chunk_elements
+
+
+    def get_result_dtype(self, number_of_times):
+        '''
+        @param number_of_times: length of the longest hourly series.
+        @return: dtype of the structured array returned by calculate().
+        @rtype: numpy dtype
+        '''
+        max_layers = Pond.MAXIMUM_NUMBER_OF_THERMAL_LAYERS
+        return np.dtype([("key", object),
+                         ("year", int),
+                         ("lake_id", object),
+                         ("day_of_year", int),
+                         ("daily_benthic", float),  # mg C/m^2 littoral (or surface) area/day
+                         ("daily_phytoplankton", float),  # mg C/m^2/day
+                         ("number_of_layers", int),
+                         ("layer_daily", float, (max_layers,)),  # mg C/m^2/day, per thermal layer. NaN past number_of_layers.
+                         ("number_of_times", int),
+                         ("times", float, (number_of_times,)),  # hours. NaN past number_of_times.
+                         ("layer_hourly", float, (max_layers, number_of_times))])  # mgC*m^-3*hr^-1, per thermal layer. NaN past number_of_layers/number_of_times.
+
+
+    def calculate(self, pond_list=[]):
+        '''
+        Calculate
+        Daily benthic, daily phytoplankton, per-layer daily and per-layer hourly results for every pond.
+        @param pond_list: list of Pond objects, e.g. from DataReader.
+        @return: one record per pond, in the same order as pond_list. See get_result_dtype() for the fields.
+        @rtype: numpy structured array
+        '''
+        pond_list = list(pond_list)
+        benthic_inputs = [self.get_benthic_inputs(pond) for pond in pond_list]
+        phyto_inputs = [self.get_phytoplankton_inputs(pond) for pond in pond_list]
+
+        number_of_times = max([len(inputs["times"]) for inputs in phyto_inputs] + [0])
+        results = np.zeros(len(pond_list), dtype=self.get_result_dtype(number_of_times))
+        results["layer_daily"] = np.nan
+        results["times"] = np.nan
+        results["layer_hourly"] = np.nan
+
+        for chunk in self.get_chunks(benthic_inputs):
+            results["daily_benthic"][chunk] = self.calculate_benthic_chunk([benthic_inputs[i] for i in chunk])
+        for chunk in self.get_chunks(phyto_inputs):
+            layer_hourly, layer_daily = self.calculate_phytoplankton_chunk([phyto_inputs[i] for i in chunk])
+            for position, pond_index in enumerate(chunk):
+                inputs = phyto_inputs[pond_index]
+                number_of_layers = len(inputs["layer_bounds"])
+                times_count = len(inputs["times"])
+                results["number_of_layers"][pond_index] = number_of_layers
+                results["number_of_times"][pond_index] = times_count
+                results["times"][pond_index, :times_count] = inputs["times"]
+                results["layer_hourly"][pond_index, :number_of_layers, :times_count] = layer_hourly[position, :number_of_layers, :times_count]
+                results["layer_daily"][pond_index, :number_of_layers] = layer_daily[position, :number_of_layers]
+                results["daily_phytoplankton"][pond_index] = np.sum(layer_daily[position, :number_of_layers])
+
+        for index, pond in enumerate(pond_list):
+            results["key"][index] = pond.get_key()
+            results["year"][index] = pond.get_year()
+            results["lake_id"][index] = pond.get_lake_id()
+            results["day_of_year"][index] = pond.get_day_of_year()
+            if(pond.get_time_integration_method() != Pond.TIME_INTEGRATION_FIXED_STEP):
+                self.calculate_daily_values_with_pond(pond, results[index])
+        return results
+
+
+    def iterate_results(self, ponds, ponds_per_batch=DEFAULT_PONDS_PER_BATCH):
+        '''
+        Calculates ponds a batch at a time as they arrive, e.g. from DataReader.iterate_ponds(),
+        so calculating and writing results can overlap with reading the file.
+        @param ponds: any iterable of Pond objects
+        @param ponds_per_batch: how many ponds to calculate at once.
+        @return: (list of Pond objects, their calculate() results) for each batch, in order.
+        @rtype: generator of tuples
+        '''
+        batch = []
+        for pond in ponds:
+            batch.append(pond)
+            if(len(batch) >= ponds_per_batch):
+                yield batch, self.calculate(batch)
+                batch = []
+        if(len(batch) > 0):
+            yield batch, self.calculate(batch)
+
+
+    def concatenate_results(self, results_list):
+        '''
+        Joins the arrays from several calculate() calls, in order. Hourly fields are padded with NaN to the longest series.
+        @param results_list: list of arrays returned by calculate()
+        @rtype: numpy structured array
+        '''
+        number_of_times = max([results["times"].shape[1] for results in results_list] + [0])
+        combined = np.zeros(sum([len(results) for results in results_list]), dtype=self.get_result_dtype(number_of_times))
+        combined["times"] = np.nan
+        combined["layer_hourly"] = np.nan
+        start = 0
+        for results in results_list:
+            stop = start + len(results)
+            width = results["times"].shape[1]
+            for name in results.dtype.names:
+                if(name == "times"):
+                    combined[name][start:stop, :width] = results[name]
+                elif(name == "layer_hourly"):
+                    combined[name][start:stop, :, :width] = results[name]
+                else:
+                    combined[name][start:stop] = results[name]
+            start = stop
+        return combined
+
+
+    def calculate_daily_values_with_pond(self, pond, result):
+        '''
+        Fills in the daily fields of one result record using the Pond's own methods.
+        Used for ponds whose time integration method is not fixed_step.
+        @param pond: a Pond
+        @param result: one record of the array returned by calculate()
+        '''
+        result["daily_benthic"] = pond.calculate_daily_whole_lake_benthic_primary_production_m2(self.depth_interval, self.use_littoral_area)
+        layer_upper_bound = 0.0
+        for layer, layer_lower_bound in enumerate(pond.get_thermal_layer_depths()):
+            result["layer_daily"][layer] = pond.calculate_phytoplankton_primary_production_rate_in_interval(layer_upper_bound, layer_lower_bound, self.depth_interval, self.use_photoinhibition)
+            layer_upper_bound = layer_lower_bound
+        result["daily_phytoplankton"] = np.sum(result["layer_daily"][:result["number_of_layers"]])
+
+
+    ###################################
+    # INPUTS
+    ###################################
+
+    def get_light_inputs(self, pond):
+        '''
+        @param pond: a Pond
+        @return: the per-pond scalars the light equation needs.
+        @rtype: dict
+        '''
+        return {"kd": pond.get_light_attenuation_coefficient(),
+                "noon_surface_light": pond.get_noon_surface_light(),
+                "length_of_day": pond.get_length_of_day(),
+                "max_depth": pond.get_max_depth(),
+                "time_interval": pond.get_time_interval()}
+
+
+    def get_benthic_inputs(self, pond):
+        '''
+        Depth profile and times used for one pond's daily benthic production. Same grid as Pond uses.
+        @param pond: a Pond
+        @rtype: dict
+        '''
+        inputs = self.get_light_inputs(pond)
+        profile = pond.get_benthic_depth_profile(self.depth_interval, self.use_littoral_area)
+        inputs.update(profile)
+
+        times = []
+        t = 0.0  # start of day
+        while t < inputs["length_of_day"]:
+            times.append(t)
+            t += inputs["time_interval"]
+        inputs["times"] = np.array(times, dtype=float)
+        return inputs
+
+
+    def get_phytoplankton_inputs(self, pond):
+        '''
+        Depth profiles of every thermal layer, stacked, and the times used for one pond's hourly phytoplankton production.
+        Same grids as Pond uses.
+        @param pond: a Pond
+        @rtype: dict
+        '''
+        inputs = self.get_light_inputs(pond)
+        time_interval = inputs["time_interval"]
+        times = np.array(pond.get_list_of_times(), dtype=float)
+        inputs["times"] = times[np.mod(times, time_interval) == 0]
+
+        profiles = []
+        layer_bounds = []
+        photoinhibition_flags = []
+        layer_upper_bound = 0.0
+        for layer_lower_bound in pond.get_thermal_layer_depths():
+            use_photoinhibition = self.use_photoinhibition
+            if(use_photoinhibition is None):
+                use_photoinhibition = (0 != pond.get_phyto_beta_at_depth(layer_lower_bound))
+            profiles.append(pond.get_phytoplankton_depth_profile_in_interval(layer_upper_bound, layer_lower_bound, self.depth_interval))
+            layer_bounds.append((layer_upper_bound, layer_lower_bound))
+            photoinhibition_flags.append(use_photoinhibition)
+            layer_upper_bound = layer_lower_bound
+
+        inputs["layer_bounds"] = layer_bounds
+        for name in ["depths", "weights", "pmax", "alpha", "beta"]:
+            inputs[name] = np.concatenate([profile[name] for profile in profiles] + [np.zeros(0)])
+        inputs["layers"] = np.concatenate([np.repeat(layer, len(profile["depths"])) for layer, profile in enumerate(profiles)] + [np.zeros(0, dtype=int)]).astype(int)
+        inputs["photoinhibition"] = np.concatenate([np.repeat(flag, len(profile["depths"])) for flag, profile in zip(photoinhibition_flags, profiles)] + [np.zeros(0, dtype=bool)]).astype(bool)
+        return inputs
+
+
+    def get_chunks(self, inputs_list):
+        '''
+        Splits ponds into consecutive chunks whose padded (pond x depth x time) grid stays under max_chunk_elements.
+        Every chunk holds at least one pond.
+        @param inputs_list: list of dicts from get_benthic_inputs or get_phytoplankton_inputs
+        @return: lists of pond indices
+        @rtype: generator
+        '''
+        chunk = []
+        max_depths = 0
+        max_times = 0
+        for index, inputs in enumerate(inputs_list):
+            new_max_depths = max(max_depths, len(inputs["depths"]))
+            new_max_times = max(max_times, len(inputs["times"]))
+            if(len(chunk) > 0 and (len(chunk) + 1) * new_max_depths * new_max_times > self.max_chunk_elements):
+                yield chunk
+                chunk = []
+                new_max_depths = len(inputs["depths"])
+                new_max_times = len(inputs["times"])
+            chunk.append(index)
+            max_depths = new_max_depths
+            max_times = new_max_times
+        if(len(chunk) > 0):
+            yield chunk
+
+
+    def stack(self, inputs_list, name, fill_value=0.0, dtype=float):
+        '''
+        Stacks one per-pond array into a padded (pond x longest) matrix.
+        @param inputs_list: list of dicts
+        @param name: which array to stack
+        @param fill_value: value used for padding
+        @rtype: numpy array
+        '''
+        length = max([len(inputs[name]) for inputs in inputs_list] + [0])
+        stacked = np.empty((len(inputs_list), length), dtype=dtype)
+        stacked.fill(fill_value)
+        for index, inputs in enumerate(inputs_list):
+            stacked[index, :len(inputs[name])] = inputs[name]
+        return stacked
+
+
+    ###################################
+    # KERNELS
+    ###################################
+
+    def calculate_light(self, inputs_list, depths, times):
+        '''
+        Light at every (pond, depth, time). Depths and times are validated the same way Pond does it.
+        Padded times must be zero, so they get no light. So does every time in a pond with a length of day of zero.
+        @param inputs_list: list of dicts from get_benthic_inputs or get_phytoplankton_inputs
+        @param depths: (pond x depth) matrix
+        @param times: (pond x time) matrix
+        @return: (pond x depth x time) light, umol*m^-2*s^-1
+        @rtype: numpy array
+        '''
+        kd = np.array([inputs["kd"] for inputs in inputs_list], dtype=float)[:, np.newaxis]
+        noon_surface_light = np.array([inputs["noon_surface_light"] for inputs in inputs_list], dtype=float)[:, np.newaxis]
+        length_of_day = np.array([inputs["length_of_day"] for inputs in inputs_list], dtype=float)[:, np.newaxis]
+        max_depth = np.array([inputs["max_depth"] for inputs in inputs_list], dtype=float)[:, np.newaxis]
+
+        validated_depths = np.clip(depths, 0.0, max_depth)
+        validated_times = np.clip(times, Pond.MINIMUM_LENGTH_OF_DAY, length_of_day)
+        #a length of day of zero means the sun never comes up: no light, rather than 0/0.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            surface_light_at_t = np.where(length_of_day > 0, noon_surface_light * np.sin(np.pi * validated_times / length_of_day), 0.0)  # pond x time
+        proportion_at_z = np.exp(-kd * validated_depths)  # pond x depth
+        return proportion_at_z[:, :, np.newaxis] * surface_light_at_t[:, np.newaxis, :]
+
+
+    def calculate_benthic_chunk(self, inputs_list):
+        '''
+        Daily benthic production for a chunk of ponds.
+        @param inputs_list: list of dicts from get_benthic_inputs
+        @return: mg C/m^2/day for each pond
+        @rtype: numpy array
+        '''
+        depths = self.stack(inputs_list, "depths")
+        times = self.stack(inputs_list, "times")
+        weights = self.stack(inputs_list, "weights")  # zero for padding
+        pmax = self.stack(inputs_list, "pmax")  # zero for padding
+        ik = self.stack(inputs_list, "ik", fill_value=1.0)  # one for padding, to keep tanh(I/Ik) finite
+        time_interval = np.array([inputs["time_interval"] for inputs in inputs_list], dtype=float)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            light = self.calculate_light(inputs_list, depths, times)
+            bppr = pmax[:, :, np.newaxis] * np.tanh(light / ik[:, :, np.newaxis])  # same as Pond.calculate_benthic_primary_production_z_t
+        bppr_t = np.einsum("pd,pdt->pt", weights, bppr)
+        return bppr_t.sum(axis=1) / (Pond.BASE_TIME_UNIT / time_interval)
+
+
+    def calculate_phytoplankton_chunk(self, inputs_list):
+        '''
+        Hourly and daily phytoplankton production, per thermal layer, for a chunk of ponds.
+        @param inputs_list: list of dicts from get_phytoplankton_inputs
+        @return: (pond x layer x time) hourly rates in mgC*m^-3*hr^-1, (pond x layer) daily totals in mgC/m^2/day
+        @rtype: tuple of numpy arrays
+        '''
+        max_layers = Pond.MAXIMUM_NUMBER_OF_THERMAL_LAYERS
+        depths = self.stack(inputs_list, "depths")
+        times = self.stack(inputs_list, "times")
+        weights = self.stack(inputs_list, "weights")  # zero for padding
+        pmax = self.stack(inputs_list, "pmax")[:, :, np.newaxis]  # zero for padding, so padding produces nothing
+        alpha = self.stack(inputs_list, "alpha")[:, :, np.newaxis]
+        beta = self.stack(inputs_list, "beta")[:, :, np.newaxis]
+        photoinhibition = self.stack(inputs_list, "photoinhibition", False, bool)[:, :, np.newaxis]
+        layers = self.stack(inputs_list, "layers", 0, int)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            light = self.calculate_light(inputs_list, depths, times)
+            # same P-I curves as Pond.calculate_phytoplankton_primary_productivity_with_parameters
+            ppr_inhibited = pmax * (1 - np.exp(-alpha * light / pmax)) * np.exp(-beta * light / pmax)
+            ppr_not_inhibited = pmax * np.tanh(alpha * light / pmax)
+        ppr = np.where(pmax > 0, np.where(photoinhibition, ppr_inhibited, ppr_not_inhibited), 0.0)
+
+        # weight by fractional volume and add up each layer's depths.
+        layer_weights = np.zeros(weights.shape + (max_layers,))
+        for layer in range(max_layers):
+            layer_weights[:, :, layer] = np.where(layers == layer, weights, 0.0)
+        layer_hourly = np.einsum("pdl,pdt->plt", layer_weights, ppr)
+
+        time_interval = np.array([inputs["time_interval"] for inputs in inputs_list], dtype=float)
+        thickness = np.zeros((len(inputs_list), max_layers))
+        for index, inputs in enumerate(inputs_list):
+            for layer, (layer_upper_bound, layer_lower_bound) in enumerate(inputs["layer_bounds"]):
+                thickness[index, layer] = layer_lower_bound - layer_upper_bound
+
+        # padded times contribute zeros to the sums.
+        layer_daily = layer_hourly.sum(axis=2) / (Pond.BASE_TIME_UNIT / time_interval)[:, np.newaxis] * thickness
+        return layer_hourly, layer_daily
+
+
+
+def main():
+    '''
+    Used for testing!
+    '''
+    print "hello world"
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+'''
+Created on Oct 17, 2026
+
+Compact binary form of a parsed pond list, for reloading big datasets without going through xlrd again.
+
+A dataset is a folder of .npy files, one per column: pond scalars, benthic and phytoplankton measurement tables,
+and bathymetry, plus a small metadata.json. Measurement and bathymetry rows for each pond/shape are contiguous,
+found through offset arrays. Loading memory-maps the .npy files, so opening even a large dataset takes milliseconds
+and reads nothing until a column is used. Pond objects are only built when asked for.
+
+To convert a workbook, from this folder:
+    python pond_dataset.py static/longer_example_data_file.xls longer_dataset
+
+@author: cdleong
+'''
+import os
+import sys
+import json
+import numpy as np
+from pond import Pond
+from bathymetric_pond_shape import BathymetricPondShape
+from benthic_photosynthesis_measurement import BenthicPhotosynthesisMeasurement
+from phytoplankton_photosynthesis_measurement import PhytoPlanktonPhotosynthesisMeasurement
+
+
+class PondDataset(object):
+    '''
+    A pond list stored as arrays. Write one with PondDataset.write(), open it with PondDataset(folder).
+    '''
+
+    #CONSTANTS
+    FORMAT_VERSION = 1
+    METADATA_FILE_NAME = "metadata.json"
+    ARRAY_FILE_EXTENSION = ".npy"
+
+    #one value per pond
+    POND_COLUMNS = ["year", "day_of_year", "lake_index", "length_of_day", "noon_surface_light", "light_attenuation_coefficient",
+                    "time_interval", "method_index", "time_integration_tolerance", "shape_index", "benthic_offsets", "phyto_offsets"]
+    #one value per measurement. Rows for pond i are benthic_offsets[i] to benthic_offsets[i+1]
+    BENTHIC_COLUMNS = ["benthic_depth", "benthic_pmax", "benthic_ik"]
+    #rows for pond i are phyto_offsets[i] to phyto_offsets[i+1]
+    PHYTO_COLUMNS = ["phyto_thermal_layer", "phyto_depth", "phyto_pmax", "phyto_alpha", "phyto_beta"]
+    #one value per depth. Rows for shape j are shape_offsets[j] to shape_offsets[j+1]. Every pond sharing a shape object shares its rows.
+    SHAPE_COLUMNS = ["shape_offsets", "shape_depth", "shape_area"]
+
+    INTEGER_COLUMNS = ["lake_index", "method_index", "shape_index", "benthic_offsets", "phyto_offsets", "shape_offsets"]
+
+
+    def __init__(self, dataset_folder, mmap_mode="r"):
+        '''
+        Opens a dataset written by write().
+        @param dataset_folder: the dataset's folder
+        @param mmap_mode: passed to numpy.load. "r" memory-maps read-only. None reads everything into memory.
+        '''
+        self.dataset_folder = dataset_folder
+        metadata_path = os.path.join(dataset_folder, self.METADATA_FILE_NAME)
+        try:
+            with open(metadata_path, "r") as metadata_file:
+                self.metadata = json.load(metadata_file)
+        except (IOError, ValueError) as e:
+            raise IOError("not a pond dataset: "+dataset_folder+" ("+str(e)+")")
+        if(self.metadata.get("format_version") != self.FORMAT_VERSION):
+            raise IOError("pond dataset format version "+str(self.metadata.get("format_version"))+" is not supported. Expected "+str(self.FORMAT_VERSION))
+
+        self.lake_ids = self.metadata["lake_ids"]
+        self.time_integration_methods = self.metadata["time_integration_methods"]
+        self.columns = {}
+        for column_name in self.POND_COLUMNS + self.BENTHIC_COLUMNS + self.PHYTO_COLUMNS + self.SHAPE_COLUMNS:
+            self.columns[column_name] = np.load(self.get_column_path(dataset_folder, column_name), mmap_mode=mmap_mode)
+        self.shapes_by_index = {} #built on first use, then shared, just like DataReader shares one shape per lake.
+
+
+    ##############################
+    # WRITING
+    ##############################
+
+    @classmethod
+    def write(cls, dataset_folder, pond_list):
+        '''
+        Saves a pond list as a dataset.
+        @param dataset_folder: folder to write to. Created if needed. Existing dataset files in it are replaced.
+        @param pond_list: list of Pond objects, with BathymetricPondShapes.
+        @return: the dataset, opened
+        @rtype: PondDataset
+        '''
+        pond_list = list(pond_list)
+        lake_ids = []
+        lake_indices_by_id = {}
+        methods = list(Pond.VALID_TIME_INTEGRATION_METHODS)
+        shape_indices_by_object_id = {}
+        shapes = []
+        columns = dict((column_name, []) for column_name in cls.POND_COLUMNS + cls.BENTHIC_COLUMNS + cls.PHYTO_COLUMNS)
+        columns["benthic_offsets"] = [0]
+        columns["phyto_offsets"] = [0]
+
+        for pond in pond_list:
+            lake_id = pond.get_lake_id()
+            if(lake_id not in lake_indices_by_id):
+                lake_indices_by_id[lake_id] = len(lake_ids)
+                lake_ids.append(lake_id)
+
+            shape = pond.get_pond_shape()
+            if(not isinstance(shape, BathymetricPondShape)):
+                raise Exception("Only BathymetricPondShapes can be saved in a pond dataset. Got ", shape)
+            if(id(shape) not in shape_indices_by_object_id):
+                shape_indices_by_object_id[id(shape)] = len(shapes)
+                shapes.append(shape)
+
+            columns["year"].append(pond.get_year())
+            columns["day_of_year"].append(pond.get_day_of_year())
+            columns["lake_index"].append(lake_indices_by_id[lake_id])
+            columns["length_of_day"].append(pond.get_length_of_day())
+            columns["noon_surface_light"].append(pond.get_noon_surface_light())
+            columns["light_attenuation_coefficient"].append(pond.get_light_attenuation_coefficient())
+            columns["time_interval"].append(pond.get_time_interval())
+            columns["method_index"].append(methods.index(pond.get_time_integration_method()))
+            columns["time_integration_tolerance"].append(pond.get_time_integration_tolerance())
+            columns["shape_index"].append(shape_indices_by_object_id[id(shape)])
+
+            for measurement in pond.get_benthic_photosynthesis_measurements():
+                columns["benthic_depth"].append(measurement.get_depth())
+                columns["benthic_pmax"].append(measurement.get_pmax())
+                columns["benthic_ik"].append(measurement.get_ik())
+            columns["benthic_offsets"].append(len(columns["benthic_depth"]))
+
+            for measurement in pond.get_phytoplankton_photosynthesis_measurements():
+                columns["phyto_thermal_layer"].append(measurement.get_thermal_layer())
+                columns["phyto_depth"].append(measurement.get_depth())
+                columns["phyto_pmax"].append(measurement.get_pmax())
+                columns["phyto_alpha"].append(measurement.get_phyto_alpha())
+                columns["phyto_beta"].append(measurement.get_phyto_beta())
+            columns["phyto_offsets"].append(len(columns["phyto_depth"]))
+
+        columns["shape_offsets"] = [0]
+        columns["shape_depth"] = []
+        columns["shape_area"] = []
+        for shape in shapes:
+            columns["shape_depth"].extend(shape.get_sorted_depths().tolist())
+            columns["shape_area"].extend(shape.get_sorted_areas().tolist())
+            columns["shape_offsets"].append(len(columns["shape_depth"]))
+
+        if(not os.path.isdir(dataset_folder)):
+            os.makedirs(dataset_folder)
+        metadata_path = os.path.join(dataset_folder, cls.METADATA_FILE_NAME)
+        if(os.path.exists(metadata_path)):
+            os.remove(metadata_path) #so a half-written dataset can't be opened
+        for column_name, values in columns.items():
+            if(column_name in cls.INTEGER_COLUMNS):
+                array = np.array(values, dtype=np.int64)
+            else:
+                array = np.array(values, dtype=np.float64)
+            np.save(cls.get_column_path(dataset_folder, column_name), array)
+
+        metadata = {"format_version": cls.FORMAT_VERSION,
+                    "number_of_ponds": len(pond_list),
+                    "lake_ids": lake_ids,
+                    "time_integration_methods": methods,
+                    #DataReader gives floats, but keep ints as ints so Pond keys don't change.
+                    "integer_years": all(isinstance(pond.get_year(), (int, long)) for pond in pond_list),
+                    "integer_days": all(isinstance(pond.get_day_of_year(), (int, long)) for pond in pond_list)}
+        with open(metadata_path, "w") as metadata_file:
+            json.dump(metadata, metadata_file) #written last, marks the dataset as complete
+        return cls(dataset_folder)
+
+
+    @classmethod
+    def get_column_path(cls, dataset_folder, column_name):
+        '''
+        @return: path of one column's .npy file
+        @rtype: str
+        '''
+        return os.path.join(dataset_folder, column_name + cls.ARRAY_FILE_EXTENSION)
+
+
+    ##############################
+    # READING
+    ##############################
+
+    def __len__(self):
+        return self.metadata["number_of_ponds"]
+
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.get_pond(index)
+
+
+    def get_column(self, column_name):
+        '''
+        @param column_name: one of POND_COLUMNS, BENTHIC_COLUMNS, PHYTO_COLUMNS or SHAPE_COLUMNS
+        @return: the whole column, memory-mapped unless opened with mmap_mode=None.
+        @rtype: numpy array
+        '''
+        return self.columns[column_name]
+
+
+    def get_lake_id(self, index):
+        '''
+        @param index: pond index
+        @return: the lake ID of that pond
+        '''
+        return self.lake_ids[int(self.columns["lake_index"][index])]
+
+
+    def get_year(self, index):
+        year = float(self.columns["year"][index])
+        if(self.metadata["integer_years"]):
+            return int(year)
+        return year
+
+
+    def get_day_of_year(self, index):
+        day_of_year = float(self.columns["day_of_year"][index])
+        if(self.metadata["integer_days"]):
+            return int(day_of_year)
+        return day_of_year
+
+
+    def get_shape(self, shape_index):
+        '''
+        @param shape_index: index into the shape tables
+        @return: the shape. Built once, then shared by every Pond using it.
+        @rtype: BathymetricPondShape
+        '''
+        if(shape_index not in self.shapes_by_index):
+            start, stop = self.columns["shape_offsets"][shape_index:shape_index+2]
+            depths = self.columns["shape_depth"][start:stop].tolist()
+            areas = self.columns["shape_area"][start:stop].tolist()
+            self.shapes_by_index[shape_index] = BathymetricPondShape(dict(zip(depths, areas)))
+        return self.shapes_by_index[shape_index]
+
+
+    def get_pond(self, index):
+        '''
+        Builds one Pond from the arrays. Nothing else is read.
+        @param index: from 0 to len(self)-1
+        @rtype: Pond
+        '''
+        if(index < 0 or index >= len(self)):
+            raise IndexError("pond index out of range: "+str(index))
+        columns = self.columns
+        benthic_start, benthic_stop = columns["benthic_offsets"][index:index+2]
+        benthic_measurements = [BenthicPhotosynthesisMeasurement(depth, pmax, ik) for depth, pmax, ik in
+                                zip(columns["benthic_depth"][benthic_start:benthic_stop].tolist(),
+                                    columns["benthic_pmax"][benthic_start:benthic_stop].tolist(),
+                                    columns["benthic_ik"][benthic_start:benthic_stop].tolist())]
+        phyto_start, phyto_stop = columns["phyto_offsets"][index:index+2]
+        phyto_measurements = [PhytoPlanktonPhotosynthesisMeasurement(*values) for values in
+                              zip(columns["phyto_thermal_layer"][phyto_start:phyto_stop].tolist(),
+                                  columns["phyto_depth"][phyto_start:phyto_stop].tolist(),
+                                  columns["phyto_pmax"][phyto_start:phyto_stop].tolist(),
+                                  columns["phyto_alpha"][phyto_start:phyto_stop].tolist(),
+                                  columns["phyto_beta"][phyto_start:phyto_stop].tolist())]
+        return Pond(self.get_year(index),
+                    self.get_lake_id(index),
+                    self.get_day_of_year(index),
+                    float(columns["length_of_day"][index]),
+                    float(columns["noon_surface_light"][index]),
+                    float(columns["light_attenuation_coefficient"][index]),
+                    self.get_shape(int(columns["shape_index"][index])),
+                    benthic_measurements,
+                    phyto_measurements,
+                    float(columns["time_interval"][index]),
+                    self.time_integration_methods[int(columns["method_index"][index])],
+                    float(columns["time_integration_tolerance"][index]))
+
+
+    def get_pond_list(self):
+        '''
+        @return: every Pond, in the order they were written.
+        @rtype: list
+        '''
+        return list(self)
+
+
+
+def main():
+    '''
+    Converts a data file to a pond dataset.
+    '''
+    if(len(sys.argv) != 3):
+        print "usage: python pond_dataset.py <data file> <dataset folder>"
+        return
+    from data_reader import DataReader
+    pond_list = DataReader(sys.argv[1]).read()
+    dataset = PondDataset.write(sys.argv[2], pond_list)
+    print "wrote", len(dataset), "ponds to", sys.argv[2]
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+'''
+Created on Oct 17, 2026
+
+Runs PondBatchCalculator over a pool of worker processes.
+
+The pool is started the first time it's needed, with numpy/scipy already imported in every worker, and then reused
+by every request after that. Ponds go to the workers in the plain-tuple form from Pond.to_compact(), not jsonpickle.
+Each task sends each lake's shape once, and the Ponds that share it refer to it by index, so the workers build 
+its arrays, interpolation and hypsographic tables once per lake, as DataReader does, not once per Pond.
+
+@author: cdleong
+'''
+import atexit
+import threading
+import multiprocessing
+from pond import Pond
+from bathymetric_pond_shape import BathymetricPondShape
+from pond_batch_calculator import PondBatchCalculator
+
+
+
+def initialize_worker():
+    '''
+    Runs once in each worker process when the pool starts, so the first request doesn't pay for the imports.
+    '''
+    import numpy
+    import scipy.interpolate
+    import pond
+    import pond_batch_calculator
+
+
+
+def calculate_compact_ponds(task):
+    '''
+    Runs in a worker process.
+    @param task: (list of compact shapes, list of compact ponds, dict of PondBatchCalculator constructor arguments), from get_task()
+    @return: the array from PondBatchCalculator.calculate()
+    @rtype: numpy structured array
+    '''
+    compact_shapes, compact_ponds, calculator_arguments = task
+    shapes = [BathymetricPondShape(dict(compact_shape)) for compact_shape in compact_shapes]
+    pond_list = [Pond.from_compact(compact_pond, shapes) for compact_pond in compact_ponds]
+    return PondBatchCalculator(**calculator_arguments).calculate(pond_list)
+
+
+
+class PondProcessPool(object):
+    '''
+    Same results as PondBatchCalculator.calculate(), in the same order, computed on worker processes.
+    Short lists are computed in this process, since sending them would cost more than it saves.
+    '''
+
+    #CONSTANTS
+    DEFAULT_MINIMUM_PONDS_FOR_POOL = 4  # fewer than this and the ponds are calculated right here.
+    TASKS_PER_PROCESS = 4  # more, smaller tasks keep every worker busy when some ponds take longer than others.
+
+    #shared by every PondProcessPool, so it survives between requests.
+    pool = None
+    pool_size = 0
+    pool_lock = threading.Lock() #two requests arriving together must not both start a pool.
+
+
+    def __init__(self,
+                 depth_interval=Pond.DEFAULT_DEPTH_INTERVAL_FOR_CALCULATIONS,
+                 use_photoinhibition=None,
+                 use_littoral_area=True,
+                 processes=None,
+                 minimum_ponds_for_pool=DEFAULT_MINIMUM_PONDS_FOR_POOL):
+        '''
+        Constructor
+        @param depth_interval: the depth interval for calculations, in meters.
+        @param use_photoinhibition: whether or not to use the photoinhibition equation. None decides per layer, like Pond does.
+        @param use_littoral_area: normalize benthic production by littoral area (True) or surface area (False).
+        @param processes: number of worker processes. None means one per CPU.
+        @param minimum_ponds_for_pool: shorter lists are calculated in this process.
+        '''
+        self.calculator_arguments = {"depth_interval": depth_interval,
+                                     "use_photoinhibition": use_photoinhibition,
+                                     "use_littoral_area": use_littoral_area}
+        self.processes = processes
+        self.minimum_ponds_for_pool = minimum_ponds_for_pool
+
+
+    @classmethod
+    def get_pool(cls, processes=None):
+        '''
+        Starts the shared pool if it isn't running yet. Safe to call from several threads at once.
+        @param processes: number of worker processes. None means one per CPU. Only used when the pool is started.
+        @return: the pool, and its number of worker processes. Read together, so close_pool() in another thread can't change one under the other.
+        @rtype: tuple
+        '''
+        with cls.pool_lock:
+            if(cls.pool is None):
+                if(processes is None):
+                    processes = multiprocessing.cpu_count()
+                cls.pool = multiprocessing.Pool(processes, initializer=initialize_worker)
+                cls.pool_size = processes
+            return cls.pool, cls.pool_size
+
+
+    @classmethod
+    def close_pool(cls):
+        '''
+        Shuts the shared pool down. The next calculation starts a new one.
+        '''
+        with cls.pool_lock:
+            if(cls.pool is not None):
+                cls.pool.close()
+                cls.pool.join()
+                cls.pool = None
+                cls.pool_size = 0
+
+
+    def get_task(self, pond_list):
+        '''
+        @param pond_list: the Ponds for one worker task
+        @return: (compact shapes, compact ponds, calculator arguments), for calculate_compact_ponds(). 
+        Each bathymetric shape is in the list once, however many of the Ponds share it.
+        @rtype: tuple
+        '''
+        shape_indices_by_object_id = {}
+        compact_shapes = []
+        for pond in pond_list:
+            shape = pond.get_pond_shape()
+            if(isinstance(shape, BathymetricPondShape) and id(shape) not in shape_indices_by_object_id):
+                shape_indices_by_object_id[id(shape)] = len(compact_shapes)
+                compact_shapes.append(Pond.compact_shape(shape))
+        compact_ponds = [pond.to_compact(shape_indices_by_object_id) for pond in pond_list]
+        return (compact_shapes, compact_ponds, self.calculator_arguments)
+
+
+    def calculate(self, pond_list=[]):
+        '''
+        Calculate
+        @param pond_list: list of Pond objects, e.g. from DataReader.
+        @return: one record per pond, in the same order as pond_list. See PondBatchCalculator.get_result_dtype().
+        @rtype: numpy structured array
+        '''
+        pond_list = list(pond_list)
+        calculator = PondBatchCalculator(**self.calculator_arguments)
+        if(len(pond_list) < self.minimum_ponds_for_pool):
+            return calculator.calculate(pond_list)
+
+        pool, pool_size = self.get_pool(self.processes)
+        number_of_tasks = min(len(pond_list), pool_size * self.TASKS_PER_PROCESS)
+        task_size = -(-len(pond_list) // number_of_tasks)  # ceiling division
+        tasks = [self.get_task(pond_list[start:start + task_size]) for start in range(0, len(pond_list), task_size)]
+        return calculator.concatenate_results(pool.map(calculate_compact_ponds, tasks))  # map keeps input order
+
+
+
+atexit.register(PondProcessPool.close_pool)
+
+
+
+def main():
+    '''
+    Used for testing!
+    '''
+    print "hello world"
+
+
+
+if __name__ == "__main__":
+    main()
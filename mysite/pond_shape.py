@@ -11,7 +11,16 @@ class PondShape(object):
     #######################################################
     #KNOWS... nothing. Depends on implementation.
     #######################################################
-    
+    version = 0  # goes up every time the shape changes. Lets anything caching results based on the shape know when to throw them out.
+
+
+    def get_version(self):
+        '''
+        @return: a number that changes whenever the shape changes.
+        @rtype: int
+        '''
+        return self.version
+
 
 
     def get_volume(self):
@@ -44,6 +53,18 @@ class PondShape(object):
     
     def get_volume_above_depth(self, depth=0.0, depth_interval=0.1):
         pass
+
+    def get_volumes_at_depths(self, depths, depth_interval=0.1):
+        pass
+
+    def get_sediment_areas_at_depths(self, depths, depth_interval=0.1):
+        pass
+
+    def get_tabulated_sediment_areas_at_depths(self, depths, depth_interval=0.1):
+        pass
+
+    def get_fractional_volumes_at_depths(self, depths, depth_interval=0.1):
+        pass
         
     def get_sediment_area_above_depth(self, depth=0.0):
         pass